@@ -0,0 +1,118 @@
+import os
+import json
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from ai_core.tokens import estimate_tokens, truncate_to_tokens
+
+# 에이전트에 context_window_size가 없을 때 사용할 컨텍스트 길이(num_ctx).
+# Ollama 기본값(2048~4096)은 긴 도구 루프에서 프롬프트 앞부분을 경고 없이 잘라내므로 항상 명시적으로 전달
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "8192"))
+
+# 컨텍스트 중 모델 응답(생성)용으로 남겨 둘 토큰 수
+RESPONSE_RESERVE_TOKENS = int(os.getenv("LLM_RESPONSE_RESERVE_TOKENS", "1024"))
+
+# 최근 턴이 아닌 도구 결과는 이 토큰 수까지만 다시 보냄 (웹 요약 / 위키 검색 결과가 매 단계 반복 전송되지 않도록)
+TOOL_RESULT_MAX_TOKENS = int(os.getenv("LLM_TOOL_RESULT_MAX_TOKENS", "512"))
+
+# 잘라낸 이전 대화를 대신하는 요약 메모의 최대 토큰 수
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("LLM_CONTEXT_SUMMARY_MAX_TOKENS", "400"))
+
+# 메시지마다 붙는 역할/구분자 토큰 (어림값)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(message) -> int:
+    """메시지 하나의 토큰 수 어림값 (본문 + 도구 호출 인자)"""
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.content if isinstance(message.content, str) else str(message.content))
+    for call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(call["name"]) + estimate_tokens(json.dumps(call.get("args", {}), ensure_ascii=False))
+    return tokens
+
+
+def tools_tokens(tools) -> int:
+    """bind_tools로 매 요청에 함께 전송되는 도구 명세의 토큰 수 어림값"""
+    return sum(estimate_tokens(json.dumps(convert_to_openai_tool(t), ensure_ascii=False)) for t in tools)
+
+
+def _turns(messages):
+    # 턴 = 모델 응답(AIMessage) 하나 + 그에 이어지는 도구 결과(ToolMessage)들.
+    # 도구 호출과 결과는 함께 남기거나 함께 빼야 모델이 짝이 맞지 않는 결과를 보지 않음
+    turns = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and turns:
+            turns[-1].append(message)
+        else:
+            turns.append([message])
+    return turns
+
+
+def _compact_tool_result(message, max_tokens):
+    if not isinstance(message.content, str) or message_tokens(message) <= max_tokens + MESSAGE_OVERHEAD_TOKENS:
+        return message
+    total = estimate_tokens(message.content)
+    content = truncate_to_tokens(message.content, max_tokens)
+    content += f"\n[... truncated, {total - estimate_tokens(content)} more tokens omitted to fit the context window]"
+    return message.model_copy(update={"content": content})
+
+
+def _summarize(turns):
+    """잘라낸 턴들을 대신할 짧은 메모 (LLM 호출 없이 어떤 도구를 썼고 결과가 무엇이었는지만 남김)"""
+    lines = []
+    count = 0
+    for turn in turns:
+        for message in turn:
+            count += 1
+            if isinstance(message, AIMessage):
+                for call in message.tool_calls or []:
+                    args = truncate_to_tokens(json.dumps(call.get("args", {}), ensure_ascii=False), 30)
+                    lines.append(f"- You called {call['name']}({args})")
+                if message.content and not message.tool_calls:
+                    lines.append(f"- You said: {truncate_to_tokens(message.content, 40)}")
+            elif isinstance(message, ToolMessage):
+                lines.append(f"  -> {message.name or 'tool'} returned: {truncate_to_tokens(str(message.content), 40)}")
+    note = (
+        f"[Context Note] {count} earlier message(s) were removed to fit your context window. "
+        "Summary of what you already did (do not repeat it unless needed):\n" + "\n".join(lines)
+    )
+    return HumanMessage(content=truncate_to_tokens(note, CONTEXT_SUMMARY_MAX_TOKENS))
+
+
+def fit_messages(system_message, messages, budget: int, tool_result_tokens: int = TOOL_RESULT_MAX_TOKENS):
+    """
+    시스템 프롬프트 + 대화(messages)를 budget 토큰 안에 들어가도록 줄입니다.
+    예산 안이면 그대로 보냅니다 (이미 보낸 앞부분을 바꾸지 않아야 Ollama 프롬프트 캐시가 재사용됨).
+    1. 가장 최근 턴이 아닌 도구 결과는 tool_result_tokens까지만 남깁니다.
+    2. 그래도 넘치면 오래된 턴부터 빼고, 뺀 턴은 짧은 요약 메모 하나로 대신합니다.
+    3. 최근 턴만 남았는데도 넘치면 그 턴의 도구 결과를 남은 예산에 맞게 자릅니다.
+    상태(체크포인트)에 저장된 대화는 그대로 두고, 모델에 보낼 목록만 새로 만듭니다.
+    Returns: 모델에 보낼 메시지 목록 (system_message가 맨 앞)
+    """
+    fixed = message_tokens(system_message)
+    if fixed + sum(message_tokens(m) for m in messages) <= budget:
+        return [system_message] + list(messages)
+
+    turns = _turns(messages)
+    turns = [
+        [_compact_tool_result(m, tool_result_tokens) if isinstance(m, ToolMessage) else m for m in turn]
+        for turn in turns[:-1]
+    ] + turns[-1:]
+
+    sizes = [sum(message_tokens(m) for m in turn) for turn in turns]
+    dropped = 0
+    summary = None
+    while fixed + sum(sizes[dropped:]) + (message_tokens(summary) if summary else 0) > budget and dropped < len(turns) - 1:
+        dropped += 1
+        summary = _summarize(turns[:dropped])
+
+    kept = turns[dropped:]
+    if kept:
+        remaining = budget - fixed - (message_tokens(summary) if summary else 0) - sum(sizes[dropped:])
+        if remaining < 0:
+            last = kept[-1]
+            results = [m for m in last if isinstance(m, ToolMessage)]
+            if results:
+                # 넘치는 만큼을 도구 결과들에 고르게 나눠 자름 (절삭 안내 문구 몫을 함께 뺌)
+                share = max(64, (sum(message_tokens(m) for m in results) + remaining) // len(results) - 24)
+                kept[-1] = [_compact_tool_result(m, share) if isinstance(m, ToolMessage) else m for m in last]
+
+    return [system_message] + ([summary] if summary else []) + [m for turn in kept for m in turn]
@@ -1,65 +1,977 @@
 import os
 import json
+import time
+import random
+import asyncio
+import weakref
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from ollama import ResponseError
+
+# ==============================================================================
+# HTTP 전송 설정 (커넥션 풀 / 타임아웃 / 재시도)
+# ==============================================================================
+
+DEFAULT_OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+
+# [추가] 여러 Ollama 서버를 쉼표로 나열 ('http://gpu1:11434,http://gpu2:11434'). 없으면 OLLAMA_HOST 하나만 사용
+OLLAMA_HOSTS = [h.strip().rstrip("/") for h in os.getenv("OLLAMA_HOSTS", "").split(",") if h.strip()] or [DEFAULT_OLLAMA_HOST]
+
+# 여러 호스트일 때 헬스 체크(/api/tags + /api/ps) 주기(초)
+HEALTH_CHECK_INTERVAL = float(os.getenv("OLLAMA_HEALTH_CHECK_INTERVAL", "15"))
+
+# 모델이 로드되지 않은 호스트를 '진행 중 요청이 이만큼 더 많은' 로드된 호스트와 같게 취급 (콜드 로드 비용).
+# 로드된 호스트들이 이만큼 밀려 있으면 다른 호스트에도 모델을 올려 요청을 나눔
+COLD_HOST_PENALTY = int(os.getenv("OLLAMA_COLD_HOST_PENALTY", "2"))
+
+# 연결 타임아웃은 짧게, 읽기 타임아웃은 긴 생성(응답)을 고려해 넉넉하게
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+
+# 호스트당 유지할 keep-alive 커넥션 수
+POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "16"))
+
+# 연결 실패 / 5xx 응답 시 재시도 횟수와 기본 대기 시간(초, 지수 증가 + jitter)
+MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))
+RETRY_STATUS = {500, 502, 503, 504}
+
+# 연속 실패가 이 횟수에 도달하면 회로를 열고, BREAKER_COOLDOWN(초) 동안 호출을 즉시 거절
+BREAKER_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("OLLAMA_BREAKER_COOLDOWN", "30"))
+
+# 마지막 요청 이후 모델을 메모리에 유지할 시간 (Ollama keep_alive 형식: '30m', '1h', '-1'=계속 유지)
+# 요청마다 명시하여 서버 기본값(5분) 때문에 한가한 시간 뒤 첫 호출이 콜드 로드되는 것을 줄임
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# keep_alive를 붙일 모델 호출 엔드포인트
+MODEL_ENDPOINTS = {"/api/generate", "/api/chat", "/api/embed", "/api/embeddings"}
+
+
+class OllamaUnavailableError(RuntimeError):
+    """Ollama 서버가 응답하지 않아 회로 차단기가 열려 있을 때"""
+
+
+def retry_delay(attempt: int) -> float:
+    """지수 백오프 + full jitter (여러 워커가 동시에 재시도하지 않도록 분산)"""
+    return random.uniform(0, RETRY_BACKOFF * (2 ** attempt))
+
+
+def is_unavailable_error(exc) -> bool:
+    """서버 다운/과부하로 볼 수 있는 오류인지 (회로 차단기 실패로 집계할 대상)"""
+    if isinstance(exc, OllamaUnavailableError):
+        return True
+    # ollama 라이브러리는 연결 실패를 내장 ConnectionError로 바꿔서 던짐
+    if isinstance(exc, (ConnectionError, requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None and isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+    if status is None and isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    return isinstance(exc, (ResponseError, requests.HTTPError, httpx.HTTPStatusError)) and status in RETRY_STATUS
+
+
+class CircuitBreaker:
+    """
+    Ollama 호스트별 회로 차단기 (closed -> open -> half-open).
+    서버가 내려가 있으면 모든 워커가 타임아웃까지 붙잡고 있는 대신 즉시 실패하고,
+    쿨다운이 지나면 한 번의 시험 호출로 복구 여부를 확인합니다.
+    """
+
+    def __init__(self, host, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.host = host
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+
+    def retry_after(self) -> float:
+        """회로가 다시 시험 호출을 받기까지 남은 시간(초)"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown or self._probing:
+                raise OllamaUnavailableError(f"Ollama at {self.host} is unavailable (circuit open).")
+            # half-open: 쿨다운이 끝났으므로 한 호출만 통과시켜 복구 여부 확인
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"✅ [LLM] Ollama at {self.host} is reachable again. Closing circuit.")
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """
+        [추가] 성공 / 실패를 판단할 수 없이 끝난 호출(예상 밖 오류, 취소)의 half-open 시험 호출 자리를 반납합니다.
+        실패 횟수와 열림 상태는 그대로 두므로 다음 호출이 다시 시험 호출이 됩니다.
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.threshold):
+                if self._opened_at is None:
+                    print(f"⛔ [LLM] Ollama at {self.host} failed {self._failures} times in a row. "
+                          f"Opening circuit for {self.cooldown:.0f}s.")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    @contextmanager
+    def guard(self):
+        """
+        LangChain(ChatOllama) 등 OllamaClient를 거치지 않는 호출을 감싸 회로 차단기에 반영합니다.
+        with get_circuit_breaker().guard(): llm.invoke(...)  (async 함수 안에서도 그대로 사용 가능)
+        """
+        self.before_call()
+        try:
+            yield
+        except BaseException as e:
+            if is_unavailable_error(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        else:
+            self.record_success()
+
+
+_breakers = {}
+_sessions = {}
+_transport_lock = threading.Lock()
+# 이벤트 루프 -> {host: httpx.AsyncClient}. AsyncClient는 생성된 루프에서만 사용해야 하므로 루프별로 유지
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_circuit_breaker(host=None) -> CircuitBreaker:
+    """
+    호스트의 회로 차단기. host를 생략하면 기본 호스트의 회로 차단기이고,
+    OLLAMA_HOSTS에 여러 호스트가 있으면 모든 호스트를 쓸 수 없을 때 열린 것으로 보는 호스트 풀(is_open / retry_after)입니다.
+    """
+    if host is None and ollama_pool.multi:
+        return ollama_pool
+    host = host or DEFAULT_OLLAMA_HOST
+    with _transport_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def get_session(host) -> requests.Session:
+    """호스트별로 공유하는 keep-alive 세션 (스레드 간 공유, 커넥션 풀 POOL_SIZE)"""
+    with _transport_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def get_async_client(host) -> httpx.AsyncClient:
+    """현재 이벤트 루프에서 호스트별로 공유하는 keep-alive AsyncClient"""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(host)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+        )
+        clients[host] = client
+    return client
+
+
+async def aclose_async_clients():
+    """현재 이벤트 루프의 AsyncClient들을 닫습니다 (asyncio 워커 종료 시)."""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def ollama_chat_kwargs() -> dict:
+    """ChatOllama에 같은 타임아웃 / 연결 재시도 / 커넥션 풀 / keep_alive 설정을 적용하기 위한 인자"""
+    limits = httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)
+    return {
+        "keep_alive": KEEP_ALIVE or None,
+        "client_kwargs": {"timeout": httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)},
+        "sync_client_kwargs": {"transport": httpx.HTTPTransport(retries=MAX_RETRIES, limits=limits)},
+        "async_client_kwargs": {"transport": httpx.AsyncHTTPTransport(retries=MAX_RETRIES, limits=limits)},
+    }
+
+
+# ==============================================================================
+# 다중 호스트 풀 (헬스 체크 / 모델 인식 라우팅 / 최소 진행 요청 분산 / Failover)
+# ==============================================================================
+
+def can_fail_over(exc) -> bool:
+    """다른 호스트로 다시 보내도 되는 오류인지"""
+    # 읽기 타임아웃은 서버가 이미 생성 중일 수 있어 다른 호스트로 다시 보내지 않음 (부하만 가중)
+    if isinstance(exc, (requests.ReadTimeout, httpx.ReadTimeout)):
+        return False
+    return is_unavailable_error(exc)
+
+
+def _model_set(payload):
+    return {normalize_model_name(m.get("name") or m.get("model", "")) for m in payload.get("models", [])}
+
+
+class OllamaHostPool:
+    """
+    여러 Ollama 서버(OLLAMA_HOSTS)에 요청을 나눠 보내는 호스트 풀.
+    - 헬스 체크: 백그라운드 스레드가 HEALTH_CHECK_INTERVAL마다 /api/tags(설치된 모델), /api/ps(로드된 모델)를 조회
+    - 모델 인식 라우팅: 모델이 설치된 호스트로만 보냄 (어디에도 없으면 모든 호스트)
+    - 분산: 진행 중인 요청이 가장 적은 호스트부터 (Least Outstanding Requests).
+      모델이 로드되지 않은 호스트는 COLD_HOST_PENALTY만큼 더 밀린 것으로 보아, 로드된 호스트가 한가하면 그쪽을 우선
+    - Failover: 연결 실패 / 5xx / 회로 열림이면 다음 호스트로 다시 보냄. 호스트별 회로 차단기는 그대로 사용
+    호스트가 하나면 헬스 체크 스레드 없이 기존과 같게 동작합니다.
+    """
+
+    def __init__(self, hosts, interval: float = HEALTH_CHECK_INTERVAL):
+        self.hosts = list(dict.fromkeys(hosts))
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._outstanding = {h: 0 for h in self.hosts}
+        self._requests = defaultdict(int)
+        self._failovers = 0
+        # 확인 전에는 정상 / 모델 정보 없음(None)으로 간주
+        self._healthy = {h: True for h in self.hosts}
+        self._installed = {h: None for h in self.hosts}
+        self._loaded = {h: set() for h in self.hosts}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def multi(self) -> bool:
+        return len(self.hosts) > 1
+
+    # --- 헬스 체크 ---
+
+    def check(self, host) -> bool:
+        """호스트 하나의 상태와 설치/로드된 모델을 갱신합니다. Returns: 정상 여부"""
+        session = get_session(host)
+        try:
+            tags = session.get(f"{host}/api/tags", timeout=(CONNECT_TIMEOUT, 10))
+            tags.raise_for_status()
+            running = session.get(f"{host}/api/ps", timeout=(CONNECT_TIMEOUT, 10))
+            running.raise_for_status()
+            installed, loaded = _model_set(tags.json()), _model_set(running.json())
+        except (requests.RequestException, ValueError) as e:
+            with self._lock:
+                was_healthy, self._healthy[host] = self._healthy[host], False
+            if was_healthy:
+                print(f"⚠️ [LLM] Ollama host {host} failed health check: {e}")
+            return False
+
+        with self._lock:
+            was_healthy, self._healthy[host] = self._healthy[host], True
+            self._installed[host] = installed
+            self._loaded[host] = loaded
+        if not was_healthy:
+            print(f"✅ [LLM] Ollama host {host} passed health check. Routing requests to it again.")
+        # 회로가 열려 있었다면 쿨다운을 기다리지 않고 바로 닫음
+        get_circuit_breaker(host).record_success()
+        return True
+
+    def check_all(self):
+        for host in self.hosts:
+            self.check(host)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check_all()
+
+    def start(self):
+        """(여러 호스트일 때) 한 번 바로 확인하고 백그라운드 헬스 체크를 시작합니다. 여러 번 불러도 한 번만 시작"""
+        with self._lock:
+            if not self.multi or self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name='ollama-health', daemon=True)
+        self.check_all()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # --- 라우팅 ---
+
+    def available(self, host) -> bool:
+        with self._lock:
+            healthy = self._healthy[host]
+        return healthy and not get_circuit_breaker(host).is_open()
+
+    def candidates(self, model: str = None):
+        """요청을 보낼 호스트 순서 (모델이 설치된 호스트 중 진행 요청 수 + 콜드 로드 몫이 적은 순)"""
+        self.start()
+        usable = [h for h in self.hosts if self.available(h)]
+        with self._lock:
+            if not model:
+                return sorted(usable, key=lambda h: (self._outstanding[h], random.random()))
+            name = normalize_model_name(model)
+            installed = [h for h in usable if self._installed[h] is None or name in self._installed[h]]
+
+            def load(host):
+                cold = 0 if name in self._loaded[host] else COLD_HOST_PENALTY
+                return self._outstanding[host] + cold, random.random()
+
+            # 어느 호스트에도 없는 모델(Pull 등)은 모든 호스트를 후보로
+            return sorted(installed or usable, key=load)
+
+    @contextmanager
+    def track(self, host):
+        with self._lock:
+            self._outstanding[host] += 1
+            self._requests[host] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._outstanding[host] -= 1
+
+    def _mark_loaded(self, host, model):
+        if model:
+            with self._lock:
+                self._loaded[host].add(normalize_model_name(model))
+
+    def _failed_over(self, host, exc):
+        with self._lock:
+            self._failovers += 1
+        print(f"↪️ [LLM] Ollama host {host} failed ({exc}). Failing over to the next host...")
+
+    def call(self, model, send):
+        """
+        send(host, retries)를 후보 호스트 순서대로 시도합니다 (OllamaClient용).
+        마지막 후보에서만 같은 호스트 재시도(retries)를 허용하고, 그 전에는 곧바로 다음 호스트로 넘어갑니다.
+        """
+        hosts = self.candidates(model)
+        if not hosts:
+            raise OllamaUnavailableError("No healthy Ollama host is available.")
+        for i, host in enumerate(hosts):
+            last = i == len(hosts) - 1
+            try:
+                with self.track(host):
+                    result = send(host, MAX_RETRIES if last else 0)
+            except Exception as e:
+                if last or not can_fail_over(e):
+                    raise
+                self._failed_over(host, e)
+                continue
+            self._mark_loaded(host, model)
+            return result
+
+    async def acall(self, model, send):
+        """call()의 asyncio 버전 (send는 코루틴 함수)"""
+        hosts = self.candidates(model)
+        if not hosts:
+            raise OllamaUnavailableError("No healthy Ollama host is available.")
+        for i, host in enumerate(hosts):
+            last = i == len(hosts) - 1
+            try:
+                with self.track(host):
+                    result = await send(host, MAX_RETRIES if last else 0)
+            except Exception as e:
+                if last or not can_fail_over(e):
+                    raise
+                self._failed_over(host, e)
+                continue
+            self._mark_loaded(host, model)
+            return result
+
+    def invoke(self, model, call):
+        """
+        call(host)를 후보 호스트 순서대로 시도합니다 (ChatOllama처럼 OllamaClient를 거치지 않는 호출용).
+        호스트별 회로 차단기로 감싸므로 실패가 그 호스트의 회로에 반영됩니다.
+        """
+        return self.call(model, lambda host, retries: self._guarded(host, call))
+
+    async def ainvoke(self, model, call):
+        """invoke()의 asyncio 버전 (call(host)는 awaitable을 반환)"""
+        async def send(host, retries):
+            with get_circuit_breaker(host).guard():
+                return await call(host)
+        return await self.acall(model, send)
+
+    @staticmethod
+    def _guarded(host, call):
+        with get_circuit_breaker(host).guard():
+            return call(host)
+
+    # --- 상태 ---
+
+    def before_call(self):
+        """모든 호스트를 쓸 수 없으면 즉시 OllamaUnavailableError (슬롯을 기다리기 전에 확인)"""
+        if self.is_open():
+            raise OllamaUnavailableError("All Ollama hosts are unavailable (circuit open or failing health checks).")
+
+    def is_open(self) -> bool:
+        """모든 호스트를 쓸 수 없으면 True (러너는 이때 새 LLM 작업 배정을 멈춤)"""
+        return not any(self.available(h) for h in self.hosts)
+
+    def retry_after(self) -> float:
+        """가장 먼저 다시 시도할 수 있는 호스트까지 남은 시간(초)"""
+        waits = []
+        for host in self.hosts:
+            with self._lock:
+                healthy = self._healthy[host]
+            # 헬스 체크에 실패한 호스트는 다음 헬스 체크 때 다시 확인됨
+            waits.append(get_circuit_breaker(host).retry_after() if healthy else self.interval)
+        return min(waits) if waits else 0.0
+
+    def stats(self):
+        """호스트별 상태 / 진행 중 요청 / 누적 요청 / 로드된 모델 수, failover 횟수"""
+        with self._lock:
+            hosts = {
+                host: {
+                    "healthy": self._healthy[host],
+                    "outstanding": self._outstanding[host],
+                    "requests": self._requests[host],
+                    "loaded": sorted(self._loaded[host]),
+                }
+                for host in self.hosts
+            }
+            return {"hosts": hosts, "failovers": self._failovers}
+
+
+ollama_pool = OllamaHostPool(OLLAMA_HOSTS)
+
+
+# ==============================================================================
+# 호출 계측 (Instrumentation)
+# ==============================================================================
+# Ollama 응답의 prompt_eval_count / eval_count / *_duration 값을 호출마다 관찰자(call_observers)에게 넘깁니다.
+# 어떤 태스크 / 에이전트 / 사용자의 호출인지는 러너가 llm_call_context()로 지정하며 (contextvars),
+# 같은 실행 안에서 부르는 도구 / 요약 호출까지 그대로 이어집니다. 저장은 corp.llm_accounting이 맡습니다.
+
+# Ollama가 응답에 넣어 주는 토큰 수 / 소요 시간(ns) 항목
+USAGE_KEYS = ("prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration", "load_duration", "total_duration")
+
+_call_context = ContextVar("llm_call_context", default={})
+
+# 호출 1건마다 record(dict)로 불리는 함수 목록
+call_observers = []
+
+
+@contextmanager
+def llm_call_context(**fields):
+    """
+    이 블록 안의 LLM 호출에 붙일 정보(task_id, agent_id, owner_id)를 지정합니다. 바깥 블록의 값과 합쳐집니다.
+    with llm_call_context(task_id=task.id, agent_id=agent.id, owner_id=agent.owner_id): workflow.invoke(...)
+    """
+    token = _call_context.set({**_call_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def ollama_usage(payload) -> dict:
+    """Ollama 응답(dict) 또는 ChatOllama 메시지의 response_metadata에서 토큰 수 / 소요 시간만 골라냅니다."""
+    return {k: payload[k] for k in USAGE_KEYS if isinstance(payload, dict) and payload.get(k) is not None}
+
+
+def observe_llm_call(model: str, purpose: str, usage: dict, elapsed: float, cache_hit: bool = False):
+    """LLM 호출 1건을 관찰자에게 알립니다 (관찰자의 오류는 호출 결과에 영향을 주지 않음)."""
+    if not call_observers:
+        return
+    record = {
+        **_call_context.get(),
+        "model": normalize_model_name(model or ""), "purpose": purpose,
+        # 캐시에서 돌려준 응답은 GPU를 쓰지 않았으므로 토큰 수 / 소요 시간을 0으로 셈
+        "usage": {} if cache_hit else usage, "elapsed": elapsed, "cache_hit": cache_hit,
+    }
+    for observer in list(call_observers):
+        try:
+            observer(record)
+        except Exception as e:
+            print(f"⚠️ [LLM] Call observer failed: {e}")
+
+
+def observe_chat_response(model: str, purpose: str, message, elapsed: float):
+    """ChatOllama 응답 메시지를 관찰자에게 알립니다 (응답 캐시에서 온 메시지는 cache_hit으로 표시되어 있음)."""
+    metadata = getattr(message, "response_metadata", None) or {}
+    observe_llm_call(model, purpose, ollama_usage(metadata), elapsed, cache_hit=bool(metadata.get("cache_hit")))
+
 
 class OllamaClient:
     """
     A client for interacting with the Ollama API.
+    호스트별 keep-alive 세션을 공유하고, 연결 실패/5xx는 jitter 백오프로 재시도하며,
+    연속 실패 시 회로 차단기로 호출을 즉시 거절합니다 (OllamaUnavailableError).
+    [추가] host를 지정하지 않았고 OLLAMA_HOSTS에 여러 호스트가 있으면 요청마다 호스트 풀(ollama_pool)에서
+    모델이 있는 호스트를 골라 보내고, 실패하면 다음 호스트로 넘깁니다.
     """
     def __init__(self, host=None):
-        self.host = host or os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+        # host가 None이면 풀 모드 (요청마다 호스트를 고름)
+        self.host = host or (None if ollama_pool.multi else DEFAULT_OLLAMA_HOST)
+        self.timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+        # (풀 모드의 breaker는 모든 호스트를 쓸 수 없을 때 열린 것으로 보는 풀 자체)
+        self.breaker = get_circuit_breaker(self.host)
+
+    def _send_to(self, host, method, endpoint, timeout=None, retries=MAX_RETRIES, **kwargs):
+        url = f"{host}{endpoint}"
+        timeout = timeout or self.timeout
+        session = get_session(host)
+        breaker = get_circuit_breaker(host)
+        # [변경] 회로 차단기에는 재시도를 모두 포함한 호출 1건을 한 번의 성공 / 실패로 반영
+        # (시도마다 세면 요청 두어 건의 실패로 회로가 열리고, half-open 시험 호출이 재시도하지 못함)
+        breaker.before_call()
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    response = session.request(method, url, timeout=timeout, **kwargs)
+                except requests.ConnectionError:
+                    # 연결 실패(ConnectTimeout 포함)는 요청이 처리되지 않았으므로 재시도
+                    if attempt >= retries:
+                        breaker.record_failure()
+                        raise
+                except requests.Timeout:
+                    # 읽기 타임아웃은 서버가 이미 생성 중일 수 있어 재시도하지 않음 (부하만 가중)
+                    breaker.record_failure()
+                    raise
+                else:
+                    if response.status_code not in RETRY_STATUS:
+                        breaker.record_success()
+                        response.raise_for_status()
+                        return response
+                    if attempt >= retries:
+                        breaker.record_failure()
+                        response.raise_for_status()
+                    response.close()
+                time.sleep(retry_delay(attempt))
+        except BaseException:
+            # [추가] 위에서 집계하지 않은 오류(ChunkedEncodingError 등)로 끝나도 half-open 시험 호출 자리를 반납
+            # (반납하지 않으면 회로가 시험 중 상태로 남아 이후 호출이 모두 거절됨)
+            breaker.release_probe()
+            raise
+
+    def _send(self, method, endpoint, timeout=None, model=None, **kwargs):
+        if self.host is not None:
+            return self._send_to(self.host, method, endpoint, timeout, **kwargs)
+        return ollama_pool.call(
+            model, lambda host, retries: self._send_to(host, method, endpoint, timeout, retries, **kwargs)
+        )
+
+    async def _asend_to(self, host, method, endpoint, retries=MAX_RETRIES, **kwargs):
+        url = f"{host}{endpoint}"
+        client = get_async_client(host)
+        breaker = get_circuit_breaker(host)
+        breaker.before_call()
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    response = await client.request(method, url, **kwargs)
+                except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError):
+                    if attempt >= retries:
+                        breaker.record_failure()
+                        raise
+                except httpx.TransportError:
+                    breaker.record_failure()
+                    raise
+                else:
+                    if response.status_code not in RETRY_STATUS:
+                        breaker.record_success()
+                        response.raise_for_status()
+                        return response
+                    if attempt >= retries:
+                        breaker.record_failure()
+                        response.raise_for_status()
+                await asyncio.sleep(retry_delay(attempt))
+        except BaseException:
+            # (DecodingError, 요청 중 CancelledError 등) _send_to()와 같은 이유로 시험 호출 자리를 반납
+            breaker.release_probe()
+            raise
+
+    async def _asend(self, method, endpoint, model=None, **kwargs):
+        if self.host is not None:
+            return await self._asend_to(self.host, method, endpoint, **kwargs)
+        return await ollama_pool.acall(
+            model, lambda host, retries: self._asend_to(host, method, endpoint, retries, **kwargs)
+        )
 
-    def _post(self, endpoint, payload):
-        url = f"{self.host}{endpoint}"
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json()
+    def _with_keep_alive(self, endpoint, payload):
+        if KEEP_ALIVE and endpoint in MODEL_ENDPOINTS and "keep_alive" not in payload:
+            payload = {**payload, "keep_alive": KEEP_ALIVE}
+        return payload
+
+    def _post(self, endpoint, payload, purpose=None):
+        started = time.monotonic()
+        result = self._send("POST", endpoint, model=payload.get("model"), json=self._with_keep_alive(endpoint, payload)).json()
+        self._observe(endpoint, payload, result, purpose, started)
+        return result
+
+    @staticmethod
+    def _observe(endpoint, payload, result, purpose, started):
+        # [추가] 모델 호출(생성 / 임베딩)의 토큰 수 / 소요 시간을 계측 (purpose를 지정하지 않으면 엔드포인트 이름)
+        if endpoint in MODEL_ENDPOINTS:
+            purpose = purpose or endpoint.rsplit("/", 1)[-1]
+            observe_llm_call(payload.get("model"), purpose, ollama_usage(result), time.monotonic() - started)
 
     def _get(self, endpoint):
-        url = f"{self.host}{endpoint}"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        # 조회용 API는 빠르게 응답하므로 읽기 타임아웃을 짧게
+        timeout = (CONNECT_TIMEOUT, 10)
+        if self.host is not None:
+            return self._send("GET", endpoint, timeout=timeout).json()
+
+        # 풀 모드: 모델 목록(/api/tags, /api/ps)은 응답한 모든 호스트의 목록을 합침
+        merged, error = {"models": []}, None
+        for host in ollama_pool.hosts:
+            if get_circuit_breaker(host).is_open():
+                continue
+            try:
+                payload = self._send_to(host, "GET", endpoint, timeout, retries=0).json()
+            except requests.RequestException as e:
+                error = e
+                continue
+            for item in payload.get("models", []):
+                merged["models"].append({**item, "host": host})
+        if not merged["models"] and error is not None:
+            raise error
+        return merged
 
-    def generate(self, model, prompt, stream=False, **kwargs):
+    async def _apost(self, endpoint, payload, purpose=None):
+        started = time.monotonic()
+        response = await self._asend("POST", endpoint, model=payload.get("model"), json=self._with_keep_alive(endpoint, payload))
+        result = response.json()
+        self._observe(endpoint, payload, result, purpose, started)
+        return result
+
+    def generate(self, model, prompt, stream=False, purpose=None, **kwargs):
         payload = {
             "model": model,
             "prompt": prompt,
             "stream": stream,
             **kwargs
         }
-        return self._post("/api/generate", payload)
+        return self._post("/api/generate", payload, purpose)
 
-    def chat(self, model, messages, stream=False, **kwargs):
+    def chat(self, model, messages, stream=False, purpose=None, **kwargs):
         payload = {
             "model": model,
             "messages": messages,
             "stream": stream,
             **kwargs
         }
-        return self._post("/api/chat", payload)
+        return self._post("/api/chat", payload, purpose)
 
     def embeddings(self, model, prompt):
         payload = {
             "model": model,
             "prompt": prompt
         }
-        return self._post("/api/embeddings", payload)
+        return self._post("/api/embeddings", payload, "embedding")
+
+    def embed(self, model, inputs, purpose="embedding", **kwargs):
+        """여러 입력을 한 번의 요청으로 임베딩합니다 (/api/embed). Returns: {'embeddings': [[...], ...]}"""
+        payload = {
+            "model": model,
+            "input": list(inputs),
+            **kwargs
+        }
+        return self._post("/api/embed", payload, purpose)
+
+    # --- 비동기(asyncio) 버전: 이벤트 루프를 막지 않고 Ollama를 호출 ---
+
+    async def agenerate(self, model, prompt, purpose=None, **kwargs):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            **kwargs
+        }
+        return await self._apost("/api/generate", payload, purpose)
+
+    async def achat(self, model, messages, purpose=None, **kwargs):
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": False,
+            **kwargs
+        }
+        return await self._apost("/api/chat", payload, purpose)
+
+    async def aembeddings(self, model, prompt):
+        payload = {
+            "model": model,
+            "prompt": prompt
+        }
+        return await self._apost("/api/embeddings", payload, "embedding")
 
     def pull_model(self, model):
-        url = f"{self.host}/api/pull"
+        # (풀 모드: 진행 요청이 가장 적은 호스트에 내려받음. 스트리밍이므로 failover하지 않음)
+        host = self.host or next(iter(ollama_pool.candidates(model)), DEFAULT_OLLAMA_HOST)
+        url = f"{host}/api/pull"
         payload = {
             "name": model,
             "stream": True
         }
-        with requests.post(url, json=payload, stream=True) as response:
-            response.raise_for_status()
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    try:
-                        yield json.loads(chunk.decode('utf-8'))
-                    except json.JSONDecodeError:
-                        pass
+        # [변경] 요청과 스트리밍 전체의 결과를 회로 차단기에 반영 (half-open 시험 호출이 시험 중 상태로 남지 않게)
+        with get_circuit_breaker(host).guard():
+            with get_session(host).post(url, json=payload, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=8192):
+                    if chunk:
+                        try:
+                            yield json.loads(chunk.decode('utf-8'))
+                        except json.JSONDecodeError:
+                            pass
 
     def list_models(self):
         return self._get("/api/tags")
+
+    def list_running(self):
+        """현재 메모리에 올라와 있는 모델 목록 (/api/ps). Returns: {'models': [{'name', 'expires_at', 'size_vram', ...}]}"""
+        return self._get("/api/ps")
+
+
+
+# ==============================================================================
+# 동시 호출 제한 (Admission Control)
+# ==============================================================================
+
+class LLMQueueFullError(RuntimeError):
+    """모델의 대기열이 가득 차서 호출을 받아들일 수 없을 때"""
+
+
+class LLMQueueTimeoutError(LLMQueueFullError):
+    """대기열에서 제한 시간 안에 차례가 오지 않았을 때"""
+
+
+def normalize_model_name(model: str) -> str:
+    """Ollama는 태그가 없으면 ':latest'로 취급하므로 같은 모델을 같은 키로 묶습니다."""
+    return model if ":" in model else f"{model}:latest"
+
+
+def parse_model_limits(raw: str) -> dict:
+    """'qwen3:8b=4,nomic-embed-text=8' 형식을 {model: limit}으로 변환합니다."""
+    limits = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        model, value = item.rsplit("=", 1)
+        try:
+            limits[normalize_model_name(model.strip())] = max(1, int(value))
+        except ValueError:
+            pass
+    return limits
+
+
+class ModelLimiter:
+    """
+    Ollama 모델별 동시 호출 수를 제한하는 중앙 리미터.
+    에이전트 추론(chat), 결재(review), 웹 요약(summarize), 임베딩(embedding) 호출이
+    같은 모델 슬롯을 공유하고, 슬롯이 없으면 상한이 있는 대기열에서 순서를 기다립니다.
+    스레드 워커는 slot(), asyncio 워커는 aslot()을 사용하며 두 방식이 같은 슬롯을 나눠 씁니다.
+    (프로세스 단위 리미터이므로 process 워커 모드에서는 프로세스마다 따로 적용됩니다.)
+    [추가] 상한은 Ollama 서버 한 대 기준이며, OLLAMA_HOSTS의 호스트 수(hosts)만큼 곱해서 적용합니다.
+    """
+
+    def __init__(self, default_limit: int = 2, limits: dict = None, max_queue: int = 64, queue_timeout: float = 300,
+                 hosts: int = 1):
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self.hosts = max(1, hosts)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._conditions = {}
+        self._active = defaultdict(int)
+        self._waiting = defaultdict(int)
+        # model -> 슬롯을 기다리는 asyncio 대기자 [(loop, future)]. 슬롯이 반납되면 우선적으로 넘겨받음
+        self._async_waiters = defaultdict(deque)
+        # (model, purpose) -> 지표
+        self._calls = defaultdict(int)
+        self._rejected = defaultdict(int)
+        self._wait_total = defaultdict(float)
+        self._wait_samples = defaultdict(lambda: deque(maxlen=500))
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            default_limit=int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2")),
+            limits=parse_model_limits(os.getenv("OLLAMA_MODEL_CONCURRENCY", "")),
+            max_queue=int(os.getenv("OLLAMA_MAX_QUEUE", "64")),
+            queue_timeout=float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "300")),
+            hosts=len(OLLAMA_HOSTS),
+        )
+
+    def limit_for(self, model: str) -> int:
+        return self.limits.get(normalize_model_name(model), self.default_limit) * self.hosts
+
+    def _condition(self, model):
+        with self._lock:
+            if model not in self._conditions:
+                self._conditions[model] = threading.Condition()
+            return self._conditions[model]
+
+    def _record_wait(self, key, started):
+        waited = time.monotonic() - started
+        self._calls[key] += 1
+        self._wait_total[key] += waited
+        self._wait_samples[key].append(waited)
+
+    def _release(self, model):
+        """슬롯 반납. asyncio 대기자가 있으면 슬롯을 그대로 넘겨주고, 없으면 스레드 대기자를 깨움"""
+        cond = self._condition(model)
+        with cond:
+            waiters = self._async_waiters[model]
+            while waiters:
+                loop, future = waiters.popleft()
+                self._waiting[model] -= 1
+                if future.cancelled():
+                    continue
+                try:
+                    loop.call_soon_threadsafe(self._resolve_waiter, model, future)
+                    return
+                except RuntimeError:
+                    # 대기자의 이벤트 루프가 이미 닫힘
+                    continue
+            self._active[model] -= 1
+            cond.notify()
+
+    def _resolve_waiter(self, model, future):
+        # (대기자 이벤트 루프에서 실행) 그 사이 대기자가 취소되었다면 넘겨받은 슬롯을 다시 반납
+        if future.done():
+            self._release(model)
+        else:
+            future.set_result(True)
+
+    @contextmanager
+    def slot(self, model: str, purpose: str = "chat", timeout: float = None):
+        """
+        모델 호출 슬롯을 얻는 컨텍스트 매니저.
+        with llm_limiter.slot("qwen3:8b", "review"): llm.invoke(...)
+        Raises: LLMQueueFullError (대기열 초과), LLMQueueTimeoutError (대기 시간 초과)
+        """
+        model = normalize_model_name(model)
+        key = (model, purpose)
+        limit = self.limit_for(model)
+        timeout = self.queue_timeout if timeout is None else timeout
+        cond = self._condition(model)
+        started = time.monotonic()
+
+        with cond:
+            if self._active[model] >= limit:
+                if self._waiting[model] >= self.max_queue:
+                    self._rejected[key] += 1
+                    raise LLMQueueFullError(f"LLM queue for '{model}' is full ({self.max_queue} waiting).")
+                self._waiting[model] += 1
+                try:
+                    deadline = started + timeout
+                    while self._active[model] >= limit:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._rejected[key] += 1
+                            raise LLMQueueTimeoutError(f"Timed out after {timeout:.0f}s waiting for a '{model}' slot.")
+                        cond.wait(remaining)
+                finally:
+                    self._waiting[model] -= 1
+            self._active[model] += 1
+            self._record_wait(key, started)
+
+        try:
+            yield
+        finally:
+            self._release(model)
+
+    @asynccontextmanager
+    async def aslot(self, model: str, purpose: str = "chat", timeout: float = None):
+        """
+        slot()의 asyncio 버전. 기다리는 동안 스레드를 점유하지 않고 이벤트 루프에 양보합니다.
+        async with llm_limiter.aslot("qwen3:8b", "chat"): await llm.ainvoke(...)
+        """
+        model = normalize_model_name(model)
+        key = (model, purpose)
+        limit = self.limit_for(model)
+        timeout = self.queue_timeout if timeout is None else timeout
+        cond = self._condition(model)
+        started = time.monotonic()
+        future = None
+
+        with cond:
+            if self._active[model] < limit:
+                self._active[model] += 1
+            else:
+                if self._waiting[model] >= self.max_queue:
+                    self._rejected[key] += 1
+                    raise LLMQueueFullError(f"LLM queue for '{model}' is full ({self.max_queue} waiting).")
+                self._waiting[model] += 1
+                future = asyncio.get_running_loop().create_future()
+                self._async_waiters[model].append((asyncio.get_running_loop(), future))
+
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except BaseException as e:
+                with cond:
+                    queued = any(f is future for _, f in self._async_waiters[model])
+                    if queued:
+                        self._async_waiters[model] = deque(w for w in self._async_waiters[model] if w[1] is not future)
+                        self._waiting[model] -= 1
+                    if isinstance(e, asyncio.TimeoutError):
+                        self._rejected[key] += 1
+                if not queued:
+                    # 타임아웃/취소와 거의 동시에 슬롯이 넘어온 경우: 받은 슬롯을 돌려줌
+                    if future.done() and not future.cancelled():
+                        self._release(model)
+                    else:
+                        future.cancel()  # 예약된 _resolve_waiter가 슬롯을 반납
+                if isinstance(e, asyncio.TimeoutError):
+                    raise LLMQueueTimeoutError(f"Timed out after {timeout:.0f}s waiting for a '{model}' slot.") from None
+                raise
+
+        with cond:
+            self._record_wait(key, started)
+
+        try:
+            yield
+        finally:
+            self._release(model)
+
+    def stats(self):
+        """모델/용도별 호출 수, 거절 수, 대기 시간(평균/p95/최대), 현재 실행/대기 수"""
+        result = {}
+        with self._lock:
+            keys = set(self._calls) | set(self._rejected)
+            for model, purpose in sorted(keys):
+                samples = sorted(self._wait_samples[(model, purpose)])
+                calls = self._calls[(model, purpose)]
+                result[(model, purpose)] = {
+                    "calls": calls,
+                    "rejected": self._rejected[(model, purpose)],
+                    "wait_avg": (self._wait_total[(model, purpose)] / calls) if calls else 0.0,
+                    "wait_p95": samples[int(0.95 * (len(samples) - 1))] if samples else 0.0,
+                    "wait_max": samples[-1] if samples else 0.0,
+                    "active": self._active[model],
+                    "waiting": self._waiting[model],
+                    "limit": self.limit_for(model),
+                }
+        return result
+
+
+# 프로세스 전역 리미터 (모든 Ollama 호출 지점이 공유)
+llm_limiter = ModelLimiter.from_env()
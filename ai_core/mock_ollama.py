@@ -0,0 +1,292 @@
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from ai_core.llm_gateway import normalize_model_name
+from ai_core.tokens import estimate_tokens
+
+# ==============================================================================
+# 로컬 벤치마크용 가짜(Mock) Ollama 서버
+# ==============================================================================
+# GPU 없이 러너 / 웹의 처리량을 측정하기 위한 Ollama HTTP API 흉내.
+# 지연 시간(latency / jitter)과 도구 호출 시나리오(tool_script)를 설정할 수 있고,
+# 응답에는 실제 서버처럼 prompt_eval_count / eval_count / *_duration 값을 채웁니다.
+# 지원 API: /api/chat (도구 호출 포함), /api/generate, /api/embeddings, /api/embed,
+#           /api/tags, /api/ps, /api/pull, /api/version
+
+# 결재(review) 프롬프트를 알아보는 표시 (ai_core.workflow._review_prompt의 출력 형식)
+REVIEW_MARKER = "DECISION: [APPROVE | REJECT]"
+
+DEFAULT_MODELS = ["qwen3:8b", "llama3.1:8b", "nomic-embed-text:latest"]
+
+
+def parse_tool_script(raw: str):
+    """
+    'calculator_tool={"expression": "6*7"},search_wiki_tool' 형식을 [(도구 이름, 인자 또는 None)]으로 바꿉니다.
+    인자를 생략하면 요청에 실린 도구 명세(JSON Schema)로부터 기본값을 만들어 채웁니다.
+    """
+    script = []
+    decoder = json.JSONDecoder()
+    raw = (raw or "").strip()
+    while raw:
+        name, sep, rest = raw.partition("=")
+        if sep and "," not in name:
+            args, end = decoder.raw_decode(rest.lstrip())
+            script.append((name.strip(), args))
+            raw = rest.lstrip()[end:].lstrip().lstrip(",").strip()
+        else:
+            name, _, raw = raw.partition(",")
+            if name.strip():
+                script.append((name.strip(), None))
+            raw = raw.strip()
+    return script
+
+
+def _default_args(parameters):
+    """도구 명세의 필수 인자를 타입별 기본값으로 채웁니다."""
+    samples = {"string": "benchmark", "integer": 1, "number": 1, "boolean": False, "array": [], "object": {}}
+    properties = (parameters or {}).get("properties", {})
+    return {
+        name: samples.get(properties.get(name, {}).get("type"), "benchmark")
+        for name in (parameters or {}).get("required", [])
+    }
+
+
+def _vector(text, dim):
+    """같은 텍스트에는 항상 같은 단위 벡터 (임베딩 캐시 / 검색 경로가 실제처럼 동작하도록)"""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    values = [rng.uniform(-1, 1) for _ in range(dim)]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class MockOllama:
+    """
+    가짜 Ollama 서버 (ThreadingHTTPServer, 요청마다 스레드 하나).
+    - latency / jitter: 생성 요청(/api/chat, /api/generate)마다 latency + uniform(0, jitter)초 대기
+    - embed_latency: 임베딩 요청마다 대기(초)
+    - tool_script: 에이전트 대화(도구가 실린 /api/chat)에서 도구 결과가 n개 쌓였으면 n번째 도구를 호출하고,
+      시나리오가 끝나면 최종 답변을 돌려줌. 요청에 없는 도구는 건너뜀
+    - approve_rate: 결재 요청에 APPROVE로 답할 확률 (나머지는 REJECT)
+    - strict: True면 models에 없는 모델 요청에 실제 서버처럼 404
+    """
+
+    def __init__(self, host="127.0.0.1", port=11435, latency=0.2, jitter=0.0, embed_latency=0.01,
+                 tool_script=None, approve_rate=1.0, models=None, embedding_dim=768, strict=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.embed_latency = embed_latency
+        self.tool_script = list(tool_script or [])
+        self.approve_rate = approve_rate
+        self.models = {normalize_model_name(m) for m in (models or DEFAULT_MODELS)}
+        self.embedding_dim = embedding_dim
+        self.strict = strict
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._loaded = set()
+        self._requests = defaultdict(int)
+        self._tool_calls = 0
+        self._thread = None
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # --- 서버 수명 ---
+
+    def start(self):
+        """백그라운드 스레드에서 서버를 시작합니다 (같은 프로세스의 벤치마크 / 테스트용)."""
+        self._thread = threading.Thread(target=self.server.serve_forever, name='mock-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        """엔드포인트별 요청 수와 응답한 도구 호출 수"""
+        with self._lock:
+            return {"requests": dict(self._requests), "tool_calls": self._tool_calls}
+
+    # --- 응답 생성 ---
+
+    def _sleep(self, base):
+        with self._lock:
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        if base + extra > 0:
+            time.sleep(base + extra)
+        return base + extra
+
+    def _check_model(self, model):
+        name = normalize_model_name(model or "")
+        if self.strict and name not in self.models:
+            return f"model '{model}' not found"
+        with self._lock:
+            self._loaded.add(name)
+        return None
+
+    def _usage(self, prompt_text, output_text, seconds):
+        prompt_tokens = estimate_tokens(prompt_text)
+        output_tokens = max(1, estimate_tokens(output_text))
+        # 대기 시간을 프롬프트 평가 / 생성에 토큰 수 비율로 나눠 실제 서버와 같은 모양의 값을 채움
+        total_ns = int(seconds * 1e9)
+        prompt_ns = total_ns * prompt_tokens // max(1, prompt_tokens + output_tokens * 20)
+        return {
+            "total_duration": total_ns,
+            "load_duration": 0,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": prompt_ns,
+            "eval_count": output_tokens,
+            "eval_duration": total_ns - prompt_ns,
+        }
+
+    def _script_step(self, messages, tools):
+        """이번 단계에 호출할 도구 (이름, 인자). 시나리오가 끝났으면 None"""
+        specs = {t.get("function", {}).get("name"): t.get("function", {}) for t in tools or []}
+        done = sum(1 for m in messages if m.get("role") == "tool")
+        steps = [(name, args) for name, args in self.tool_script if name in specs]
+        if done >= len(steps):
+            return None
+        name, args = steps[done]
+        return name, args if args is not None else _default_args(specs[name].get("parameters"))
+
+    def chat(self, body):
+        messages = body.get("messages") or []
+        prompt_text = "\n".join(str(m.get("content") or "") for m in messages)
+        message = {"role": "assistant", "content": ""}
+        if REVIEW_MARKER in prompt_text:
+            with self._lock:
+                approve = self._random.random() < self.approve_rate
+            message["content"] = (
+                "DECISION: APPROVE\nFEEDBACK: The proposal is complete and aligned with the goal."
+                if approve else
+                "DECISION: REJECT\nFEEDBACK: Please add more detail and concrete next steps."
+            )
+        else:
+            step = self._script_step(messages, body.get("tools"))
+            if step is not None:
+                message["tool_calls"] = [{"function": {"name": step[0], "arguments": step[1]}}]
+                with self._lock:
+                    self._tool_calls += 1
+            else:
+                message["content"] = (
+                    "FINAL RESULT: I reviewed the task, used the available tools and completed the work. "
+                    "Summary: all requested items are done."
+                )
+        seconds = self._sleep(self.latency)
+        output = message["content"] + json.dumps(message.get("tool_calls", []))
+        return {
+            "model": body.get("model"), "created_at": _now(), "message": message,
+            "done": True, "done_reason": "stop", **self._usage(prompt_text, output, seconds),
+        }
+
+    def generate(self, body):
+        prompt = body.get("prompt") or ""
+        if not prompt:
+            # 빈 프롬프트는 모델 로드(예열)만 하고 바로 반환
+            return {"model": body.get("model"), "created_at": _now(), "response": "", "done": True, "done_reason": "load"}
+        seconds = self._sleep(self.latency)
+        response = f"Summary: {prompt[:200].strip()}"
+        return {
+            "model": body.get("model"), "created_at": _now(), "response": response,
+            "done": True, "done_reason": "stop", **self._usage(prompt, response, seconds),
+        }
+
+    def embed(self, body):
+        inputs = body.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        if inputs:
+            self._sleep(self.embed_latency)
+        return {
+            "model": body.get("model"),
+            "embeddings": [_vector(text, self.embedding_dim) for text in inputs],
+            "prompt_eval_count": sum(estimate_tokens(text) for text in inputs),
+        }
+
+    def embeddings(self, body):
+        self._sleep(self.embed_latency)
+        return {"embedding": _vector(body.get("prompt") or "", self.embedding_dim)}
+
+    def tags(self):
+        return {"models": [{"name": m, "model": m} for m in sorted(self.models)]}
+
+    def running(self):
+        expires_at = (datetime.now(timezone.utc) + timedelta(minutes=30)).isoformat().replace("+00:00", "Z")
+        with self._lock:
+            loaded = sorted(self._loaded)
+        return {"models": [{"name": m, "model": m, "expires_at": expires_at, "size_vram": 1} for m in loaded]}
+
+    # --- HTTP ---
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload, status=200, stream=False):
+                body = (json.dumps(payload) + ("\n" if stream else "")).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson" if stream else "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                with mock._lock:
+                    mock._requests[path] += 1
+                if path == "/api/tags":
+                    return self._send(mock.tags())
+                if path == "/api/ps":
+                    return self._send(mock.running())
+                if path == "/api/version":
+                    return self._send({"version": "0.0.0-mock"})
+                self._send({"error": "not found"}, 404)
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                with mock._lock:
+                    mock._requests[path] += 1
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                except ValueError:
+                    return self._send({"error": "invalid JSON body"}, 400)
+
+                if path == "/api/pull":
+                    with mock._lock:
+                        mock.models.add(normalize_model_name(body.get("name") or body.get("model") or ""))
+                    return self._send({"status": "success"}, stream=bool(body.get("stream", True)))
+
+                handlers = {
+                    "/api/chat": mock.chat, "/api/generate": mock.generate,
+                    "/api/embed": mock.embed, "/api/embeddings": mock.embeddings,
+                }
+                if path not in handlers:
+                    return self._send({"error": "not found"}, 404)
+                error = mock._check_model(body.get("model"))
+                if error:
+                    return self._send({"error": error}, 404)
+                # 스트리밍 요청(ChatOllama 기본값)에는 완료된 응답을 NDJSON 한 줄로 보냄
+                stream = path in ("/api/chat", "/api/generate") and body.get("stream", True)
+                self._send(handlers[path](body), stream=stream)
+
+        return Handler
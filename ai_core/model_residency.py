@@ -0,0 +1,210 @@
+import os
+import time
+import threading
+from datetime import datetime
+from ai_core.llm_gateway import OllamaClient, KEEP_ALIVE, normalize_model_name
+
+# /api/ps 로 로드된 모델 목록을 갱신하는 주기(초)
+RESIDENCY_REFRESH = float(os.getenv("OLLAMA_RESIDENCY_REFRESH", "30"))
+
+# 같은 모델의 예열(warm-up) 요청 사이 최소 간격(초). 로드 중에 중복 요청이 쌓이지 않도록
+WARMUP_MIN_INTERVAL = float(os.getenv("OLLAMA_WARMUP_MIN_INTERVAL", "30"))
+
+# 모델 용도. 용도에 따라 모델을 올리는 API가 다름 (생성 모델: /api/generate, 임베딩 모델: /api/embed)
+CHAT = "chat"
+EMBEDDING = "embedding"
+
+
+class PreflightError(RuntimeError):
+    """필요한 모델이 없고 내려받지도 못했을 때"""
+
+
+def _model_names(payload):
+    return {normalize_model_name(m.get("name") or m.get("model", "")) for m in payload.get("models", [])}
+
+
+def preflight(models, pull: bool = True, client: OllamaClient = None, log=print):
+    """
+    필요한 모델이 Ollama에 설치되어 있는지 확인하고, 없으면 (pull=True일 때) 미리 내려받습니다.
+    작업 도중(첫 임베딩 / 첫 태스크)에 모델이 없다는 것을 알게 되는 대신 시작할 때 실패하도록 합니다.
+    Args:
+        models: {모델 이름: 용도} (용도는 CHAT / EMBEDDING)
+    Returns: {모델 이름: 'ok' | 'pulled'}
+    Raises: PreflightError (설치되지 않았고 내려받지도 못한 모델이 있을 때),
+            requests 예외 (Ollama 서버에 연결할 수 없을 때)
+    """
+    client = client or OllamaClient()
+    installed = _model_names(client.list_models())
+    result = {}
+    missing = []
+    for model in models:
+        if normalize_model_name(model) in installed:
+            result[model] = "ok"
+            continue
+        if not pull:
+            missing.append(model)
+            continue
+
+        log(f"📥 [Preflight] Model '{model}' is not installed. Pulling now... (Please wait)")
+        try:
+            last_status = ""
+            for progress in client.pull_model(model):
+                if progress.get("error"):
+                    raise RuntimeError(progress["error"])
+                status = progress.get("status", "")
+                # 진행 상황 로그가 너무 많으므로 단계가 바뀔 때만 출력
+                if status != last_status and not status.startswith("pulling "):
+                    log(f"   ↳ {status}")
+                last_status = status
+        except Exception as e:
+            log(f"❌ [Preflight] Failed to pull '{model}': {e}")
+            missing.append(model)
+            continue
+        result[model] = "pulled"
+
+    if missing:
+        raise PreflightError(f"Required model(s) not available on Ollama: {', '.join(missing)}")
+    return result
+
+
+class ResidencyManager:
+    """
+    모델 상주(Residency) 관리자.
+    - /api/ps 로 어떤 모델이 메모리에 올라와 있는지(언제 내려갈지) 주기적으로 추적합니다.
+    - 작업이 몰려오기 직전(request_warmup) 올라와 있지 않은 모델을 빈 요청으로 미리 로드하여,
+      한가한 시간 뒤 첫 호출이 수십 초의 콜드 로드를 떠안지 않게 합니다.
+    - 모든 호출에는 keep_alive(OLLAMA_KEEP_ALIVE)가 붙으므로 로드된 모델은 그 시간 동안 유지됩니다.
+    러너 프로세스 하나에서 백그라운드 스레드로 동작하는 상태 객체입니다.
+    """
+
+    def __init__(self, models, client: OllamaClient = None, refresh_interval: float = RESIDENCY_REFRESH):
+        self.models = dict(models)
+        self.client = client or OllamaClient()
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._loaded = {}
+        self._last_warmup = {}
+        self._warmups = {}
+        self._warm_seconds = {}
+        self._pending = set()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- 상태 추적 ---
+
+    def refresh(self):
+        """/api/ps 로 로드된 모델 목록을 갱신합니다. Returns: {정규화된 모델 이름: ps 항목}"""
+        loaded = {}
+        for item in self.client.list_running().get("models", []):
+            loaded[normalize_model_name(item.get("name") or item.get("model", ""))] = item
+        with self._lock:
+            self._loaded = loaded
+        return loaded
+
+    def is_loaded(self, model) -> bool:
+        with self._lock:
+            return normalize_model_name(model) in self._loaded
+
+    # --- 예열 ---
+
+    def warm(self, model) -> bool:
+        """모델을 메모리에 올립니다 (빈 요청 + keep_alive). Returns: 성공 여부"""
+        purpose = self.models.get(model, CHAT)
+        started = time.monotonic()
+        with self._lock:
+            self._last_warmup[model] = started
+        try:
+            if purpose == EMBEDDING:
+                self.client.embed(model, [], purpose="warmup", keep_alive=KEEP_ALIVE)
+            else:
+                # 빈 프롬프트의 generate는 모델만 로드하고 바로 반환
+                self.client.generate(model, "", purpose="warmup", keep_alive=KEEP_ALIVE)
+        except Exception as e:
+            print(f"⚠️ [Residency] Failed to warm up '{model}': {e}")
+            return False
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._warmups[model] = self._warmups.get(model, 0) + 1
+            self._warm_seconds[model] = elapsed
+            self._loaded.setdefault(normalize_model_name(model), {"name": model})
+        print(f"🔥 [Residency] '{model}' loaded in {elapsed:.1f}s (keep_alive {KEEP_ALIVE}).")
+        return True
+
+    def ensure_loaded(self, models=None):
+        """올라와 있지 않은 모델을 (이 스레드에서) 예열합니다."""
+        for model in models or self.models:
+            if self.is_loaded(model):
+                continue
+            with self._lock:
+                recently = time.monotonic() - self._last_warmup.get(model, float("-inf")) < WARMUP_MIN_INTERVAL
+            if not recently:
+                self.warm(model)
+
+    def request_warmup(self, models=None):
+        """
+        곧 작업이 몰릴 것이므로 모델을 올려 두라고 요청합니다 (블록하지 않음).
+        이미 올라와 있는 모델은 아무 일도 하지 않으므로 스케줄링 루프마다 불러도 됩니다.
+        """
+        models = [m for m in (models or list(self.models)) if not self.is_loaded(m)]
+        if not models:
+            return
+        with self._lock:
+            # 시작할 때 몰랐던 모델(새로 지정된 에이전트 모델)도 추적 대상에 추가
+            for model in models:
+                self.models.setdefault(model, CHAT)
+            self._pending.update(models)
+        self._wake.set()
+
+    # --- 백그라운드 스레드 ---
+
+    def _run(self):
+        failing = False
+        while not self._stop.is_set():
+            # 서버가 내려가 회로가 열려 있으면 복구될 때까지 조회/예열하지 않음
+            if not self.client.breaker.is_open():
+                try:
+                    self.refresh()
+                    with self._lock:
+                        pending, self._pending = self._pending, set()
+                    if pending:
+                        self.ensure_loaded(pending)
+                    failing = False
+                except Exception as e:
+                    if not failing:
+                        print(f"⚠️ [Residency] Failed to refresh loaded models: {e}")
+                    failing = True
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='model-residency', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        """모델별 상주 상태 (로드 여부 / 언로드 예정 시각 / 예열 횟수 / 마지막 예열 소요 시간)"""
+        with self._lock:
+            result = {}
+            for model in self.models:
+                item = self._loaded.get(normalize_model_name(model))
+                expires_at = None
+                if item and item.get("expires_at"):
+                    try:
+                        expires_at = datetime.fromisoformat(item["expires_at"].replace("Z", "+00:00"))
+                    except ValueError:
+                        pass
+                result[model] = {
+                    "loaded": item is not None,
+                    "expires_at": expires_at,
+                    "size_vram": (item or {}).get("size_vram"),
+                    "warmups": self._warmups.get(model, 0),
+                    "last_warm_seconds": self._warm_seconds.get(model),
+                }
+            return result
@@ -0,0 +1,154 @@
+import os
+from datetime import timedelta
+from functools import lru_cache
+
+# ==============================================================================
+# 에이전트 시스템 프롬프트 조립 (Prefix-cache 친화적 배치)
+# ==============================================================================
+# Ollama는 직전 요청과 앞부분(prefix)이 같은 만큼 KV 캐시를 재사용하고, 달라진 지점부터 다시 평가합니다.
+# 그래서 프롬프트를 "가장 안 변하는 것 -> 가장 자주 변하는 것" 순서로 배치합니다.
+#   1. 에이전트 고정 영역 : 이름 / 역할 (에이전트의 모든 태스크에서 동일)
+#   2. 태스크 고정 영역   : 태스크 정보 / 팀 현황 / 단계별 지시 / 반려 이력 / 위임 규칙 (한 번의 실행 동안 동일)
+#   3. 변동 영역          : 현재 시각(PROMPT_TIME_RESOLUTION 단위로 내림) / CEO 공지
+# 변동 영역이 맨 뒤에 있으므로 바뀌더라도 그 뒤(대화 기록)만 다시 평가되고,
+# 시각은 내림 처리되어 한 번의 실행(도구 루프) 동안 사실상 바뀌지 않습니다.
+
+# 시스템 프롬프트에 넣는 현재 시각의 단위(초). 초 단위 시각은 매 단계 프롬프트를 바꿔 캐시를 무효화함
+PROMPT_TIME_RESOLUTION = int(os.getenv("PROMPT_TIME_RESOLUTION", "3600"))
+
+# 태스크 고정 영역을 몇 개의 실행까지 보관할지 (LRU)
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "256"))
+
+FIRING_WORDS = ['fire', 'layoff', 'dismiss', 'remove', 'delete']
+HIRING_WORDS = ['hire', 'recruit', 'create', 'new agent']
+
+
+def round_time(now, resolution: int = PROMPT_TIME_RESOLUTION):
+    """now를 resolution(초) 단위로 내립니다."""
+    if resolution <= 1:
+        return now.replace(microsecond=0)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = int((now - midnight).total_seconds())
+    return midnight + timedelta(seconds=elapsed - elapsed % resolution)
+
+
+def format_time(now, resolution: int = PROMPT_TIME_RESOLUTION) -> str:
+    rounded = round_time(now, resolution)
+    if resolution >= 86400:
+        return rounded.strftime("%Y-%m-%d %A")
+    if resolution >= 60:
+        return rounded.strftime("%Y-%m-%d %H:%M %A")
+    return rounded.strftime("%Y-%m-%d %H:%M:%S %A")
+
+
+def _instruction_prompt(task_title, task_description, task_status, prev_result, subordinate_count):
+    """상태(기획 / 집행)에 따른 지시문"""
+    # 태스크 의도 파악
+    task_context = (task_title + " " + task_description).lower()
+    is_firing_task = any(word in task_context for word in FIRING_WORDS)
+    is_hiring_task = any(word in task_context for word in HIRING_WORDS)
+
+    if task_status == "APPROVED":
+        # --- [집행 단계] ---
+        instruction_prompt = f"""
+            [STATUS: APPROVED - EXECUTION PHASE]
+            Your proposal has been APPROVED.
+
+            [Your Approved Plan]
+            {prev_result}
+
+            [ACTION REQUIRED]
+            Now, you must EXECUTE the plan using the appropriate tools.
+            Do NOT just say "I did it". actually USE THE TOOLS.
+            """
+
+        if is_firing_task:
+            if subordinate_count:
+                instruction_prompt += f"""
+                    [REALITY CHECK: FIRING]
+                    Look at [Your Team Status]. There are still {subordinate_count} subordinates listed.
+                    This means they are NOT fired yet.
+                    You MUST use 'fire_sub_agent' tool for each person you planned to fire.
+                    MAKE SURE to use the exact name displayed in [Your Team Status].
+                    """
+            else:
+                instruction_prompt += "\n[REALITY CHECK] Your team is empty. It seems you have successfully fired everyone."
+
+        elif is_hiring_task:
+            instruction_prompt += """
+                [REALITY CHECK: HIRING]
+                To hire someone, you MUST call 'create_sub_agent'.
+                If you haven't called it yet, do it now.
+                """
+        return instruction_prompt
+
+    # --- [기획/제안 단계] ---
+    return """
+            [STATUS: PLANNING / PROPOSAL]
+            You are analyzing the task.
+
+            [Instructions]
+            1. If the task involves sensitive actions (Hiring, Firing):
+               - DO NOT execute the tool yet.
+               - Write a proposal: "I propose to [Action] because..."
+               - This will be sent to your manager for approval.
+            2. For safe tasks, use tools immediately.
+            """
+
+
+@lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def _static_prompt(agent_name, task_id, task_title, task_description, task_status, prev_result, subordinates, history_context):
+    """에이전트 고정 + 태스크 고정 영역. 같은 실행의 모든 단계에서 한 번만 만들고 바이트 단위로 같은 문자열을 재사용"""
+    subordinates_text = "None (You have no subordinates)"
+    if subordinates:
+        # [수정] ID를 포함하여 출력 (동명이인 구분 및 디버깅 용이)
+        subordinates_text = "\n".join(f"- [ID: {sub_id}] {name} ({role})" for sub_id, name, role in subordinates)
+
+    instruction_prompt = _instruction_prompt(task_title, task_description, task_status, prev_result, len(subordinates))
+
+    return f"""You are {agent_name}, a capable AI manager.
+
+        [Current Task Info]
+        Task ID: {task_id}
+        Title: {task_title}
+        Description: {task_description}
+
+        [Your Team Status]
+        {subordinates_text}
+
+        {instruction_prompt}
+
+        {history_context}
+
+        [Rules for Delegation]
+        - If you assign a task to a subordinate, you MUST pass the 'current_task_id' ({task_id}) to the 'assign_task' tool.
+        - After assigning, your status will automatically change to WAIT_SUBTASK. Do not output "FINAL RESULT" yet.
+        """
+
+
+def task_static_prompt(state) -> str:
+    """AgentState의 에이전트 고정 + 태스크 고정 영역 (같은 상태면 캐시된 같은 문자열)"""
+    subordinates = tuple((s['id'], s['name'], s['role']) for s in state.get("subordinates", []))
+    return _static_prompt(
+        state.get("agent_name", "Unknown"),
+        state['task_id'],
+        state['task_title'],
+        state['task_description'],
+        state.get("task_status", "THINKING"),
+        state.get("prev_result", ""),
+        subordinates,
+        state.get("history_context", ""),
+    )
+
+
+def build_agent_system_prompt(state, broadcast_msg: str, now) -> str:
+    """
+    AgentState로부터 에이전트 시스템 프롬프트를 조립합니다.
+    고정 영역은 캐시된 문자열을 그대로 쓰고, 변동 영역(시각 / 공지)만 맨 뒤에 붙입니다.
+    """
+    static = task_static_prompt(state)
+    volatile = f"""
+        [Current Time]
+        {format_time(now)}
+        {broadcast_msg}"""
+    return static + volatile
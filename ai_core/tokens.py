@@ -0,0 +1,35 @@
+import os
+import re
+
+# 토크나이저 없이 토큰 수를 어림하는 기준. 영문은 약 4자, 한글은 약 1.5자가 토큰 하나에 해당
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))
+CJK_CHARS_PER_TOKEN = float(os.getenv("CJK_CHARS_PER_TOKEN", "1.5"))
+
+_CJK_RE = re.compile(r"[\u1100-\u11ff\u3040-\u30ff\u3130-\u318f\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    text의 토큰 수를 어림합니다 (모델별 토크나이저를 내려받지 않기 위한 근사치).
+    예산 계산용이므로 정확도보다 약간 크게 잡는 쪽을 택합니다.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return int(cjk / CJK_CHARS_PER_TOKEN + other / CHARS_PER_TOKEN) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """text를 대략 max_tokens 토큰 이내로 자릅니다 (가능하면 공백 위치에서)."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text.rfind(" ", 0, low)
+    return text[:cut if cut > low // 2 else low].rstrip()
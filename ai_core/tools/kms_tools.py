@@ -1,21 +1,35 @@
-from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import StructuredTool
 from corp.services import kms_service
 
-@tool
-def search_wiki_tool(query: str) -> str:
+
+def _format_results(results) -> str:
+    if not results:
+        return "No relevant information found in the Company Wiki."
+        
+    # [변경] 문서 전체 대신 관련 구간(Passage)만 표시하여 에이전트 컨텍스트 사용량을 제한
+    formatted_results = "📚 [Company Wiki Search Results]:\n"
+    for idx, passage in enumerate(results):
+        formatted_results += f"{idx+1}. [Subject: {passage.memory.subject}] (excerpt, chars {passage.start_offset}-{passage.end_offset})\n   {passage.content}\n"
+        
+    return formatted_results
+
+def _owner_id(config: RunnableConfig):
+    # 러너가 실행 설정(configurable)에 넣어 준 태스크 소유자.
+    # [변경] 없으면(직접 호출 등) 다른 사용자의 위키가 노출되지 않도록 검색하지 않음
+    return ((config or {}).get("configurable") or {}).get("owner_id")
+
+def search_wiki(query: str, config: RunnableConfig) -> str:
     """
     Use this tool to search the Company Wiki/Knowledge Base.
     Useful for finding SOPs, past successful plans, or common rules BEFORE making a plan.
     Args:
         query: Search keywords or a question.
     """
-    results = kms_service.search_wiki(query)
-    
-    if not results:
-        return "No relevant information found in the Company Wiki."
-        
-    formatted_results = "📚 [Company Wiki Search Results]:\n"
-    for idx, doc in enumerate(results):
-        formatted_results += f"{idx+1}. [Subject: {doc.subject}]\n   {doc.content}\n"
-        
-    return formatted_results
\ No newline at end of file
+    return _format_results(kms_service.search_passages(query, owner_id=_owner_id(config)))
+
+async def asearch_wiki(query: str, config: RunnableConfig) -> str:
+    return _format_results(await kms_service.asearch_passages(query, owner_id=_owner_id(config)))
+
+# [변경] 동기(invoke) / 비동기(ainvoke) 실행을 모두 지원하도록 coroutine을 함께 등록
+search_wiki_tool = StructuredTool.from_function(func=search_wiki, coroutine=asearch_wiki, name="search_wiki_tool")
@@ -1,5 +1,6 @@
 from langchain_core.tools import tool
 from corp.models import Agent, Task
+from corp.task_events import notify_task_changed
 from ai_core.tools.registry import TIER_1_REGISTRY
 
 @tool
@@ -24,7 +25,7 @@ def request_tool_access(agent_name: str, tool_name: str, reason: str) -> str:
         response_msg = f"🚧 Feature request submitted. The CEO (Developer) needs to implement '{tool_name}' first."
 
     # 태스크 생성
-    Task.objects.create(
+    task = Task.objects.create(
         title=task_title,
         description=f"Requestor: {agent_name}\nTarget: {tool_name}\nReason: {reason}\n\n[System Note]\nChoose 'Approve' to confirm you will build/grant this.",
         assignee=agent,
@@ -32,5 +33,6 @@ def request_tool_access(agent_name: str, tool_name: str, reason: str) -> str:
         status=Task.TaskStatus.WAIT_APPROVAL,
         result=marker
     )
+    notify_task_changed(task)
     
     return response_msg
\ No newline at end of file
@@ -1,11 +1,13 @@
 import os
+import httpx
 import requests
 from bs4 import BeautifulSoup
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 from langchain_community.tools import DuckDuckGoSearchRun
-from ai_core.llm_gateway import OllamaClient  # 요약을 수행할 클라이언트 임포트
+from asgiref.sync import sync_to_async
+from ai_core.llm_gateway import OllamaClient, llm_limiter  # 요약을 수행할 클라이언트 임포트
+from corp.llm_cache import llm_cache
 
-@tool
 def search_web(query: str) -> str:
     """
     Use this tool to search the internet for current events or specific information.
@@ -20,8 +22,45 @@ def search_web(query: str) -> str:
     except Exception as e:
         return f"Search failed: {str(e)}"
 
-@tool
-def fetch_web_content_tool(url: str) -> str:
+async def asearch_web(query: str) -> str:
+    print(f"🔍 [Tool] Searching web for: {query}")
+    try:
+        search = DuckDuckGoSearchRun()
+        result = await search.ainvoke(query)
+        return f"Search Result: {result}"
+    except Exception as e:
+        return f"Search failed: {str(e)}"
+
+def _extract_text(content) -> str:
+    soup = BeautifulSoup(content, 'html.parser')
+    
+    # 2. 불필요한 요소 제거 (스크립트, 스타일, 네비게이션 등)
+    for element in soup(["script", "style", "nav", "footer", "header", "aside", "iframe"]):
+        element.extract()
+        
+    # 3. 텍스트 추출 및 공백 정리
+    text = soup.get_text()
+    clean_text = " ".join(text.split())
+    
+    # 4. LLM 입력 한계를 고려하여 원문 자르기
+    # (요약 모델에게 던질 때도 너무 길면 에러가 나므로 약 8000자 정도로 제한)
+    return clean_text[:8000]
+
+def _summary_prompt(input_text: str) -> str:
+    # 5. 요약 프롬프트 작성
+    # (별도의 독립적인 요청이므로 시스템 프롬프트 영향 없음)
+    return f"""
+        Analyze the following web page content and provide a comprehensive summary.
+        Focus on facts, key findings, and data relevant to a business or technical context.
+        
+        [Web Content]:
+        {input_text}
+        
+        [Instruction]:
+        Summarize the above content in around 300-500 words.
+        """
+
+def fetch_web_content(url: str) -> str:
     """
     Read and SUMMARIZE the content of a specific web page.
     Use this when you need detailed information from a specific URL found via search.
@@ -36,46 +75,59 @@ def fetch_web_content_tool(url: str) -> str:
         response = requests.get(url, timeout=10)
         response.raise_for_status()
         
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # 2. 불필요한 요소 제거 (스크립트, 스타일, 네비게이션 등)
-        for element in soup(["script", "style", "nav", "footer", "header", "aside", "iframe"]):
-            element.extract()
-            
-        # 3. 텍스트 추출 및 공백 정리
-        text = soup.get_text()
-        clean_text = " ".join(text.split())
-        
-        # 4. LLM 입력 한계를 고려하여 원문 자르기
-        # (요약 모델에게 던질 때도 너무 길면 에러가 나므로 약 8000자 정도로 제한)
-        input_text = clean_text[:8000]
+        input_text = _extract_text(response.content)
         
         if len(input_text) < 500:
             # 내용이 너무 짧으면 요약 없이 그냥 반환
             return f"📄 [Content of {url}]:\n{input_text}"
 
-        # 5. 요약 프롬프트 작성
-        # (별도의 독립적인 요청이므로 시스템 프롬프트 영향 없음)
-        summary_prompt = f"""
-        Analyze the following web page content and provide a comprehensive summary.
-        Focus on facts, key findings, and data relevant to a business or technical context.
-        
-        [Web Content]:
-        {input_text}
-        
-        [Instruction]:
-        Summarize the above content in around 300-500 words.
-        """
-        
         # 6. OllamaClient를 통해 '단독' 실행 (One-off execution)
         # LangGraph의 State와 무관하게 실행되므로 Context가 누적되지 않음
         client = OllamaClient()
         target_model = os.getenv("LLM_MODEL", "qwen3:8b") # .env에 설정된 모델 사용
         
-        response_data = client.generate(model=target_model, prompt=summary_prompt, stream=False)
+        # [추가] 같은 본문의 요약은 응답 캐시(LLM_CACHE)에서 바로 반환
+        prompt = _summary_prompt(input_text)
+        response_data = llm_cache.get_generate("summarize", target_model, prompt)
+        if response_data is None:
+            with llm_limiter.slot(target_model, "summarize"):
+                response_data = client.generate(model=target_model, prompt=prompt, stream=False, purpose="summarize")
+            llm_cache.put_generate("summarize", target_model, prompt, response_data)
         summary = response_data.get('response', 'Error: No response from LLM.')
         
         return f"📄 [Summary of {url}]:\n{summary}"
         
     except Exception as e:
-        return f"Error fetching/summarizing URL: {str(e)}"
\ No newline at end of file
+        return f"Error fetching/summarizing URL: {str(e)}"
+
+async def afetch_web_content(url: str) -> str:
+    print(f"📄 [Tool] Fetching & Summarizing URL: {url}")
+    try:
+        async with httpx.AsyncClient(timeout=10, follow_redirects=True) as http:
+            response = await http.get(url)
+        response.raise_for_status()
+        
+        input_text = _extract_text(response.content)
+        
+        if len(input_text) < 500:
+            return f"📄 [Content of {url}]:\n{input_text}"
+
+        client = OllamaClient()
+        target_model = os.getenv("LLM_MODEL", "qwen3:8b")
+        
+        prompt = _summary_prompt(input_text)
+        response_data = await sync_to_async(llm_cache.get_generate, thread_sensitive=False)("summarize", target_model, prompt)
+        if response_data is None:
+            async with llm_limiter.aslot(target_model, "summarize"):
+                response_data = await client.agenerate(model=target_model, prompt=prompt, purpose="summarize")
+            await sync_to_async(llm_cache.put_generate, thread_sensitive=False)("summarize", target_model, prompt, response_data)
+        summary = response_data.get('response', 'Error: No response from LLM.')
+        
+        return f"📄 [Summary of {url}]:\n{summary}"
+        
+    except Exception as e:
+        return f"Error fetching/summarizing URL: {str(e)}"
+
+# [변경] 동기(invoke) / 비동기(ainvoke) 실행을 모두 지원하도록 coroutine을 함께 등록
+search_web = StructuredTool.from_function(func=search_web, coroutine=asearch_web, name="search_web")
+fetch_web_content_tool = StructuredTool.from_function(func=fetch_web_content, coroutine=afetch_web_content, name="fetch_web_content_tool")
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import defaultdict
+from langchain_core.messages import ToolMessage, message_to_dict, messages_from_dict
+from ai_core.context_window import message_tokens
+
+# ==============================================================================
+# 워크플로 기록 / 재생 (Record & Replay)
+# ==============================================================================
+# record: 태스크마다 모든 LLM 요청/응답과 도구 결과를 LLM_TRANSCRIPT_DIR/<task_id>.jsonl 에 남깁니다.
+# replay: Ollama를 부르지 않고 기록된 응답을 같은 자리에 그대로 돌려줍니다. 코드 버전만 바꿔 같은 기록을 재생하면
+#         모델 응답의 차이 없이 러너 / 워크플로 / 도구 실행의 벽시계 시간, DB 쿼리 수, 프롬프트 토큰 수를 비교할 수 있습니다.
+# 응답의 자리(key)는 실행 순서가 아니라 상태로 정합니다 (에이전트 추론: 태스크 상태 + 대화 길이, 도구: tool_call_id).
+# 그래서 워커 수나 실행 순서가 달라도 같은 응답이 돌아갑니다 (결재는 태스크 안에서 기록된 순서대로).
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+# 동작 모드 (off / record / replay)
+TRANSCRIPT_MODE = os.getenv("LLM_TRANSCRIPT_MODE", OFF).strip().lower() or OFF
+
+# 기록 파일 디렉터리
+TRANSCRIPT_DIR = os.getenv("LLM_TRANSCRIPT_DIR", "transcripts")
+
+# 재생할 때 실제로 실행하지 않고 기록된 결과를 돌려줄 도구 (외부 응답에 따라 결과가 달라지는 읽기 전용 도구).
+# 나머지 도구(업무 배정, 채용 등)는 DB 상태를 바꾸므로 재생 중에도 실제로 실행함
+TRANSCRIPT_REPLAY_TOOLS = {
+    t.strip() for t in os.getenv("LLM_TRANSCRIPT_REPLAY_TOOLS", "search_web,fetch_web_content_tool").split(",") if t.strip()
+}
+
+# 재생할 때 기록된 응답 시간에 곱해 기다릴 비율 (0: 기다리지 않음, 1: 기록 당시와 같은 시간)
+TRANSCRIPT_REPLAY_LATENCY = float(os.getenv("LLM_TRANSCRIPT_REPLAY_LATENCY", "0"))
+
+
+class TranscriptMissError(RuntimeError):
+    """재생 중 기록에 없는 LLM 호출이 나왔을 때 (코드 변경으로 워크플로 흐름이 달라진 경우 등)"""
+
+
+def _usage(message):
+    """ChatOllama 응답의 토큰 수 / 소요 시간 (Ollama가 준 값 그대로)"""
+    metadata = getattr(message, "response_metadata", None) or {}
+    keys = ("prompt_eval_count", "eval_count", "prompt_eval_duration", "eval_duration", "total_duration", "load_duration")
+    return {k: metadata[k] for k in keys if metadata.get(k) is not None}
+
+
+class TranscriptStore:
+    """
+    LLM 호출 / 도구 실행을 기록하거나 재생하는 저장소 (프로세스 전역, 스레드 안전).
+    off 모드에서는 호출을 그대로 통과시키므로 호출 지점에 항상 끼워 둘 수 있습니다.
+    """
+
+    def __init__(self, mode=TRANSCRIPT_MODE, directory=TRANSCRIPT_DIR, replay_tools=TRANSCRIPT_REPLAY_TOOLS,
+                 replay_latency=TRANSCRIPT_REPLAY_LATENCY):
+        if mode not in (OFF, RECORD, REPLAY):
+            raise ValueError(f"LLM_TRANSCRIPT_MODE must be one of off / record / replay (got '{mode}')")
+        self.mode = mode
+        self.directory = directory
+        self.replay_tools = set(replay_tools)
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        # 재생: task_id -> {(kind, key): [기록, ...]}, (task_id, kind, key) -> 다음에 돌려줄 위치
+        self._loaded = {}
+        self._cursors = defaultdict(int)
+        self._stats = defaultdict(int)
+        if mode == RECORD:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != OFF
+
+    # --- 파일 ---
+
+    def _path(self, task_id):
+        return os.path.join(self.directory, f"{task_id}.jsonl")
+
+    def _append(self, task_id, entry):
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(self._path(task_id), "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _entries(self, task_id):
+        with self._lock:
+            if task_id not in self._loaded:
+                entries = defaultdict(list)
+                try:
+                    with open(self._path(task_id), encoding="utf-8") as f:
+                        for line in f:
+                            if line.strip():
+                                entry = json.loads(line)
+                                entries[(entry["kind"], entry["key"])].append(entry)
+                except FileNotFoundError:
+                    pass
+                self._loaded[task_id] = entries
+            return self._loaded[task_id]
+
+    def _next(self, task_id, kind, key):
+        """재생할 기록. 같은 자리의 기록이 여러 개면 차례로, 다 쓰면 마지막 것을 다시 돌려줌"""
+        candidates = self._entries(task_id).get((kind, key))
+        if not candidates:
+            return None
+        with self._lock:
+            index = self._cursors[(task_id, kind, key)]
+            self._cursors[(task_id, kind, key)] += 1
+        return candidates[min(index, len(candidates) - 1)]
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self._stats[name] += value
+
+    # --- LLM 호출 ---
+
+    def _replay_llm(self, task_id, purpose, key, messages):
+        entry = self._next(task_id, "llm", f"{purpose}:{key}")
+        if entry is None:
+            self._count(llm_missing=1)
+            raise TranscriptMissError(f"No recorded {purpose} response for task {task_id} at '{key}'.")
+        response = messages_from_dict([entry["response"]])[0]
+        self._count(
+            llm_calls=1, llm_replayed=1,
+            prompt_tokens=sum(message_tokens(m) for m in messages),
+            output_tokens=entry.get("usage", {}).get("eval_count") or message_tokens(response),
+        )
+        return response, entry.get("elapsed", 0.0) * self.replay_latency
+
+    def _record_llm(self, task_id, purpose, key, model, messages, response, elapsed):
+        usage = _usage(response)
+        prompt_tokens = sum(message_tokens(m) for m in messages)
+        self._count(
+            llm_calls=1, llm_recorded=1, prompt_tokens=prompt_tokens,
+            output_tokens=usage.get("eval_count") or message_tokens(response),
+        )
+        self._append(task_id, {
+            "kind": "llm", "purpose": purpose, "key": f"{purpose}:{key}", "model": model,
+            "request": [message_to_dict(m) for m in messages], "response": message_to_dict(response),
+            "prompt_tokens": prompt_tokens, "usage": usage, "elapsed": elapsed, "recorded_at": time.time(),
+        })
+
+    def llm_call(self, task_id, purpose, key, model, messages, call):
+        """
+        call()로 모델을 호출합니다. record 모드면 요청/응답을 남기고, replay 모드면 call()을 부르지 않고 기록된 응답을 돌려줍니다.
+        Args:
+            key: 태스크 안에서 이 호출의 자리 (재생할 때 같은 응답을 찾는 데 사용)
+            messages: 모델에 보낸 메시지 목록 (기록 / 토큰 수 집계용)
+        """
+        if self.mode == REPLAY:
+            response, delay = self._replay_llm(str(task_id), purpose, key, messages)
+            if delay:
+                time.sleep(delay)
+            return response
+        started = time.monotonic()
+        response = call()
+        if self.mode == RECORD:
+            self._record_llm(str(task_id), purpose, key, model, messages, response, time.monotonic() - started)
+        return response
+
+    async def allm_call(self, task_id, purpose, key, model, messages, call):
+        """llm_call의 asyncio 버전 (call은 코루틴 함수)"""
+        if self.mode == REPLAY:
+            response, delay = self._replay_llm(str(task_id), purpose, key, messages)
+            if delay:
+                await asyncio.sleep(delay)
+            return response
+        started = time.monotonic()
+        response = await call()
+        if self.mode == RECORD:
+            self._record_llm(str(task_id), purpose, key, model, messages, response, time.monotonic() - started)
+        return response
+
+    # --- 도구 실행 (ToolNode의 wrap_tool_call / awrap_tool_call) ---
+
+    def _replay_tool(self, request):
+        call = request.tool_call
+        if call["name"] not in self.replay_tools:
+            return None
+        entry = self._next(str(request.state.get("task_id")), "tool", call["id"])
+        if entry is None:
+            return None
+        self._count(tool_calls=1, tools_replayed=1)
+        return messages_from_dict([entry["result"]])[0].model_copy(update={"tool_call_id": call["id"]})
+
+    def _record_tool(self, request, result, elapsed):
+        self._count(tool_calls=1)
+        if self.mode != RECORD or not isinstance(result, ToolMessage):
+            return
+        call = request.tool_call
+        self._append(str(request.state.get("task_id")), {
+            "kind": "tool", "key": call["id"], "name": call["name"], "args": call.get("args", {}),
+            "result": message_to_dict(result), "elapsed": elapsed, "recorded_at": time.time(),
+        })
+
+    def wrap_tool_call(self, request, execute):
+        if self.mode == REPLAY:
+            replayed = self._replay_tool(request)
+            if replayed is not None:
+                return replayed
+        started = time.monotonic()
+        result = execute(request)
+        self._record_tool(request, result, time.monotonic() - started)
+        return result
+
+    async def awrap_tool_call(self, request, execute):
+        if self.mode == REPLAY:
+            replayed = self._replay_tool(request)
+            if replayed is not None:
+                return replayed
+        started = time.monotonic()
+        result = await execute(request)
+        self._record_tool(request, result, time.monotonic() - started)
+        return result
+
+    def stats(self):
+        """LLM 호출 수(기록 / 재생 / 기록 없음), 프롬프트 토큰(어림값) / 출력 토큰 수, 도구 실행 수(재생 포함)"""
+        with self._lock:
+            return {"mode": self.mode, "directory": self.directory, **self._stats}
+
+
+transcripts = TranscriptStore()
@@ -1,14 +1,43 @@
 import os
+import time
+import threading
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from typing import TypedDict, List, Annotated
-from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_ollama import ChatOllama
 from corp.services.comm_service import get_active_announcement
+from ai_core.llm_gateway import llm_limiter, ollama_pool, ollama_chat_kwargs, observe_chat_response
+from ai_core.context_window import DEFAULT_CONTEXT_WINDOW, RESPONSE_RESERVE_TOKENS, fit_messages, message_tokens, tools_tokens
+from ai_core.tokens import estimate_tokens, truncate_to_tokens
+from ai_core.prompts.system_prompts import build_agent_system_prompt
+from ai_core.transcripts import transcripts
+from corp.checkpointer import workflow_checkpointer
+from corp.llm_cache import chat_cache
 
 GLOBAL_MODEL_NAME = os.getenv("LLM_MODEL", "qwen3:8b")
 
+def agent_model_name(agent) -> str:
+    """에이전트가 사용할 모델 (Agent.ollama_model_name, 지정하지 않았으면 LLM_MODEL)"""
+    return (agent.ollama_model_name or "").strip() or GLOBAL_MODEL_NAME
+
+def agent_num_ctx(agent) -> int:
+    """에이전트의 컨텍스트 길이 (Agent.context_window_size, 지정하지 않았으면 LLM_CONTEXT_WINDOW)"""
+    return agent.context_window_size or DEFAULT_CONTEXT_WINDOW
+
+# 컴파일된 에이전트 그래프를 몇 개의 툴셋 조합까지 보관할지 (LRU)
+WORKFLOW_CACHE_SIZE = int(os.getenv("WORKFLOW_CACHE_SIZE", "32"))
+
+# CEO 공지 조회 결과를 재사용할 시간(초). 도구 루프의 매 단계마다 DB를 조회하지 않도록
+ANNOUNCEMENT_TTL = float(os.getenv("ANNOUNCEMENT_TTL", "30"))
+
+# 에이전트 워크플로 체크포인트(태스크 ID 단위) 저장 여부. 끄면 매 실행이 빈 대화에서 시작
+WORKFLOW_CHECKPOINTS = os.getenv("WORKFLOW_CHECKPOINTS", "1") == "1"
+
 # ==============================================================================
 # 2. 상태(State) 및 노드(Nodes) 정의
 # ==============================================================================
@@ -21,14 +50,16 @@ class ReviewState(TypedDict):
     subordinate_name: str
     decision: str # APPROVE or REJECT
     feedback: str
+    model_name: str # [추가] 결재하는 매니저의 모델 (없으면 GLOBAL_MODEL_NAME)
+    num_ctx: int # [추가] 매니저의 컨텍스트 길이 (없으면 LLM_CONTEXT_WINDOW)
+    task_id: str # [추가] 결재 대상 태스크 (LLM_TRANSCRIPT_MODE 기록 / 재생 단위)
 
-def manager_review_node(state: ReviewState):
-    """매니저가 부하직원의 결재안을 검토하는 노드"""
-    print(f"🧐 Manager {state['manager_name']} is reviewing task from {state['subordinate_name']}...")
-    
-    llm = ChatOllama(model=GLOBAL_MODEL_NAME, temperature=0) # 또는 qwen2.5 등
-    
-    prompt = f"""You are {state['manager_name']}, a manager AI.
+def _review_prompt(state: ReviewState):
+    # [추가] 결재안이 매니저의 컨텍스트 길이를 넘으면 Ollama가 프롬프트 앞부분(지시문)을 잘라버리므로 결재안 쪽을 줄임
+    num_ctx = state.get("num_ctx") or DEFAULT_CONTEXT_WINDOW
+    budget = num_ctx - RESPONSE_RESERVE_TOKENS - estimate_tokens(state['task_title'] + state['task_description']) - 200
+    proposed_result = truncate_to_tokens(state['proposed_result'] or "", max(256, budget))
+    return f"""You are {state['manager_name']}, a manager AI.
     Your subordinate, {state['subordinate_name']}, has submitted a task for your approval.
     
     [Task Info]
@@ -36,7 +67,7 @@ def manager_review_node(state: ReviewState):
     Description: {state['task_description']}
     
     [Proposed Action/Result by Subordinate]
-    {state['proposed_result']}
+    {proposed_result}
     
     [Your Job]
     Evaluate the proposal.
@@ -48,23 +79,82 @@ def manager_review_node(state: ReviewState):
     DECISION: [APPROVE | REJECT]
     FEEDBACK: [Your reasoning and instructions]
     """
-    
-    response = llm.invoke(prompt).content
-    
-    # 파싱
+
+def _parse_review(response: str):
     decision = "REJECT"
     feedback = response
     
     if "DECISION: APPROVE" in response:
-        decision = "APPROrove"
+        decision = "APPROVE"
     elif "DECISION: REJECT" in response:
         decision = "REJECT"
         
     return {"decision": decision, "feedback": feedback}
 
+def _review_llm(state: ReviewState):
+    # [변경] 매니저 에이전트에 지정된 모델로 결재 (지정하지 않았으면 GLOBAL_MODEL_NAME)
+    model_name = state.get("model_name") or GLOBAL_MODEL_NAME
+
+    # [변경] 호스트 풀이 고른 Ollama 서버(host)로 보내는 모델을 만듦
+    def llm_for(host):
+        # [추가] LLM_CACHE가 켜져 있으면 바뀌지 않은 결재안의 재검토는 캐시된 결정을 그대로 사용
+        return ChatOllama(
+            model=model_name, base_url=host, temperature=0, num_ctx=state.get("num_ctx") or DEFAULT_CONTEXT_WINDOW,
+            cache=chat_cache("review", model_name), **ollama_chat_kwargs()
+        )
+    return model_name, llm_for
+
+def manager_review_node(state: ReviewState):
+    """매니저가 부하직원의 결재안을 검토하는 노드"""
+    print(f"🧐 Manager {state['manager_name']} is reviewing task from {state['subordinate_name']}...")
+    
+    model_name, llm_for = _review_llm(state)
+    prompt = _review_prompt(state)
+    
+    # 결재 호출도 에이전트 추론과 같은 모델 슬롯을 공유
+    # (모든 Ollama 서버가 내려가 있으면 슬롯을 기다리기 전에 즉시 실패시킴)
+    def call():
+        ollama_pool.before_call()
+        with llm_limiter.slot(model_name, "review"):
+            started = time.monotonic()
+            # [변경] 모델이 있는 호스트 중 진행 요청이 적은 곳으로 보내고, 실패하면 다음 호스트로 넘김
+            response = ollama_pool.invoke(model_name, lambda host: llm_for(host).invoke(prompt))
+        # [추가] 토큰 수 / 소요 시간 계측 (corp.llm_accounting)
+        observe_chat_response(model_name, "review", response, time.monotonic() - started)
+        return response
+
+    # [추가] LLM_TRANSCRIPT_MODE=record면 요청/응답을 기록, replay면 Ollama 대신 기록된 결정을 사용 (태스크 안에서 기록 순서대로)
+    response = transcripts.llm_call(
+        state.get("task_id"), "review", "decision", model_name, [HumanMessage(content=prompt)], call
+    ).content
+    
+    return _parse_review(response)
+
+async def amanager_review_node(state: ReviewState):
+    """manager_review_node의 asyncio 버전 (ainvoke 시 사용)"""
+    print(f"🧐 Manager {state['manager_name']} is reviewing task from {state['subordinate_name']}...")
+    
+    model_name, llm_for = _review_llm(state)
+    prompt = _review_prompt(state)
+    
+    async def call():
+        ollama_pool.before_call()
+        async with llm_limiter.aslot(model_name, "review"):
+            started = time.monotonic()
+            response = await ollama_pool.ainvoke(model_name, lambda host: llm_for(host).ainvoke(prompt))
+        observe_chat_response(model_name, "review", response, time.monotonic() - started)
+        return response
+
+    response = (await transcripts.allm_call(
+        state.get("task_id"), "review", "decision", model_name, [HumanMessage(content=prompt)], call
+    )).content
+    
+    return _parse_review(response)
+
 def create_review_workflow():
     workflow = StateGraph(ReviewState)
-    workflow.add_node("manager_review", manager_review_node)
+    # [변경] invoke()는 동기 노드, ainvoke()는 비동기 노드를 실행 (같은 컴파일 그래프로 두 실행 경로 지원)
+    workflow.add_node("manager_review", RunnableLambda(manager_review_node, afunc=amanager_review_node))
     workflow.set_entry_point("manager_review")
     workflow.add_edge("manager_review", END)
     return workflow.compile()
@@ -81,120 +171,109 @@ class AgentState(TypedDict):
     subordinates: List[dict]
     history_context: str
 
+_announcement = {"value": None, "expires_at": 0.0}
+_announcement_lock = threading.Lock()
+
+def _transcript_key(state: AgentState) -> str:
+    # 같은 태스크에서 에이전트 추론 호출을 구분하는 자리 (태스크 상태 + 이미 쌓인 대화 길이)
+    return f"{state.get('task_status', 'THINKING')}:{len(state['messages'])}"
+
+def _cached_announcement():
+    """ANNOUNCEMENT_TTL 안에 조회한 공지가 있으면 반환 (없으면 None)"""
+    with _announcement_lock:
+        if time.monotonic() < _announcement["expires_at"]:
+            return _announcement["value"]
+    return None
+
+def _remember_announcement(value):
+    with _announcement_lock:
+        _announcement.update(value=value, expires_at=time.monotonic() + ANNOUNCEMENT_TTL)
+    return value
+
 class AgentNodes:
-    def __init__(self, tools):
+    def __init__(self, tools, model_name=GLOBAL_MODEL_NAME, num_ctx=None):
         # [설정] 사용할 Ollama 모델명 (Tool Calling 지원 모델 필수: llama3.1, mistral-nemo 등)
+        # [변경] 에이전트별 모델 / 컨텍스트 길이(Agent.ollama_model_name / context_window_size)를 받음
         # 1. ChatOllama 초기화
-        self.llm = ChatOllama(model=GLOBAL_MODEL_NAME, temperature=0)
-        
-        # 2. bind_tools: 모델에게 도구 명세 주입 (Native Tool Calling 활성화)
-        self.llm_with_tools = self.llm.bind_tools(tools)
+        self.model_name = model_name
+        # [추가] 모델에 num_ctx를 명시하고, 보낼 대화를 같은 길이 안에 맞춤
+        # (Ollama 기본 컨텍스트는 짧아서 넘치면 프롬프트 앞부분(시스템 프롬프트)을 경고 없이 잘라냄)
+        self.num_ctx = num_ctx or DEFAULT_CONTEXT_WINDOW
+        # 프롬프트 예산 = 컨텍스트 - 응답 몫 - 매 요청에 함께 가는 도구 명세
+        self.prompt_budget = self.num_ctx - RESPONSE_RESERVE_TOKENS - tools_tokens(tools)
+        self.tools = tools
+        # [변경] Ollama 호스트(OLLAMA_HOSTS)별 bind_tools 모델. 호스트 풀이 고른 호스트의 것을 처음 쓸 때 만듦
+        self._llms = {}
+        self._llms_lock = threading.Lock()
 
-    def agent_reasoning(self, state: AgentState):
-        task_status = state.get("task_status", "THINKING")
-        prev_result = state.get("prev_result", "")
-        history_context = state.get("history_context", "")
-        
-        # 1. 현재 에이전트 및 하위 조직 정보 조회
-        current_agent_name = state.get("agent_name", "Unknown")
-        subordinates = state.get("subordinates", [])
-        subordinates_text = "None (You have no subordinates)"
-        
-        if subordinates:
-            # [수정] ID를 포함하여 출력 (동명이인 구분 및 디버깅 용이)
-            sub_list = [f"- [ID: {s['id']}] {s['name']} ({s['role']})" for s in subordinates]
-            subordinates_text = "\n".join(sub_list)
-
-        # 2. 태스크 의도 파악
-        task_context = (state['task_title'] + " " + state['task_description']).lower()
-        is_firing_task = any(word in task_context for word in ['fire', 'layoff', 'dismiss', 'remove', 'delete'])
-        is_hiring_task = any(word in task_context for word in ['hire', 'recruit', 'create', 'new agent'])
-
-        # 3. 상태에 따른 프롬프트 분기
-        if task_status == "APPROVED":
-            # --- [집행 단계] ---
-            instruction_prompt = f"""
-            [STATUS: APPROVED - EXECUTION PHASE]
-            Your proposal has been APPROVED.
-            
-            [Your Approved Plan]
-            {prev_result}
-            
-            [ACTION REQUIRED]
-            Now, you must EXECUTE the plan using the appropriate tools.
-            Do NOT just say "I did it". actually USE THE TOOLS.
-            """
-
-            if is_firing_task:
-                if subordinates:
-                    instruction_prompt += f"""
-                    [REALITY CHECK: FIRING]
-                    Look at [Your Team Status]. There are still {len(subordinates)} subordinates listed.
-                    This means they are NOT fired yet.
-                    You MUST use 'fire_sub_agent' tool for each person you planned to fire.
-                    MAKE SURE to use the exact name displayed in [Your Team Status].
-                    """
-                else:
-                    instruction_prompt += "\n[REALITY CHECK] Your team is empty. It seems you have successfully fired everyone."
-
-            elif is_hiring_task:
-                instruction_prompt += """
-                [REALITY CHECK: HIRING]
-                To hire someone, you MUST call 'create_sub_agent'. 
-                If you haven't called it yet, do it now.
-                """
-                
-        else:
-            # --- [기획/제안 단계] ---
-            instruction_prompt = f"""
-            [STATUS: PLANNING / PROPOSAL]
-            You are analyzing the task.
-            
-            [Instructions]
-            1. If the task involves sensitive actions (Hiring, Firing):
-               - DO NOT execute the tool yet.
-               - Write a proposal: "I propose to [Action] because..."
-               - This will be sent to your manager for approval.
-            2. For safe tasks, use tools immediately.
-            """
-
-        # [수정] 4. 최종 시스템 프롬프트 조립 부분
-        
-        # CEO 공지사항 가져오기 (DB 조회)
-        broadcast_msg = get_active_announcement()
-        
-        current_time = timezone.localtime()
-        current_time_str = current_time.strftime("%Y-%m-%d %H:%M:%S %A")
-        system_prompt_text = f"""You are {current_agent_name}, a capable AI manager.
-        
-        [Current Time]
-        {current_time_str}
-        
-        [Current Task Info]
-        Task ID: {state['task_id']}
-        Title: {state['task_title']}
-        Description: {state['task_description']}
-        
-        {broadcast_msg}
+    def llm_for(self, host):
+        """host로 요청을 보내는 (도구가 바인딩된) 모델"""
+        with self._llms_lock:
+            if host not in self._llms:
+                # 타임아웃 / 연결 재시도 / keep-alive 커넥션 풀 설정은 OllamaClient와 동일하게 적용
+                # (응답 캐시는 LLM_CACHE_PURPOSES에 'chat'이 있을 때만 사용)
+                llm = ChatOllama(
+                    model=self.model_name, base_url=host, temperature=0, num_ctx=self.num_ctx,
+                    cache=chat_cache("chat", self.model_name), **ollama_chat_kwargs()
+                )
+                # 2. bind_tools: 모델에게 도구 명세 주입 (Native Tool Calling 활성화)
+                self._llms[host] = llm.bind_tools(self.tools)
+            return self._llms[host]
 
-        [Your Team Status]
-        {subordinates_text}
-        
-        {instruction_prompt}
+    def _build_messages(self, state: AgentState, broadcast_msg: str):
+        """상태로부터 시스템 프롬프트를 조립하여 모델에 보낼 메시지 목록을 만듭니다."""
+        # [변경] 고정 영역(에이전트/태스크) -> 변동 영역(시각/공지) 순서로 조립하여 Ollama 프롬프트 캐시를 재사용
+        system_prompt_text = build_agent_system_prompt(state, broadcast_msg, timezone.localtime())
+        current_agent_name = state.get("agent_name", "Unknown")
 
-        {history_context}
-        
-        [Rules for Delegation]
-        - If you assign a task to a subordinate, you MUST pass the 'current_task_id' ({state['task_id']}) to the 'assign_task' tool.
-        - After assigning, your status will automatically change to WAIT_SUBTASK. Do not output "FINAL RESULT" yet.
-        """
-        
         # print(f"\n🔍 [DEBUG: SYSTEM PROMPT sent to '{current_agent_name}'] " + "="*30)
         # print(system_prompt_text)
         # print("="*80 + "\n")
         
-        messages = [SystemMessage(content=system_prompt_text)] + state["messages"]
-        response = self.llm_with_tools.invoke(messages)
+        # [변경] 대화 전체를 매번 다시 보내지 않고 컨텍스트 예산 안으로 줄여서 보냄
+        # (이전 도구 결과는 요약/절삭, 최근 턴은 그대로. 체크포인트에 저장된 상태는 바뀌지 않음)
+        messages = fit_messages(SystemMessage(content=system_prompt_text), state["messages"], self.prompt_budget)
+        used = sum(message_tokens(m) for m in messages)
+        if used > self.prompt_budget:
+            print(f"⚠️ [Context] Prompt for '{current_agent_name}' (~{used} tokens) exceeds the {self.num_ctx}-token context window of {self.model_name}.")
+        return messages
+
+    def agent_reasoning(self, state: AgentState):
+        # CEO 공지사항 가져오기 (ANNOUNCEMENT_TTL 동안은 DB 조회 없이 재사용)
+        broadcast_msg = _cached_announcement()
+        if broadcast_msg is None:
+            broadcast_msg = _remember_announcement(get_active_announcement())
+        messages = self._build_messages(state, broadcast_msg)
+
+        def call():
+            ollama_pool.before_call()
+            with llm_limiter.slot(self.model_name, "chat"):
+                started = time.monotonic()
+                response = ollama_pool.invoke(self.model_name, lambda host: self.llm_for(host).invoke(messages))
+            observe_chat_response(self.model_name, "chat", response, time.monotonic() - started)
+            return response
+
+        # [추가] LLM_TRANSCRIPT_MODE=record / replay: 호출의 자리는 태스크 상태 + 대화 길이 (실행 순서와 무관)
+        response = transcripts.llm_call(state["task_id"], "chat", _transcript_key(state), self.model_name, messages, call)
+        
+        return {"messages": [response]}
+
+    async def aagent_reasoning(self, state: AgentState):
+        """agent_reasoning의 asyncio 버전: 모델 응답을 기다리는 동안 이벤트 루프를 양보"""
+        broadcast_msg = _cached_announcement()
+        if broadcast_msg is None:
+            broadcast_msg = _remember_announcement(await sync_to_async(get_active_announcement, thread_sensitive=False)())
+        messages = self._build_messages(state, broadcast_msg)
+
+        async def call():
+            ollama_pool.before_call()
+            async with llm_limiter.aslot(self.model_name, "chat"):
+                started = time.monotonic()
+                response = await ollama_pool.ainvoke(self.model_name, lambda host: self.llm_for(host).ainvoke(messages))
+            observe_chat_response(self.model_name, "chat", response, time.monotonic() - started)
+            return response
+
+        response = await transcripts.allm_call(state["task_id"], "chat", _transcript_key(state), self.model_name, messages, call)
         
         return {"messages": [response]}
 
@@ -203,16 +282,22 @@ class AgentNodes:
 # 3. 워크플로 그래프(Graph) 구성
 # ==============================================================================
 
-def create_agent_workflow(tools):
-    nodes = AgentNodes(tools)
+def create_agent_workflow(tools, model_name=GLOBAL_MODEL_NAME, checkpointer=None, num_ctx=None):
+    nodes = AgentNodes(tools, model_name, num_ctx)
     workflow = StateGraph(AgentState)
 
     # 노드 추가
-    workflow.add_node("agent", nodes.agent_reasoning)
+    # [변경] invoke()는 동기 노드, ainvoke()는 비동기 노드를 실행 (툴 역시 coroutine이 있으면 비동기로 실행)
+    workflow.add_node("agent", RunnableLambda(nodes.agent_reasoning, afunc=nodes.aagent_reasoning))
     
     # [핵심] LangGraph가 제공하는 ToolNode 사용
     # 모델이 도구 사용을 요청하면, 이 노드가 자동으로 함수를 실행하고 결과를 반환합니다.
-    workflow.add_node("tools", ToolNode(tools))
+    # [추가] LLM_TRANSCRIPT_MODE가 켜져 있으면 도구 결과도 기록하고, 재생할 때는 외부 조회 도구의 결과를 기록으로 대신함
+    if transcripts.enabled:
+        tool_node = ToolNode(tools, wrap_tool_call=transcripts.wrap_tool_call, awrap_tool_call=transcripts.awrap_tool_call)
+    else:
+        tool_node = ToolNode(tools)
+    workflow.add_node("tools", tool_node)
 
     # 진입점 설정
     workflow.set_entry_point("agent")
@@ -229,4 +314,72 @@ def create_agent_workflow(tools):
     # 엣지 연결: 도구 실행 후에는 다시 에이전트가 결과를 확인하도록 순환
     workflow.add_edge("tools", "agent")
 
-    return workflow.compile()
+    # [추가] checkpointer가 있으면 노드가 끝날 때마다 상태를 저장 (config의 thread_id = 태스크 ID)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+
+# ==============================================================================
+# 4. 컴파일된 워크플로 캐시 (Workflow Cache)
+# ==============================================================================
+
+class WorkflowCache:
+    """
+    (모델, 컨텍스트 길이, 툴셋) 시그니처별로 컴파일된 에이전트 그래프를 재사용하는 LRU 캐시.
+    대부분의 에이전트는 몇 가지 도구 조합(TIER_0 + allowed_tools + 고용/해고 권한)만 공유하므로,
+    태스크마다 ChatOllama 생성 / bind_tools / StateGraph 컴파일을 반복할 필요가 없습니다.
+    컴파일된 그래프는 호출 간 상태를 공유하지 않으므로 여러 워커 스레드에서 동시에 사용해도 안전합니다.
+    """
+
+    def __init__(self, maxsize=WORKFLOW_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._graphs = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(tools, model_name, num_ctx=None):
+        return (model_name, num_ctx, tuple(sorted({t.name for t in tools})))
+
+    def get(self, tools, model_name=GLOBAL_MODEL_NAME, num_ctx=None):
+        key = self.make_key(tools, model_name, num_ctx)
+        with self._lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return graph
+            self.misses += 1
+
+        # 컴파일은 락 밖에서 수행 (동시에 같은 키가 컴파일되더라도 결과는 동일하므로 무해)
+        graph = create_agent_workflow(tools, model_name, workflow_checkpointer if WORKFLOW_CHECKPOINTS else None, num_ctx)
+
+        with self._lock:
+            self._graphs[key] = graph
+            self._graphs.move_to_end(key)
+            while len(self._graphs) > self.maxsize:
+                self._graphs.popitem(last=False)
+        return graph
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._graphs),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._graphs.clear()
+
+
+agent_workflow_cache = WorkflowCache()
+
+def get_agent_workflow(tools, model_name=GLOBAL_MODEL_NAME, num_ctx=None):
+    """캐시된 에이전트 워크플로를 반환합니다 (없으면 컴파일 후 저장)."""
+    return agent_workflow_cache.get(tools, model_name, num_ctx)
@@ -1,12 +1,17 @@
+from django import forms
 from django.contrib import admin
+from django.utils import timezone
 from .models import Agent, Task, AgentMemory, TaskLog
 from .models import CorporateMemory
-from .models import Channel, ChannelMessage, Announcement
+from .models import Channel, ChannelMessage, Announcement, ArchiveJob, LLMCall
+from .text_search import keyword_query
+from .services import archive_service, kms_service
+from .task_events import notify_archive_job
 
 @admin.register(Agent)
 class AgentAdmin(admin.ModelAdmin):
-    list_display = ('name', 'role', 'manager', 'is_active')
-    list_filter = ('is_active', 'role')
+    list_display = ('name', 'role', 'manager', 'ollama_model_name', 'is_active')
+    list_filter = ('is_active', 'role', 'ollama_model_name')
     search_fields = ('name', 'role')
     raw_id_fields = ('manager',)
 
@@ -31,10 +36,45 @@ class TaskLogAdmin(admin.ModelAdmin):
     search_fields = ('task__title', 'details')
     raw_id_fields = ('task',)
 
+class CorporateMemoryForm(forms.ModelForm):
+    class Meta:
+        model = CorporateMemory
+        # content_hash는 save_model에서 본문으로 계산 (유일 제약 검사도 아래 clean()에서 대신함)
+        exclude = ['content_hash']
+
+    def clean(self):
+        # [추가] 같은 사용자의 위키에 같은 본문의 문서가 있으면 (owner, content_hash) 유일 제약 위반 전에 폼 오류로 알림
+        cleaned_data = super().clean()
+        owner, content = cleaned_data.get('owner'), cleaned_data.get('content')
+        if owner is not None and content is not None:
+            hash_ = kms_service.content_hash(content)
+            duplicate = CorporateMemory.objects.filter(owner=owner, content_hash=hash_).exclude(pk=self.instance.pk).first()
+            if duplicate:
+                raise forms.ValidationError(f"'{duplicate.subject}' already has the same content.")
+        return cleaned_data
+
 @admin.register(CorporateMemory)
 class CorporateMemoryAdmin(admin.ModelAdmin):
+    form = CorporateMemoryForm
     list_display = ('subject', 'created_at', 'source_task')
     search_fields = ('subject', 'content')
+    readonly_fields = ('content_hash',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # [변경] 본문 LIKE 스캔 대신 전문 검색 인덱스(search_vector GIN)를 사용
+        query = keyword_query(search_term)
+        if query is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(search_vector=query), False
+
+    def save_model(self, request, obj, form, change):
+        obj.content_hash = kms_service.content_hash(obj.content)
+        super().save_model(request, obj, form, change)
+        # [변경] 본문/제목을 고치면 문서 임베딩과 구간(Passage)을 아카이브 워커가 다시 만들도록 작업만 등록
+        # (요청 처리 중에 임베딩 모델을 기다리지 않음)
+        if not change or 'content' in form.changed_data or 'subject' in form.changed_data:
+            archive_service.enqueue_reembed(obj)
+            self.message_user(request, "Embedding refresh queued for the archive worker.")
 
 @admin.register(Channel)
 class ChannelAdmin(admin.ModelAdmin):
@@ -48,4 +88,29 @@ class ChannelMessageAdmin(admin.ModelAdmin):
 @admin.register(Announcement)
 class AnnouncementAdmin(admin.ModelAdmin):
     list_display = ('content', 'is_active', 'created_at')
-    list_filter = ('is_active',)
\ No newline at end of file
+    list_filter = ('is_active',)
+
+
+@admin.register(ArchiveJob)
+class ArchiveJobAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'kind', 'owner', 'status', 'attempts', 'next_attempt_at', 'updated_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('subject', 'last_error')
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected jobs now')
+    def retry_now(self, request, queryset):
+        # FAILED / 대기 중인 작업을 즉시 다시 시도하도록 되돌림 (처리 중인 작업은 제외)
+        jobs = queryset.exclude(status__in=[ArchiveJob.JobStatus.RUNNING, ArchiveJob.JobStatus.DONE])
+        count = jobs.update(status=ArchiveJob.JobStatus.PENDING, attempts=0, next_attempt_at=timezone.now())
+        if count:
+            # 대기 중인 아카이브 워커를 깨움 (하나만 알려도 워커가 처리 가능한 작업을 모두 가져감)
+            notify_archive_job(queryset.first())
+        self.message_user(request, f"{count} job(s) queued for retry.")
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'owner', 'agent', 'model', 'purpose', 'prompt_tokens', 'output_tokens', 'total_ms', 'cache_hit')
+    list_filter = ('purpose', 'model', 'cache_hit')
+    raw_id_fields = ('owner', 'agent', 'task')
+    date_hierarchy = 'created_at'
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CorpConfig(AppConfig):
     name = 'corp'
+
+    def ready(self):
+        # [추가] LLM 호출마다 토큰 수 / 소요 시간을 LLMCall 테이블에 모아서 저장 (LLM_ACCOUNTING=0이면 끔)
+        from corp.llm_accounting import llm_accounting
+        llm_accounting.install()
@@ -0,0 +1,245 @@
+import os
+import random
+import functools
+from asgiref.sync import sync_to_async
+from django.db import connections
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from corp.models import WorkflowCheckpoint, WorkflowCheckpointWrite
+
+# 스레드(태스크)마다 보관할 최근 체크포인트 수. 재개에는 마지막 것만 필요하므로 오래된 것은 정리
+CHECKPOINTS_PER_THREAD = int(os.getenv("WORKFLOW_CHECKPOINTS_PER_THREAD", "3"))
+
+
+def _in_thread(func):
+    """비동기 메서드용: ORM 호출을 스레드 풀에서 실행하고 그 스레드의 커넥션을 정리"""
+    def call_and_close(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return sync_to_async(call_and_close, thread_sensitive=False)
+
+
+def _closing_connection(func):
+    """
+    동기 저장 메서드용: LangGraph는 put / put_writes를 invoke마다 새로 만드는 백그라운드 스레드 풀에서 호출합니다.
+    그 스레드들의 커넥션은 스레드가 끝나도 GC 전까지 닫히지 않고 쌓이므로(워커 수가 많으면 DB 커넥션 한도 초과)
+    호출이 끝나면 바로 닫습니다. 호출한 쪽의 트랜잭션 안에서 불렸다면 그대로 둡니다.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connection = connections[WorkflowCheckpoint.objects.db]
+            if not connection.in_atomic_block:
+                connection.close()
+    return wrapper
+
+
+class DjangoCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Django ORM(Postgres)에 LangGraph 체크포인트를 저장하는 Checkpointer.
+    별도 드라이버(psycopg3) 없이 기존 DB 커넥션을 그대로 사용하므로 Thread/Process/asyncio 워커 어디서나 동작합니다.
+    체크포인트 한 행에 채널 값 전체를 저장하고, 스레드마다 최근 CHECKPOINTS_PER_THREAD개만 남깁니다.
+    """
+
+    def __init__(self, *, serde=None, keep: int = CHECKPOINTS_PER_THREAD):
+        super().__init__(serde=serde)
+        self.keep = max(1, keep)
+
+    # --- 조회 ---
+
+    def _to_tuple(self, row, pending_writes=None):
+        checkpoint = self.serde.loads_typed((row.checkpoint_type, bytes(row.checkpoint)))
+        if pending_writes is None:
+            pending_writes = self._load_writes(row.thread_id, row.checkpoint_ns, row.checkpoint_id)
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": row.thread_id,
+                    "checkpoint_ns": row.checkpoint_ns,
+                    "checkpoint_id": row.checkpoint_id,
+                }
+            },
+            checkpoint=checkpoint,
+            metadata=self.serde.loads_typed((row.metadata_type, bytes(row.metadata))),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": row.thread_id,
+                        "checkpoint_ns": row.checkpoint_ns,
+                        "checkpoint_id": row.parent_checkpoint_id,
+                    }
+                }
+                if row.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=pending_writes,
+        )
+
+    def _load_writes(self, thread_id, checkpoint_ns, checkpoint_id):
+        writes = WorkflowCheckpointWrite.objects.filter(
+            thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id=checkpoint_id
+        ).order_by('task_id', 'idx')
+        return [
+            (w.task_id, w.channel, self.serde.loads_typed((w.value_type, bytes(w.value))))
+            for w in writes
+        ]
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        rows = WorkflowCheckpoint.objects.filter(thread_id=thread_id, checkpoint_ns=checkpoint_ns)
+        if checkpoint_id := get_checkpoint_id(config):
+            row = rows.filter(checkpoint_id=checkpoint_id).first()
+        else:
+            row = rows.order_by('-checkpoint_id').first()
+        return self._to_tuple(row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        rows = WorkflowCheckpoint.objects.all()
+        if config:
+            rows = rows.filter(thread_id=config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                rows = rows.filter(checkpoint_ns=checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                rows = rows.filter(checkpoint_id=checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            rows = rows.filter(checkpoint_id__lt=before_id)
+
+        for row in rows.order_by('thread_id', 'checkpoint_ns', '-checkpoint_id').iterator():
+            item = self._to_tuple(row)
+            # 메타데이터는 직렬화되어 있으므로 필터는 파이썬에서 적용
+            if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield item
+
+    # --- 저장 ---
+
+    @_closing_connection
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, checkpoint_bytes = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_bytes = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        WorkflowCheckpoint.objects.update_or_create(
+            thread_id=thread_id,
+            checkpoint_ns=checkpoint_ns,
+            checkpoint_id=checkpoint["id"],
+            defaults={
+                "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+                "checkpoint_type": checkpoint_type,
+                "checkpoint": checkpoint_bytes,
+                "metadata_type": metadata_type,
+                "metadata": metadata_bytes,
+            },
+        )
+        self._prune(thread_id, checkpoint_ns)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    @_closing_connection
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        regular, special = [], []
+        for idx, (channel, value) in enumerate(writes):
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            value_type, value_bytes = self.serde.dumps_typed(value)
+            row = WorkflowCheckpointWrite(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint_id,
+                task_id=task_id,
+                task_path=task_path,
+                idx=write_idx,
+                channel=channel,
+                value_type=value_type,
+                value=value_bytes,
+            )
+            (special if write_idx < 0 else regular).append(row)
+
+        # 일반 쓰기는 먼저 저장된 것을 유지하고, 특수 쓰기(에러/인터럽트 등)는 최신 값으로 덮어씀
+        if regular:
+            WorkflowCheckpointWrite.objects.bulk_create(regular, ignore_conflicts=True)
+        if special:
+            WorkflowCheckpointWrite.objects.bulk_create(
+                special,
+                update_conflicts=True,
+                unique_fields=['thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'],
+                update_fields=['channel', 'value_type', 'value', 'task_path'],
+            )
+
+    def _prune(self, thread_id, checkpoint_ns):
+        stale_ids = list(
+            WorkflowCheckpoint.objects.filter(thread_id=thread_id, checkpoint_ns=checkpoint_ns)
+            .order_by('-checkpoint_id')
+            .values_list('checkpoint_id', flat=True)[self.keep:]
+        )
+        if stale_ids:
+            WorkflowCheckpoint.objects.filter(
+                thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id__in=stale_ids
+            ).delete()
+            WorkflowCheckpointWrite.objects.filter(
+                thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id__in=stale_ids
+            ).delete()
+
+    def delete_thread(self, thread_id):
+        WorkflowCheckpoint.objects.filter(thread_id=thread_id).delete()
+        WorkflowCheckpointWrite.objects.filter(thread_id=thread_id).delete()
+
+    def get_next_version(self, current, channel):
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # --- asyncio 워커(ainvoke)용 ---
+
+    async def aget_tuple(self, config):
+        return await _in_thread(self.get_tuple)(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await _in_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))()
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await _in_thread(self.put)(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await _in_thread(self.put_writes)(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return await _in_thread(self.delete_thread)(thread_id)
+
+
+workflow_checkpointer = DjangoCheckpointSaver()
+
+
+def task_thread_config(task_id) -> dict:
+    """태스크 ID를 체크포인트 스레드로 사용하는 워크플로 실행 설정"""
+    return {"configurable": {"thread_id": str(task_id)}}
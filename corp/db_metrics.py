@@ -0,0 +1,45 @@
+import time
+import threading
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+class QueryCounter:
+    """
+    프로세스의 모든 DB 커넥션(워커 스레드마다 따로 열리는 커넥션 포함)에서 실행된 쿼리 수와 시간을 셉니다.
+    DEBUG 없이 동작하도록 execute_wrapper를 새 커넥션마다(connection_created) 설치합니다.
+    (process 워커 모드의 자식 프로세스 쿼리는 집계되지 않습니다.)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.seconds = 0.0
+        self._installed = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.queries += 1
+                self.seconds += elapsed
+
+    def _attach(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install(self):
+        """이미 열린 커넥션과 앞으로 열릴 커넥션 모두에 설치합니다."""
+        if not self._installed:
+            self._installed = True
+            connection_created.connect(self._attach, weak=False)
+            for connection in connections.all(initialized_only=True):
+                self._attach(connection=connection)
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {"queries": self.queries, "seconds": self.seconds}
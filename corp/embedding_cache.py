@@ -0,0 +1,144 @@
+import os
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from corp.models import CachedEmbedding
+
+# 프로세스 내 LRU 계층에 보관할 임베딩 수
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+
+# Postgres 영속 계층 사용 여부 (러너 재시작 / 여러 러너 사이에서도 재사용)
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "1") == "1"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    (모델, sha256(텍스트)) 키의 2단 임베딩 캐시.
+    - 1단: 프로세스 내 LRU (락으로 보호되어 워커 스레드 간 공유)
+    - 2단: CachedEmbedding 테이블 (다른 러너 / 재시작 이후에도 공유)
+    같은 질문으로 위키를 반복 검색하거나 같은 결과를 다시 저장할 때 임베딩 모델 호출을 건너뜁니다.
+    """
+
+    def __init__(self, maxsize=EMBEDDING_CACHE_SIZE, use_db=EMBEDDING_CACHE_DB):
+        self.maxsize = maxsize
+        self.use_db = use_db
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.maxsize:
+                self._vectors.popitem(last=False)
+
+    def get(self, model: str, text: str):
+        """캐시된 임베딩(list[float])을 반환합니다. 없으면 None."""
+        key = (model, text_hash(text))
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+        if self.use_db:
+            row = CachedEmbedding.objects.filter(model=key[0], text_hash=key[1]).values_list('embedding', flat=True).first()
+            if row is not None:
+                vector = np.asarray(row, dtype=np.float32).tolist()
+                self._remember(key, vector)
+                with self._lock:
+                    self.db_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model: str, text: str, vector):
+        """임베딩을 저장하고, 캐시에 저장된 형태(float32 정밀도)의 벡터를 반환합니다."""
+        if not vector:
+            return vector
+        key = (model, text_hash(text))
+        # pgvector는 float32로 저장하므로 메모리 계층도 같은 정밀도로 맞춤 (계층에 따라 값이 달라지지 않게)
+        vector = np.asarray(vector, dtype=np.float32).tolist()
+        self._remember(key, vector)
+        if self.use_db:
+            # 다른 러너가 먼저 저장했어도 결과는 같으므로 충돌은 무시
+            CachedEmbedding.objects.bulk_create(
+                [CachedEmbedding(model=key[0], text_hash=key[1], embedding=vector)],
+                ignore_conflicts=True,
+            )
+        return vector
+
+    def get_many(self, model: str, texts):
+        """get()의 배치 버전: 메모리에 없는 키는 DB에서 한 번의 쿼리로 조회합니다. 없는 항목은 None."""
+        keys = [(model, text_hash(t)) for t in texts]
+        results = {}
+        with self._lock:
+            for key in keys:
+                vector = self._vectors.get(key)
+                if vector is not None:
+                    self._vectors.move_to_end(key)
+                    results[key] = vector
+            memory_found = sum(1 for key in keys if key in results)
+            self.memory_hits += memory_found
+
+        pending = {key[1] for key in keys if key not in results}
+        if self.use_db and pending:
+            rows = CachedEmbedding.objects.filter(model=model, text_hash__in=pending).values_list('text_hash', 'embedding')
+            for hash_, embedding in rows.iterator():
+                vector = np.asarray(embedding, dtype=np.float32).tolist()
+                results[(model, hash_)] = vector
+                self._remember((model, hash_), vector)
+            with self._lock:
+                self.db_hits += sum(1 for key in keys if key in results) - memory_found
+
+        with self._lock:
+            self.misses += sum(1 for key in keys if key not in results)
+        return [results.get(key) for key in keys]
+
+    def put_many(self, model: str, texts, vectors):
+        """put()의 배치 버전: DB 계층에는 한 번의 bulk_create로 저장합니다."""
+        stored = []
+        rows = []
+        for text, vector in zip(texts, vectors):
+            if not vector:
+                stored.append(vector)
+                continue
+            key = (model, text_hash(text))
+            vector = np.asarray(vector, dtype=np.float32).tolist()
+            self._remember(key, vector)
+            rows.append(CachedEmbedding(model=key[0], text_hash=key[1], embedding=vector))
+            stored.append(vector)
+        if self.use_db and rows:
+            CachedEmbedding.objects.bulk_create(rows, ignore_conflicts=True)
+        return stored
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            total = hits + self.misses
+            return {
+                "size": len(self._vectors),
+                "maxsize": self.maxsize,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": (hits / total) if total else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,175 @@
+import os
+import time
+import atexit
+import threading
+from collections import deque
+from datetime import timedelta
+from django.db import connections, InterfaceError, OperationalError
+from django.utils import timezone
+from ai_core.llm_gateway import call_observers
+from corp.models import LLMCall
+
+# LLM 호출 기록 사용 여부 (기본값: 켬)
+LLM_ACCOUNTING = os.getenv("LLM_ACCOUNTING", "1") == "1"
+
+# 이만큼 모이면 바로 저장 (한 번의 INSERT로 저장할 최대 건수)
+LLM_ACCOUNTING_BATCH_SIZE = int(os.getenv("LLM_ACCOUNTING_BATCH_SIZE", "200"))
+
+# 덜 모였어도 이 간격(초)마다 저장
+LLM_ACCOUNTING_FLUSH_INTERVAL = float(os.getenv("LLM_ACCOUNTING_FLUSH_INTERVAL", "5"))
+
+# 저장하지 못한 기록을 메모리에 쌓아 둘 최대 건수 (DB 장애가 길어지면 가장 오래된 것부터 버림)
+LLM_ACCOUNTING_MAX_PENDING = int(os.getenv("LLM_ACCOUNTING_MAX_PENDING", "10000"))
+
+# 기록 보관 기간(일). 0이면 지우지 않음
+LLM_ACCOUNTING_RETENTION_DAYS = int(os.getenv("LLM_ACCOUNTING_RETENTION_DAYS", "30"))
+
+# 이 횟수만큼 저장할 때마다 보관 기간이 지난 기록을 정리
+LLM_ACCOUNTING_PRUNE_EVERY = int(os.getenv("LLM_ACCOUNTING_PRUNE_EVERY", "500"))
+
+
+def _ms(nanoseconds) -> int:
+    return int((nanoseconds or 0) // 1_000_000)
+
+
+class LLMCallRecorder:
+    """
+    ai_core.llm_gateway의 호출 관찰자. 호출마다 한 행씩 INSERT하는 대신 메모리에 모았다가
+    백그라운드 스레드가 batch_size건 또는 flush_interval초마다 bulk_create로 한꺼번에 저장합니다.
+    (프로세스 종료 시 남은 기록도 저장. process 워커 모드의 자식 프로세스는 마지막 flush_interval초 분량을 잃을 수 있음)
+    """
+
+    def __init__(self, enabled=LLM_ACCOUNTING, batch_size=LLM_ACCOUNTING_BATCH_SIZE,
+                 flush_interval=LLM_ACCOUNTING_FLUSH_INTERVAL, max_pending=LLM_ACCOUNTING_MAX_PENDING):
+        self.enabled = enabled
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pending = deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+        # 저장은 한 번에 한 스레드만 (백그라운드 스레드와 flush() 호출이 겹치지 않도록)
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._installed = False
+        self.recorded = 0
+        self.saved = 0
+        self.dropped = 0
+        self.flushes = 0
+
+    def install(self):
+        """llm_gateway의 관찰자로 등록합니다 (여러 번 불러도 한 번만 등록)."""
+        if self.enabled and not self._installed:
+            self._installed = True
+            call_observers.append(self)
+            atexit.register(self.stop)
+        return self
+
+    def __call__(self, record):
+        usage = record.get("usage") or {}
+        row = LLMCall(
+            created_at=timezone.now(),
+            owner_id=record.get("owner_id"),
+            agent_id=record.get("agent_id"),
+            task_id=record.get("task_id"),
+            model=(record.get("model") or "")[:100],
+            purpose=(record.get("purpose") or "")[:32],
+            prompt_tokens=usage.get("prompt_eval_count") or 0,
+            output_tokens=usage.get("eval_count") or 0,
+            prompt_ms=_ms(usage.get("prompt_eval_duration")),
+            eval_ms=_ms(usage.get("eval_duration")),
+            load_ms=_ms(usage.get("load_duration")),
+            total_ms=_ms(usage.get("total_duration")),
+            wall_ms=int(record.get("elapsed", 0) * 1000),
+            cache_hit=bool(record.get("cache_hit")),
+        )
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped += 1
+            self._pending.append(row)
+            self.recorded += 1
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None:
+                # 첫 기록이 들어올 때 저장 스레드를 시작 (호출이 없는 프로세스에서는 스레드를 만들지 않음)
+                self._thread = threading.Thread(target=self._run, name='llm-accounting', daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self) -> int:
+        """모인 기록을 저장합니다. Returns: 저장한 건수"""
+        saved = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    break
+                try:
+                    LLMCall.objects.bulk_create(batch)
+                    count = len(batch)
+                except (OperationalError, InterfaceError) as e:
+                    # DB 연결 문제면 다음 주기에 다시 시도 (쌓인 양이 max_pending을 넘으면 오래된 것부터 버려짐)
+                    print(f"⚠️ [LLM Accounting] Failed to save {len(batch)} call(s), will retry: {e}")
+                    with self._lock:
+                        self._pending.extendleft(reversed(batch))
+                    connections.close_all()
+                    break
+                except Exception:
+                    # 값이 잘못된 기록이 섞여 있으면 한 건씩 저장하고 그 기록만 버림 (다시 시도해도 실패하므로)
+                    count = self._save_each(batch)
+                saved += count
+                with self._lock:
+                    self.saved += count
+                    self.flushes += 1
+                    prune = LLM_ACCOUNTING_RETENTION_DAYS > 0 and self.flushes % LLM_ACCOUNTING_PRUNE_EVERY == 0
+                if prune:
+                    self.prune()
+        return saved
+
+    def _save_each(self, batch) -> int:
+        count = 0
+        for row in batch:
+            try:
+                LLMCall.objects.bulk_create([row])
+                count += 1
+            except Exception as e:
+                print(f"⚠️ [LLM Accounting] Dropped a call record ({row.model} / {row.purpose}): {e}")
+                with self._lock:
+                    self.dropped += 1
+        return count
+
+    def prune(self) -> int:
+        """보관 기간(LLM_ACCOUNTING_RETENTION_DAYS)이 지난 기록을 지웁니다. Returns: 지운 건수"""
+        cutoff = timezone.now() - timedelta(days=LLM_ACCOUNTING_RETENTION_DAYS)
+        return LLMCall.objects.filter(created_at__lt=cutoff).delete()[0]
+
+    def stop(self, timeout: float = 10):
+        """저장 스레드를 멈추고 남은 기록을 저장합니다."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        started = time.monotonic()
+        while self._pending and time.monotonic() - started < timeout:
+            if not self.flush():
+                break
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recorded": self.recorded, "saved": self.saved,
+                "pending": len(self._pending), "dropped": self.dropped,
+            }
+
+
+llm_accounting = LLMCallRecorder()
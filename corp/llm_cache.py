@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration
+from corp.models import CachedLLMResponse
+from ai_core.llm_gateway import observe_llm_call
+
+# LLM 응답 캐시 사용 여부 (기본값: 끔). 같은 입력에 같은 응답을 돌려주는 것이 허용되는 호출에만 켭니다
+LLM_CACHE = os.getenv("LLM_CACHE", "0") == "1"
+
+# 캐시를 사용할 호출 용도 (llm_limiter의 purpose와 같은 이름). 에이전트 추론(chat)까지 캐시하려면 'chat'을 추가
+LLM_CACHE_PURPOSES = {p.strip() for p in os.getenv("LLM_CACHE_PURPOSES", "review,summarize").split(",") if p.strip()}
+
+# 캐시된 응답의 유효 시간(초)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+
+# 영속 계층(CachedLLMResponse)에 보관할 최대 응답 수. 넘으면 가장 오래 쓰이지 않은 응답부터 지움
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+# 프로세스 내 LRU 계층에 보관할 응답 수
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "512"))
+
+# 이 횟수만큼 저장할 때마다 만료 / 초과 응답을 정리
+LLM_CACHE_EVICT_EVERY = int(os.getenv("LLM_CACHE_EVICT_EVERY", "100"))
+
+# 호출마다 새로 만들어지는 식별자. 값이 달라도 응답에는 영향이 없으므로 키에서 정규화함
+_VOLATILE_ID_KEYS = {"id", "tool_call_id"}
+
+
+def _normalize(value, ids):
+    """메시지 JSON에서 실행마다 달라지는 ID를 등장 순서대로 바꾸고, 줄 끝 공백을 정리합니다."""
+    if isinstance(value, dict):
+        normalized = {}
+        for k, v in value.items():
+            # (LangChain 직렬화 형식의 "id"는 클래스 경로 목록이므로 문자열인 경우만 바꿈)
+            if k in _VOLATILE_ID_KEYS and isinstance(v, str):
+                normalized[k] = ids.setdefault(v, f"id-{len(ids)}")
+            else:
+                normalized[k] = _normalize(v, ids)
+        return normalized
+    if isinstance(value, list):
+        return [_normalize(v, ids) for v in value]
+    if isinstance(value, str):
+        return "\n".join(line.rstrip() for line in value.strip().splitlines())
+    return value
+
+
+def normalize_prompt(prompt) -> str:
+    """메시지 목록(또는 LangChain이 직렬화한 JSON 문자열)을 캐시 키용 정규 문자열로 바꿉니다."""
+    if isinstance(prompt, str):
+        try:
+            prompt = json.loads(prompt)
+        except ValueError:
+            return _normalize(prompt, {})
+    return json.dumps(_normalize(prompt, {}), sort_keys=True, ensure_ascii=False)
+
+
+def make_key(model: str, options, prompt, tools=None) -> str:
+    """
+    (모델, 옵션, 정규화된 메시지, 도구 명세 해시) 캐시 키 (sha256).
+    options / tools는 JSON으로 직렬화할 수 있는 값이어야 합니다.
+    """
+    tools_hash = hashlib.sha256(json.dumps(tools or [], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    payload = json.dumps(
+        [model, options or {}, normalize_prompt(prompt), tools_hash],
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    키(make_key) -> 응답 문자열의 2단 캐시.
+    - 1단: 프로세스 내 LRU (만료 시각과 함께 보관, 락으로 보호되어 워커 스레드 간 공유)
+    - 2단: CachedLLMResponse 테이블 (다른 러너 / 재시작 이후에도 공유, TTL + 최대 개수로 크기 제한)
+    """
+
+    def __init__(self, enabled=LLM_CACHE, purposes=LLM_CACHE_PURPOSES, ttl=LLM_CACHE_TTL,
+                 max_entries=LLM_CACHE_MAX_ENTRIES, memory_size=LLM_CACHE_MEMORY_SIZE):
+        self.enabled = enabled
+        self.purposes = set(purposes)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def enabled_for(self, purpose: str) -> bool:
+        return self.enabled and purpose in self.purposes
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.memory_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str):
+        """캐시된 응답 문자열을 반환합니다. 없거나 만료되었으면 None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        row = CachedLLMResponse.objects.filter(key=key, expires_at__gt=timezone.now()).values_list('response', 'expires_at').first()
+        if row is not None:
+            CachedLLMResponse.objects.filter(key=key).update(hits=F('hits') + 1, last_hit_at=timezone.now())
+            self._remember(key, row[0], row[1].timestamp())
+            with self._lock:
+                self.db_hits += 1
+            return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: str, model: str, purpose: str):
+        expires_at = timezone.now() + timedelta(seconds=self.ttl)
+        self._remember(key, value, expires_at.timestamp())
+        CachedLLMResponse.objects.update_or_create(
+            key=key, defaults={"model": model, "purpose": purpose, "response": value, "expires_at": expires_at},
+        )
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % LLM_CACHE_EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """만료된 응답을 지우고, 최대 개수를 넘으면 가장 오래 쓰이지 않은 응답부터 지웁니다. Returns: 지운 수"""
+        removed, _ = CachedLLMResponse.objects.filter(expires_at__lte=timezone.now()).delete()
+        overflow = CachedLLMResponse.objects.count() - self.max_entries
+        if overflow > 0:
+            oldest = (
+                CachedLLMResponse.objects.order_by(F('last_hit_at').asc(nulls_first=True), 'created_at')
+                .values_list('id', flat=True)[:overflow]
+            )
+            removed += CachedLLMResponse.objects.filter(id__in=list(oldest)).delete()[0]
+        return removed
+
+    # --- OllamaClient.generate 용 ---
+
+    def get_generate(self, purpose: str, model: str, prompt: str, **options):
+        """캐시된 /api/generate 응답(dict). 이 용도의 캐시가 꺼져 있거나 없으면 None."""
+        if not self.enabled_for(purpose):
+            return None
+        value = self.get(make_key(model, options, prompt))
+        if value is None:
+            return None
+        # [추가] 캐시 적중도 호출 1건으로 계측 (GPU 시간 0)
+        observe_llm_call(model, purpose, {}, 0.0, cache_hit=True)
+        return json.loads(value)
+
+    def put_generate(self, purpose: str, model: str, prompt: str, response: dict, **options):
+        if self.enabled_for(purpose) and response.get("done", True) and not response.get("error"):
+            self.put(make_key(model, options, prompt), json.dumps(response, ensure_ascii=False), model, purpose)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            total = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": (hits / total) if total else 0.0,
+            }
+
+    def clear(self):
+        """메모리 계층과 영속 계층을 모두 비웁니다."""
+        with self._lock:
+            self._entries.clear()
+        CachedLLMResponse.objects.all().delete()
+
+
+llm_cache = LLMResponseCache()
+
+
+class ChatResponseCache(BaseCache):
+    """
+    ChatOllama(cache=...)에 연결하는 LangChain 캐시 어댑터.
+    LangChain이 넘겨주는 llm_string에는 모델 / 옵션(temperature, num_ctx 등) / bind_tools 도구 명세가 모두 들어 있습니다.
+    """
+
+    def __init__(self, purpose: str, model: str, cache: LLMResponseCache = llm_cache):
+        self.purpose = purpose
+        self.model = model
+        self.cache = cache
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return make_key(llm_string, {}, prompt)
+
+    def lookup(self, prompt: str, llm_string: str):
+        value = self.cache.get(self._key(prompt, llm_string))
+        if value is None:
+            return None
+        # [추가] 캐시에서 돌려준 응답임을 표시 (호출 계측에서 GPU 시간 / 토큰 수를 0으로 셈)
+        return [
+            ChatGeneration(message=m.model_copy(update={"response_metadata": {**m.response_metadata, "cache_hit": True}}))
+            for m in messages_from_dict(json.loads(value))
+        ]
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        # 채팅 모델의 결과(ChatGeneration)는 메시지만 저장하면 그대로 복원됨 (도구 호출 포함)
+        value = json.dumps([message_to_dict(g.message) for g in return_val], ensure_ascii=False)
+        self.cache.put(self._key(prompt, llm_string), value, self.model, self.purpose)
+
+    def clear(self, **kwargs) -> None:
+        self.cache.clear()
+
+
+def chat_cache(purpose: str, model: str):
+    """이 용도(purpose)의 캐시가 켜져 있으면 ChatOllama(cache=...)에 넘길 어댑터, 아니면 None"""
+    return ChatResponseCache(purpose, model) if llm_cache.enabled_for(purpose) else None
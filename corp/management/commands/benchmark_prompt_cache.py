@@ -0,0 +1,113 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from ai_core.context_window import DEFAULT_CONTEXT_WINDOW
+from ai_core.llm_gateway import OllamaClient
+from ai_core.prompts.system_prompts import build_agent_system_prompt, task_static_prompt
+from ai_core.tokens import estimate_tokens
+from ai_core.workflow import GLOBAL_MODEL_NAME
+
+BROADCAST = "\n📢 [CEO BROADCAST / ALL-HANDS ALERT]\nQuarterly review is next week.\n(Prioritize this instruction above all else.)\n"
+
+
+def _legacy_prompt(state, broadcast_msg, now):
+    # 이전 배치: 초 단위 시각과 공지가 프롬프트 앞쪽에 있어 매 단계 앞부분이 달라짐
+    return f"""You are {state['agent_name']}, a capable AI manager.
+
+        [Current Time]
+        {now.strftime("%Y-%m-%d %H:%M:%S %A")}
+        {broadcast_msg}
+        """ + task_static_prompt(state)
+
+
+LAYOUTS = {
+    "legacy": _legacy_prompt,
+    "cached": build_agent_system_prompt,
+}
+
+
+class Command(BaseCommand):
+    help = '도구 루프를 흉내 내어 시스템 프롬프트 배치(legacy / cached)별 단계당 프롬프트 평가 시간을 측정합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', default=GLOBAL_MODEL_NAME, help='측정할 모델 (기본값: LLM_MODEL)')
+        parser.add_argument('--steps', type=int, default=6, help='실행마다 반복할 도구 루프 단계 수')
+        parser.add_argument('--tool-result-chars', type=int, default=2000, help='단계마다 대화에 추가할 도구 결과 길이(문자)')
+        parser.add_argument(
+            '--step-delay', type=float, default=1.0,
+            help='단계 사이 대기 시간(초). 실제 도구 실행 시간을 흉내 내며, 초 단위 시각이 바뀌게 합니다.'
+        )
+        parser.add_argument('--num-ctx', type=int, default=DEFAULT_CONTEXT_WINDOW, help='요청에 사용할 num_ctx')
+        parser.add_argument('--layout', choices=sorted(LAYOUTS), action='append', help='측정할 배치 (생략하면 모두)')
+
+    def handle(self, *args, **options):
+        client = OllamaClient()
+        layouts = options['layout'] or ['legacy', 'cached']
+        results = {}
+        for index, layout in enumerate(layouts):
+            self.stdout.write(f"▶ Layout '{layout}' ({options['steps']} steps, model {options['model']})")
+            try:
+                results[layout] = self._run(client, layout, index, options)
+            except Exception as e:
+                raise CommandError(f"Benchmark failed on layout '{layout}': {e}")
+
+        self.stdout.write("")
+        for layout, steps in results.items():
+            # 첫 단계는 어느 배치든 전체를 평가하므로 2단계부터 비교
+            later = steps[1:] or steps
+            avg_tokens = sum(s[0] for s in later) / len(later)
+            avg_ms = sum(s[1] for s in later) / len(later)
+            self.stdout.write(
+                f"{layout:>7}: prompt eval per step (after step 1) avg {avg_tokens:.0f} tokens / {avg_ms:.1f} ms"
+            )
+        if 'legacy' in results and 'cached' in results:
+            legacy = results['legacy'][1:] or results['legacy']
+            cached = results['cached'][1:] or results['cached']
+            saved = sum(s[1] for s in legacy) / len(legacy) - sum(s[1] for s in cached) / len(cached)
+            self.stdout.write(self.style.SUCCESS(f"✅ Prompt eval time saved per step: {saved:.1f} ms"))
+
+    def _run(self, client, layout, index, options):
+        # 배치마다 다른 태스크로 측정 (앞 배치가 남긴 캐시를 재사용하지 않도록)
+        state = {
+            "agent_name": "Benchmark Agent",
+            "task_id": 900000 + index,
+            "task_title": f"Prompt cache benchmark #{index}",
+            "task_description": "Research the topic with the available tools and write a short report.",
+            "task_status": "THINKING",
+            "prev_result": "",
+            "subordinates": [{"id": 1, "name": "Analyst", "role": "Research"}],
+            "history_context": "",
+        }
+        tool_result = ("Search result: lorem ipsum dolor sit amet. " * 100)[:options['tool_result_chars']]
+        build = LAYOUTS[layout]
+        conversation = []
+        steps = []
+        previous = ""
+        for step in range(1, options['steps'] + 1):
+            system = build(state, BROADCAST, timezone.localtime())
+            messages = [{"role": "system", "content": system}] + conversation
+            # 직전 요청과 같은 앞부분 = 서버가 KV 캐시로 재사용할 수 있는 최대 범위 (서버와 무관하게 확인 가능)
+            prompt = "\n".join(m["content"] for m in messages)
+            reusable = estimate_tokens(os.path.commonprefix([previous, prompt]))
+            previous = prompt
+            response = client.chat(
+                options['model'],
+                messages,
+                # 생성은 1토큰만: 프롬프트 평가 시간만 비교
+                options={"num_ctx": options['num_ctx'], "num_predict": 1, "temperature": 0},
+            )
+            tokens = response.get("prompt_eval_count", 0)
+            ms = response.get("prompt_eval_duration", 0) / 1e6
+            steps.append((tokens, ms))
+            self.stdout.write(
+                f"   step {step}: {tokens} prompt tokens evaluated in {ms:.1f} ms "
+                f"(~{reusable} of ~{estimate_tokens(prompt)} tokens reusable from the previous step)"
+            )
+
+            conversation += [
+                {"role": "assistant", "content": f"Calling search_web for part {step}."},
+                {"role": "tool", "content": f"[{step}] {tool_result}"},
+            ]
+            time.sleep(options['step_delay'])
+        return steps
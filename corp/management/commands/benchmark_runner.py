@@ -0,0 +1,400 @@
+import os
+import sys
+import json
+import time
+import signal
+import uuid
+import tempfile
+import subprocess
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ai_core.mock_ollama import MockOllama, parse_tool_script
+from corp.models import Agent, LLMCall, Task, WorkflowCheckpoint, WorkflowCheckpointWrite
+from corp.services import usage_service
+
+# 합성 회사의 사용자 이름 접두사. 측정이 끝나면 이 접두사의 사용자(와 딸린 에이전트 / 태스크)를 지움
+BENCH_PREFIX = "bench-owner-"
+
+# 부서장(매니저) 한 명당 팀원 수
+TEAM_SIZE = 10
+
+# 합성 회사의 에이전트 / 태스크 ID를 만드는 네임스페이스. 같은 설정이면 실행할 때마다 같은 ID가 나오므로
+# --record로 남긴 기록(태스크 ID별 파일)을 다른 코드 버전에서 --replay로 다시 쓸 수 있음
+BENCH_NAMESPACE = uuid.UUID("5d1f3a5e-4c1b-4f3e-9a56-0b8f6c3e2a71")
+
+# --compare에서 비교할 지표: (보고서 안의 경로, 이름, 낮을수록 좋은지)
+COMPARE_METRICS = [
+    (("runner", "wall_seconds"), "wall time (s)", True),
+    (("runner", "tasks_per_sec"), "tasks/sec", False),
+    (("runner", "runs_per_sec"), "runs/sec", False),
+    (("runner", "db", "queries"), "DB queries", True),
+    (("runner", "queries_per_run"), "queries/run", True),
+    (("runner", "loop", "p95"), "loop p95 (s)", True),
+    (("runner", "transcripts", "prompt_tokens"), "prompt tokens", True),
+    (("runner", "transcripts", "output_tokens"), "output tokens", True),
+]
+
+ACTIVE_STATUSES = [Task.TaskStatus.THINKING, Task.TaskStatus.APPROVED, Task.TaskStatus.WAIT_APPROVAL, Task.TaskStatus.WAIT_SUBTASK]
+
+
+class Command(BaseCommand):
+    help = (
+        '가짜 Ollama 서버로 합성 회사(여러 사용자 / 수천 에이전트·태스크)를 만들고 run_agents를 끝까지 실행하여 '
+        '처리량(tasks/sec), 스케줄링 루프 지연, DB 쿼리 수와 웹 화면 응답 시간을 측정합니다.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owners', type=int, default=4, help='합성 회사의 사용자(owner) 수')
+        parser.add_argument('--agents', type=int, default=1000, help='전체 에이전트 수 (사용자별로 나눔)')
+        parser.add_argument('--tasks', type=int, default=2000, help='전체 태스크 수 (팀원에게 고르게 배정)')
+        parser.add_argument(
+            '--models', default='',
+            help='에이전트에 돌아가며 지정할 모델 (쉼표 구분, 생략하면 모두 LLM_MODEL). 모델별 배치 배정을 함께 측정할 때 사용'
+        )
+        parser.add_argument('--workers', type=int, default=8, help='run_agents --workers')
+        parser.add_argument('--executor', choices=['thread', 'process', 'asyncio'], default='thread', help='run_agents --executor')
+        parser.add_argument(
+            '--mock-port', type=int, default=0,
+            help='가짜 Ollama 포트 (0: 빈 포트). 웹 측정의 Ollama 상태 조회도 가짜 서버로 보내려면 OLLAMA_HOST를 이 포트로 지정'
+        )
+        parser.add_argument('--latency', type=float, default=0.05, help='가짜 Ollama의 생성 요청 지연(초)')
+        parser.add_argument('--jitter', type=float, default=0.0, help='가짜 Ollama의 무작위 추가 지연 최댓값(초)')
+        parser.add_argument(
+            '--tool-script', default='calculator_tool={"expression": "6 * 7"}',
+            help='에이전트 대화마다 가짜 Ollama가 차례로 호출할 도구 (mock_ollama --tool-script와 같은 형식)'
+        )
+        parser.add_argument('--approve-rate', type=float, default=1.0, help='결재 승인 확률 (1 미만이면 반려 후 재작업이 섞임)')
+        parser.add_argument('--timeout', type=float, default=600, help='러너 실행 최대 시간(초). 넘으면 중단하고 그때까지의 결과를 보고')
+        parser.add_argument('--idle-exit', type=float, default=5, help='할 일이 없는 상태가 이 시간(초) 이어지면 러너 종료')
+        parser.add_argument('--web-requests', type=int, default=20, help='화면(대시보드 / 모니터 / 위키 / 에이전트 상세)마다 보낼 요청 수 (0이면 생략)')
+        parser.add_argument(
+            '--ollama-host',
+            help='가짜 서버 대신 이 Ollama 서버로 러너를 실행합니다 (실제 모델 응답을 --record로 남길 때 사용)'
+        )
+        parser.add_argument(
+            '--record', metavar='DIR',
+            help='러너의 모든 LLM 요청/응답과 도구 결과를 태스크별로 DIR에 기록합니다 (LLM_TRANSCRIPT_MODE=record)'
+        )
+        parser.add_argument(
+            '--replay', metavar='DIR',
+            help='Ollama를 부르지 않고 DIR의 기록으로 응답합니다 (LLM_TRANSCRIPT_MODE=replay). 같은 설정으로 기록한 것이어야 함'
+        )
+        parser.add_argument(
+            '--replay-latency', type=float, default=0.0,
+            help='재생할 때 기록된 LLM 응답 시간에 곱해 기다릴 비율 (0: 기다리지 않음, 1: 기록 당시와 같음)'
+        )
+        parser.add_argument('--compare', metavar='REPORT', help='이전 --report 결과와 벽시계 시간 / DB 쿼리 / 토큰 수를 비교합니다.')
+        parser.add_argument('--report', help='결과를 JSON으로 저장할 파일 경로')
+        parser.add_argument('--keep', action='store_true', help='측정이 끝난 뒤 합성 회사 데이터를 지우지 않습니다.')
+
+    def handle(self, *args, **options):
+        owners = max(1, options['owners'])
+        if options['agents'] < owners * 3:
+            raise CommandError("--agents must be at least 3 per owner (lead, manager, member).")
+        try:
+            tool_script = parse_tool_script(options['tool_script'])
+        except ValueError as e:
+            raise CommandError(f"Invalid --tool-script: {e}")
+        if options['record'] and options['replay']:
+            raise CommandError("--record and --replay cannot be used together.")
+        if options['replay'] and not os.path.isdir(options['replay']):
+            raise CommandError(f"Transcript directory not found: {options['replay']}")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read --compare report: {e}")
+
+        self._cleanup()
+        others = Task.objects.filter(status__in=ACTIVE_STATUSES).count()
+        if others:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ {others} active task(s) outside the benchmark will also be processed by the runner."
+            ))
+
+        started = time.monotonic()
+        users = self._create_company(owners, options['agents'], options['tasks'], options['models'])
+        self.stdout.write(self.style.SUCCESS(
+            f"🏢 Created {owners} owner(s), {options['agents']} agent(s), {options['tasks']} task(s) "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
+
+        # 재생 중에도 임베딩 / 모델 목록 조회는 Ollama로 가므로 가짜 서버는 --ollama-host가 없으면 항상 띄움
+        mock = None
+        ollama_url = options['ollama_host']
+        if not ollama_url:
+            mock = MockOllama(
+                port=options['mock_port'], latency=options['latency'], jitter=options['jitter'],
+                tool_script=tool_script, approve_rate=options['approve_rate'],
+                models=[m.strip() for m in options['models'].split(",") if m.strip()] or None,
+            ).start()
+            ollama_url = mock.url
+            self.stdout.write(f"🧪 Mock Ollama on {mock.url} (latency {options['latency']}s)")
+        if options['record'] or options['replay']:
+            self.stdout.write(f"📼 Transcripts: {'record to' if options['record'] else 'replay from'} {options['record'] or options['replay']}")
+
+        report = {"config": {k: options[k] for k in (
+            'owners', 'agents', 'tasks', 'models', 'workers', 'executor', 'latency', 'jitter', 'tool_script', 'approve_rate',
+            'ollama_host', 'record', 'replay', 'replay_latency'
+        )}}
+        try:
+            report["runner"] = self._run_runner(ollama_url, options)
+            if mock is not None:
+                report["mock"] = mock.stats()
+            report["llm_usage"] = usage_service.summarize(self._bench_calls())
+            if options['web_requests'] > 0:
+                report["web"] = self._run_web(users[0], options['web_requests'])
+        finally:
+            if mock is not None:
+                mock.stop()
+            if not options['keep']:
+                self._cleanup()
+
+        self._print_report(report)
+        if baseline is not None:
+            self._print_comparison(baseline, report)
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2, default=str)
+            self.stdout.write(f"📝 Report saved to {options['report']}")
+
+    # --- 합성 회사 ---
+
+    def _create_company(self, owners, agents, tasks, models):
+        """사용자마다 대표(lead) 1명 -> 부서장(TEAM_SIZE명당 1명) -> 팀원 조직과 팀원에게 배정된 태스크를 만듭니다."""
+        model_names = [m.strip() for m in models.split(",") if m.strip()]
+        users = User.objects.bulk_create([User(username=f"{BENCH_PREFIX}{i}") for i in range(owners)])
+
+        def bench_id(name):
+            return uuid.uuid5(BENCH_NAMESPACE, name)
+
+        members = []
+        count = 0
+        for index, user in enumerate(users):
+            size = agents // owners + (1 if index < agents % owners else 0)
+            managers = max(1, (size - 1) // (TEAM_SIZE + 1))
+
+            def agent(name, role, manager, depth):
+                nonlocal count
+                model = model_names[count % len(model_names)] if model_names else None
+                count += 1
+                return Agent(
+                    id=bench_id(f"agent:{name}"), owner=user, name=name, role=role, manager=manager, depth=depth,
+                    ollama_model_name=model
+                )
+
+            lead = Agent.objects.bulk_create([agent(f"Bench CEO {index}", "Chief Executive", None, 0)])[0]
+            heads = Agent.objects.bulk_create([
+                agent(f"Bench Head {index}-{m}", "Department Head", lead, 1) for m in range(managers)
+            ])
+            members += Agent.objects.bulk_create([
+                agent(f"Bench Member {index}-{n}", "Analyst", heads[n % managers], 2) for n in range(size - 1 - managers)
+            ])
+
+        priorities = [p for p, _ in Task.TaskPriority.choices]
+        batch = []
+        for n in range(tasks):
+            member = members[n % len(members)]
+            batch.append(Task(
+                id=bench_id(f"task:{n}"),
+                title=f"Bench task {n}",
+                description="Analyze last quarter's numbers with the available tools and write a short report.",
+                status=Task.TaskStatus.THINKING,
+                priority=priorities[n % len(priorities)],
+                assignee=member,
+                creator_id=member.manager_id,
+            ))
+        Task.objects.bulk_create(batch, batch_size=1000)
+        return users
+
+    def _bench_tasks(self):
+        return Task.objects.filter(assignee__owner__username__startswith=BENCH_PREFIX)
+
+    def _bench_calls(self):
+        return LLMCall.objects.filter(owner__username__startswith=BENCH_PREFIX)
+
+    def _cleanup(self):
+        task_ids = [str(t) for t in self._bench_tasks().values_list('id', flat=True)]
+        for start in range(0, len(task_ids), 1000):
+            chunk = task_ids[start:start + 1000]
+            WorkflowCheckpointWrite.objects.filter(thread_id__in=chunk).delete()
+            WorkflowCheckpoint.objects.filter(thread_id__in=chunk).delete()
+        # (LLMCall은 외래 키 제약이 없어 사용자와 함께 지워지지 않음)
+        self._bench_calls().delete()
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+    # --- 러너 ---
+
+    def _run_runner(self, ollama_url, options):
+        """run_agents를 별도 프로세스로 실행하고, 태스크 진행 상황을 주기적으로 확인합니다."""
+        stats_file = tempfile.NamedTemporaryFile(prefix='runner-stats-', suffix='.json', delete=False).name
+        log_file = tempfile.NamedTemporaryFile(prefix='runner-', suffix='.log', delete=False).name
+        env = {**os.environ, "OLLAMA_HOST": ollama_url, "PYTHONUNBUFFERED": "1"}
+        env.pop("OLLAMA_HOSTS", None)
+        env["LLM_TRANSCRIPT_MODE"] = "record" if options['record'] else "replay" if options['replay'] else "off"
+        if options['record'] or options['replay']:
+            env["LLM_TRANSCRIPT_DIR"] = os.path.abspath(options['record'] or options['replay'])
+            env["LLM_TRANSCRIPT_REPLAY_LATENCY"] = str(options['replay_latency'])
+        command = [
+            sys.executable, "-m", "django", "run_agents",
+            "--workers", str(options['workers']), "--executor", options['executor'],
+            "--runner-id", f"benchmark-{os.getpid()}", "--poll-interval", "1",
+            "--exit-when-idle", str(options['idle_exit']), "--stats-file", stats_file, "--no-archiver",
+        ]
+        total = self._bench_tasks().count()
+        started = time.monotonic()
+        done_at = None
+        with open(log_file, 'w') as log:
+            process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+            try:
+                while process.poll() is None:
+                    time.sleep(1)
+                    done = self._bench_tasks().filter(status=Task.TaskStatus.DONE).count()
+                    elapsed = time.monotonic() - started
+                    if done == total and done_at is None:
+                        done_at = elapsed
+                    self.stdout.write(f"   {elapsed:6.1f}s  {done}/{total} task(s) done")
+                    if elapsed > options['timeout']:
+                        self.stdout.write(self.style.WARNING(f"⏱ Timeout after {options['timeout']:.0f}s. Stopping the runner..."))
+                        process.send_signal(signal.SIGINT)
+                        process.wait(timeout=60)
+            except BaseException:
+                process.kill()
+                raise
+
+        if process.returncode and not os.path.getsize(stats_file):
+            raise CommandError(f"run_agents exited with code {process.returncode}. See {log_file}")
+        with open(stats_file) as f:
+            runner = json.load(f) if os.path.getsize(stats_file) else {}
+        os.unlink(stats_file)
+
+        done = self._bench_tasks().filter(status=Task.TaskStatus.DONE).count()
+        wall = done_at or (time.monotonic() - started)
+        runs = runner.get("runs", {}).get("finished", 0)
+        return {
+            **runner,
+            "tasks_total": total,
+            "tasks_done": done,
+            "wall_seconds": wall,
+            "tasks_per_sec": done / wall if wall else 0.0,
+            "queries_per_run": runner.get("db", {}).get("queries", 0) / runs if runs else 0.0,
+            "log_file": log_file,
+        }
+
+    # --- 웹 ---
+
+    def _run_web(self, user, requests):
+        """합성 회사 사용자로 로그인해 주요 화면의 응답 시간과 요청당 쿼리 수를 잽니다 (같은 프로세스에서 실행)."""
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        agent = Agent.objects.filter(owner=user, manager__isnull=True).first()
+        pages = {
+            "dashboard": reverse('corp:dashboard'),
+            "monitor": reverse('corp:monitor'),
+            "wiki_list": reverse('corp:wiki_list'),
+            "agent_detail": reverse('corp:agent_detail', args=[agent.pk]),
+            "usage": reverse('corp:usage'),
+        }
+        results = {}
+        for name, url in pages.items():
+            timings = []
+            queries = 0
+            status = None
+            for _ in range(requests):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append(time.perf_counter() - started)
+                queries += len(captured.captured_queries)
+                status = response.status_code
+            timings.sort()
+            results[name] = {
+                "status": status,
+                "avg_ms": sum(timings) / len(timings) * 1000,
+                "p95_ms": timings[int(0.95 * (len(timings) - 1))] * 1000,
+                "queries_per_request": queries / requests,
+            }
+        return results
+
+    # --- 보고 ---
+
+    def _print_report(self, report):
+        runner = report["runner"]
+        loop = runner.get("loop", {})
+        db_stats = runner.get("db", {})
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {runner['tasks_done']}/{runner['tasks_total']} task(s) done in {runner['wall_seconds']:.1f}s "
+            f"({runner['tasks_per_sec']:.2f} tasks/sec)"
+        ))
+        self.stdout.write(
+            f"Runner: {runner.get('runs', {}).get('finished', 0)} workflow run(s), "
+            f"{runner.get('runs', {}).get('failed', 0)} failed, {runner.get('runs_per_sec', 0):.2f} runs/sec"
+        )
+        self.stdout.write(
+            f"Scheduling loop: {loop.get('iterations', 0)} iteration(s), avg {loop.get('avg', 0) * 1000:.1f}ms / "
+            f"p50 {loop.get('p50', 0) * 1000:.1f}ms / p95 {loop.get('p95', 0) * 1000:.1f}ms / max {loop.get('max', 0) * 1000:.1f}ms"
+        )
+        self.stdout.write(
+            f"DB: {db_stats.get('queries', 0)} queries ({db_stats.get('seconds', 0):.2f}s), "
+            f"{runner['queries_per_run']:.1f} per workflow run"
+        )
+        transcript = runner.get("transcripts", {})
+        if transcript.get("mode", "off") != "off":
+            self.stdout.write(
+                f"Transcripts ({transcript['mode']}): {transcript.get('llm_calls', 0)} LLM call(s), "
+                f"{transcript.get('llm_missing', 0)} missing, {transcript.get('prompt_tokens', 0)} prompt / "
+                f"{transcript.get('output_tokens', 0)} output token(s), {transcript.get('tools_replayed', 0)} tool result(s) replayed"
+            )
+        usage = report.get("llm_usage")
+        if usage and usage["calls"]:
+            self.stdout.write(
+                f"LLM usage: {usage['calls']} call(s) recorded, {usage['gpu_seconds']:.1f}s GPU, "
+                f"{usage['prompt_tokens']} prompt / {usage['output_tokens']} output token(s), "
+                f"{usage['cache_hits']} cache hit(s)"
+            )
+        mock = report.get("mock")
+        if mock:
+            self.stdout.write(
+                f"Mock Ollama: {sum(mock['requests'].values())} request(s) "
+                f"({', '.join(f'{path} {count}' for path, count in sorted(mock['requests'].items()))}), "
+                f"{mock['tool_calls']} tool call(s)"
+            )
+        for name, stat in report.get("web", {}).items():
+            self.stdout.write(
+                f"Web [{name}]: HTTP {stat['status']}, avg {stat['avg_ms']:.1f}ms / p95 {stat['p95_ms']:.1f}ms, "
+                f"{stat['queries_per_request']:.1f} queries/request"
+            )
+        self.stdout.write(f"Runner log: {runner['log_file']}")
+
+    def _print_comparison(self, baseline, report):
+        """이전 보고서(--compare)와 지표별 차이를 출력합니다."""
+        def lookup(data, path):
+            for key in path:
+                if not isinstance(data, dict) or key not in data:
+                    return None
+                data = data[key]
+            return data
+
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS("📊 Compared with the previous report:"))
+        for path, name, lower_is_better in COMPARE_METRICS:
+            old, new = lookup(baseline, path), lookup(report, path)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old:+.1%}" if old else "n/a"
+            line = f"   {name:<14} {old:>12.2f} -> {new:>12.2f}  ({change})"
+            if old != new and (new < old) == lower_is_better:
+                self.stdout.write(self.style.SUCCESS(line))
+            elif old != new:
+                self.stdout.write(self.style.WARNING(line))
+            else:
+                self.stdout.write(line)
+        if baseline.get("config") and baseline["config"].get("tasks") != report["config"].get("tasks"):
+            self.stdout.write(self.style.WARNING("⚠️ The reports were made with different --tasks. Compare with care."))
@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from corp.models import CorporateMemory
+from corp.services import kms_service
+
+
+class Command(BaseCommand):
+    help = '위키 문서를 구간(Passage)으로 나눠 구간별 임베딩을 만듭니다. 기본값은 구간이 없는 문서만 처리합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='이미 구간이 있는 문서도 다시 나눕니다 (구간 크기 설정을 바꾼 경우)')
+        parser.add_argument(
+            '--batch-size', type=int, default=kms_service.EMBEDDING_BATCH_SIZE,
+            help='한 번에 처리할 문서 수'
+        )
+
+    def handle(self, *args, **options):
+        memories = CorporateMemory.objects.defer('embedding', 'search_vector')
+        if not options['all']:
+            memories = memories.filter(passages__isnull=True)
+
+        batch_size = max(1, options['batch_size'])
+        started = time.monotonic()
+        documents = passages = 0
+        # 처리한 문서는 passages__isnull 조건에서 빠지므로 pk 기준으로 이어서 조회
+        last_pk = None
+        while True:
+            page = memories.order_by('pk')
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+            batch = list(page[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            passages += kms_service.save_passages(batch, batch_size=batch_size)
+            documents += len(batch)
+            self.stdout.write(f"📚 {documents} documents -> {passages} passages")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"✅ Built {passages} passages for {documents} documents in {elapsed:.1f}s."))
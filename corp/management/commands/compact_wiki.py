@@ -0,0 +1,112 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from corp.models import CorporateMemory
+from corp.services import kms_service
+
+
+class Command(BaseCommand):
+    help = '위키의 중복 / 거의 같은 문서를 사용자별로 하나로 합칩니다 (가장 오래된 문서 ID에 최신 내용을 남기고 버전을 합산).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', help='이 사용자(username)의 위키만 정리합니다. 생략하면 전체 사용자')
+        parser.add_argument(
+            '--threshold', type=float, default=kms_service.WIKI_DEDUP_THRESHOLD,
+            help='거의 같은 문서로 볼 코사인 유사도 (0이면 본문 해시가 같은 문서만 합침)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='합칠 문서만 출력하고 변경하지 않습니다.')
+
+    def handle(self, *args, **options):
+        owners = User.objects.filter(memories__isnull=False).distinct()
+        if options['owner']:
+            owners = owners.filter(username=options['owner'])
+            if not owners.exists():
+                raise CommandError(f"User '{options['owner']}' has no wiki documents.")
+
+        started = time.monotonic()
+        merged = 0
+        for owner in owners:
+            # 합쳐진(dry-run이면 합쳐질) 문서 ID. 유사도 단계에서 다시 후보로 잡히지 않게 함
+            removed = set()
+            merged += self._compact_exact(owner, removed, options['dry_run'])
+            if options['threshold'] > 0:
+                merged += self._compact_similar(owner, options['threshold'], removed, options['dry_run'])
+
+        elapsed = time.monotonic() - started
+        verb = "Would merge" if options['dry_run'] else "Merged"
+        self.stdout.write(self.style.SUCCESS(f"✅ {verb} {merged} duplicate document(s) in {elapsed:.1f}s."))
+
+    def _compact_exact(self, owner, removed, dry_run):
+        """본문 해시가 같은 문서 묶음을 합칩니다."""
+        hashes = (
+            CorporateMemory.objects.filter(owner=owner).exclude(content_hash='')
+            .values('content_hash').annotate(n=Count('id')).filter(n__gt=1)
+            .values_list('content_hash', flat=True)
+        )
+        merged = 0
+        for hash_ in hashes:
+            group = list(CorporateMemory.objects.filter(owner=owner, content_hash=hash_).order_by('created_at'))
+            count = self._merge(owner, group, "same content", dry_run)
+            if count:
+                merged += count
+                removed.update(m.pk for m in group[1:])
+        return merged
+
+    def _compact_similar(self, owner, threshold, removed, dry_run):
+        """오래된 문서부터 코사인 유사도가 threshold 이상인 문서를 찾아 합칩니다."""
+        merged = 0
+        ids = list(CorporateMemory.objects.filter(owner=owner).order_by('created_at').values_list('id', flat=True))
+        for memory_id in ids:
+            if memory_id in removed:
+                continue
+            memory = CorporateMemory.objects.filter(pk=memory_id).first()
+            if memory is None:
+                continue
+
+            group = [memory]
+            while True:
+                similar = kms_service.find_near_duplicate(
+                    owner.id, memory.embedding, threshold, exclude=removed | {m.pk for m in group}
+                )
+                if similar is None:
+                    break
+                group.append(CorporateMemory.objects.get(pk=similar.pk))
+
+            if len(group) > 1:
+                group.sort(key=lambda m: m.created_at)
+                count = self._merge(owner, group, f"similarity >= {threshold}", dry_run)
+                if count:
+                    # [변경] 합친 경우에만 후보에서 뺌 (합치지 못한 문서는 다음 묶음에서 다시 시도)
+                    merged += count
+                    removed.update(m.pk for m in group[1:])
+        return merged
+
+    def _merge(self, owner, group, reason, dry_run):
+        """
+        group[0](가장 오래된 문서)에 가장 최근 문서의 내용을 남기고(제목은 group[0]의 것을 유지) 나머지를 지웁니다.
+        Returns: 합친(dry-run이면 합칠) 문서 수. 임베딩에 실패해 합치지 못했으면 0
+        """
+        survivor, duplicates = group[0], group[1:]
+        latest = max(group, key=lambda m: m.created_at)
+        self.stdout.write(
+            f"🧹 [{owner.username}] '{survivor.subject}' <- {len(duplicates)} duplicate(s) ({reason})"
+        )
+        if dry_run:
+            return len(duplicates)
+
+        # [변경] 남길 문서의 제목은 유지하므로, 제목이 다르면 그 제목으로 임베딩을 새로 만듦
+        vector = latest.embedding if latest.subject == survivor.subject else kms_service.get_embedding(f"{survivor.subject}\n{latest.content}")
+        if vector is None or len(vector) == 0:
+            self.stdout.write(self.style.WARNING(f"⚠️ Failed to embed '{survivor.subject}'. Skipping merge."))
+            return 0
+
+        with transaction.atomic():
+            # 같은 본문의 문서는 하나만 둘 수 있으므로 중복 문서를 먼저 지운 뒤 남길 문서를 갱신
+            CorporateMemory.objects.filter(pk__in=[m.pk for m in duplicates]).delete()
+            kms_service.merge_knowledge(
+                survivor, latest.content, vector,
+                source_task=latest.source_task, versions=sum(m.version for m in duplicates),
+            )
+        return len(duplicates)
@@ -0,0 +1,108 @@
+import json
+import time
+from pathlib import Path
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from corp.services import kms_service
+
+
+def iter_jsonl(path):
+    """JSONL 한 줄 = 문서 하나. subject/content (또는 title/text) 키를 사용합니다."""
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"⚠️ [Ingest] {path}:{line_no} is not valid JSON ({e}). Skipped.")
+                continue
+            subject = record.get('subject') or record.get('title')
+            content = record.get('content') or record.get('text')
+            if not subject or not content:
+                print(f"⚠️ [Ingest] {path}:{line_no} has no subject/content. Skipped.")
+                continue
+            yield {'subject': str(subject), 'content': str(content)}
+
+
+def iter_markdown(path):
+    """Markdown 파일 하나 = 문서 하나. 첫 번째 '# 제목'을 subject로, 없으면 파일명을 사용합니다."""
+    text = Path(path).read_text(encoding='utf-8').strip()
+    if not text:
+        return
+    subject = Path(path).stem
+    lines = text.splitlines()
+    if lines[0].startswith('# '):
+        subject = lines[0][2:].strip()
+        text = "\n".join(lines[1:]).strip()
+    if text:
+        yield {'subject': subject, 'content': text}
+
+
+READERS = {
+    '.jsonl': iter_jsonl,
+    '.md': iter_markdown,
+    '.markdown': iter_markdown,
+}
+
+
+def iter_files(paths):
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            for child in sorted(path.rglob('*')):
+                if child.is_file() and child.suffix.lower() in READERS:
+                    yield child
+        elif path.is_file():
+            yield path
+        else:
+            raise CommandError(f"Path not found: {raw}")
+
+
+class Command(BaseCommand):
+    help = 'JSONL / Markdown 문서를 배치 임베딩하여 회사 위키(CorporateMemory)에 대량으로 저장합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='JSONL / Markdown 파일 또는 디렉터리 (하위 폴더 포함)')
+        parser.add_argument('--owner', required=True, help='위키 문서를 소유할 사용자 이름(username)')
+        parser.add_argument(
+            '--batch-size', type=int, default=kms_service.EMBEDDING_BATCH_SIZE,
+            help='임베딩 요청 / bulk_create 한 번에 처리할 문서 수'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['owner']}' does not exist.")
+
+        batch_size = max(1, options['batch_size'])
+        started = time.monotonic()
+        read = saved = 0
+        batch = []
+
+        def flush():
+            nonlocal saved
+            saved += kms_service.add_knowledge_bulk(owner, batch, batch_size=batch_size)
+            batch.clear()
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"📚 {saved}/{read} documents saved ({saved / elapsed:.1f} docs/s)")
+
+        # 파일 전체를 메모리에 올리지 않고 batch_size 단위로 흘려보내며 저장
+        for path in iter_files(options['paths']):
+            reader = READERS.get(path.suffix.lower())
+            if reader is None:
+                self.stdout.write(self.style.WARNING(f"⚠️ Unsupported file type: {path}"))
+                continue
+            for doc in reader(path):
+                batch.append(doc)
+                read += 1
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+
+        elapsed = time.monotonic() - started
+        style = self.style.SUCCESS if saved == read else self.style.WARNING
+        self.stdout.write(style(f"✅ Ingested {saved} of {read} documents in {elapsed:.1f}s."))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from ai_core.mock_ollama import MockOllama, DEFAULT_MODELS, parse_tool_script
+
+
+class Command(BaseCommand):
+    help = 'GPU 없이 러너 / 웹 처리량을 측정하기 위한 가짜 Ollama 서버를 띄웁니다 (OLLAMA_HOST를 이 주소로 지정).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='바인드할 주소')
+        parser.add_argument('--port', type=int, default=11435, help='바인드할 포트')
+        parser.add_argument('--latency', type=float, default=0.2, help='생성 요청(/api/chat, /api/generate)마다의 지연(초)')
+        parser.add_argument('--jitter', type=float, default=0.0, help='생성 지연에 더할 무작위 지연의 최댓값(초)')
+        parser.add_argument('--embed-latency', type=float, default=0.01, help='임베딩 요청마다의 지연(초)')
+        parser.add_argument(
+            '--tool-script', default='calculator_tool={"expression": "6 * 7"}',
+            help='에이전트 대화에서 차례로 호출할 도구. 예: \'search_wiki_tool,calculator_tool={"expression": "1+1"}\' '
+                 '(인자를 생략하면 도구 명세로 기본값을 만듦, 빈 문자열이면 도구 없이 바로 최종 답변)'
+        )
+        parser.add_argument('--approve-rate', type=float, default=1.0, help='결재 요청을 승인할 확률 (0~1)')
+        parser.add_argument('--models', default=",".join(DEFAULT_MODELS), help='/api/tags에 보일 모델 목록 (쉼표 구분)')
+        parser.add_argument('--strict', action='store_true', help='목록에 없는 모델 요청에 404로 응답합니다.')
+        parser.add_argument('--seed', type=int, default=None, help='결재 결정 / 지연의 난수 시드')
+
+    def handle(self, *args, **options):
+        try:
+            tool_script = parse_tool_script(options['tool_script'])
+        except ValueError as e:
+            raise CommandError(f"Invalid --tool-script: {e}")
+        try:
+            mock = MockOllama(
+                host=options['host'], port=options['port'],
+                latency=options['latency'], jitter=options['jitter'], embed_latency=options['embed_latency'],
+                tool_script=tool_script, approve_rate=options['approve_rate'],
+                models=[m.strip() for m in options['models'].split(",") if m.strip()],
+                strict=options['strict'], seed=options['seed'],
+            )
+        except OSError as e:
+            raise CommandError(f"Cannot bind {options['host']}:{options['port']}: {e}")
+
+        script = ", ".join(name for name, _ in tool_script) or "none"
+        self.stdout.write(self.style.SUCCESS(
+            f"🧪 Mock Ollama listening on {mock.url} (latency {options['latency']}s, tool script: {script})"
+        ))
+        try:
+            mock.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            mock.server.server_close()
+            stats = mock.stats()
+            per_endpoint = ", ".join(f"{path} {count}" for path, count in sorted(stats['requests'].items())) or "none"
+            self.stdout.write(f"Mock Ollama: {per_endpoint} request(s), {stats['tool_calls']} tool call(s)")
@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from corp.models import AgentMemory, CorporateMemory, WikiPassage
+from corp.vector_search import HNSW_OPCLASS, VECTOR_DISTANCE
+
+
+class Command(BaseCommand):
+    help = (
+        '임베딩 HNSW 인덱스를 VECTOR_DISTANCE의 연산자 클래스로 다시 만듭니다 (CONCURRENTLY, 테이블 잠금 없음). '
+        '마이그레이션은 항상 cosine 인덱스를 만들므로 l2로 배포하거나 거리를 바꾼 경우 migrate 뒤에 실행합니다.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='이미 같은 연산자 클래스인 인덱스도 다시 만듭니다.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING("⚠️ HNSW indexes require PostgreSQL + pgvector. Nothing to do."))
+            return
+
+        for model in (AgentMemory, CorporateMemory, WikiPassage):
+            index = next(i for i in model._meta.indexes if i.name.endswith('_emb_hnsw'))
+            table = model._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT indexdef FROM pg_indexes WHERE indexname = %s", [index.name])
+                row = cursor.fetchone()
+            if row and HNSW_OPCLASS in row[0] and not options['force']:
+                self.stdout.write(f"✔️ {index.name} already uses {HNSW_OPCLASS}")
+                continue
+
+            started = time.monotonic()
+            # CONCURRENTLY는 트랜잭션 안에서 실행할 수 없으므로 autocommit 상태에서 문장 단위로 실행
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+                cursor.execute(
+                    f'CREATE INDEX CONCURRENTLY "{index.name}" ON "{table}" '
+                    f'USING hnsw ("embedding" {HNSW_OPCLASS}) WITH (m = %s, ef_construction = %s)'
+                    % (index.m, index.ef_construction)
+                )
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"🔁 {index.name} ({HNSW_OPCLASS}) rebuilt in {elapsed:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Vector indexes now match VECTOR_DISTANCE={VECTOR_DISTANCE}."))
@@ -1,6 +1,7 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from corp.models import Task, Agent, TaskLog
-from ai_core.workflow import create_agent_workflow, create_review_workflow, AgentState, ReviewState
+from ai_core.workflow import get_agent_workflow, agent_workflow_cache, create_review_workflow, AgentState, ReviewState, GLOBAL_MODEL_NAME, agent_model_name, agent_num_ctx
+from ai_core.llm_gateway import llm_limiter, ollama_pool, get_circuit_breaker, is_unavailable_error, aclose_async_clients, llm_call_context
 from ai_core.tools.web_search import search_web
 from ai_core.tools.org_tools import create_plan
 from ai_core.tools.kms_tools import search_wiki_tool
@@ -9,9 +10,30 @@ from ai_core.tools.web_search import search_web, fetch_web_content_tool
 from ai_core.tools.comm_tools import post_to_channel_tool, read_channel_tool, ask_manager_tool, reply_to_subordinate_tool
 from ai_core.tools.registry import TIER_0_TOOLS, get_authorized_tools
 from ai_core.tools.system_tools import request_tool_access
-from corp.services import agent_service, kms_service
+from ai_core.model_residency import ResidencyManager, PreflightError, preflight, CHAT, EMBEDDING
+from corp.services import agent_service, archive_service, kms_service, task_service
+from corp.task_events import TaskEventListener, notify_task_changed
+from corp.scheduler import FairScheduler, ModelBatcher, fetch_candidates
+from corp.checkpointer import task_thread_config
+from corp.embedding_cache import embedding_cache
+from corp.llm_cache import llm_cache
+from corp.llm_accounting import llm_accounting
+from corp.db_metrics import QueryCounter
+from ai_core.transcripts import transcripts
+import os
+import json
 import time
+import argparse
+import asyncio
+import threading
+import multiprocessing
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait as wait_futures
 from datetime import datetime
+import django
+from asgiref.sync import sync_to_async
+from django import db
+from django.db import transaction
 from django.utils import timezone
 from langgraph.errors import GraphRecursionError
 from langchain_core.tools import tool
@@ -67,254 +89,876 @@ BASE_TOOLS = [
     reply_to_subordinate_tool
 ]
 
+# 에이전트에게 항상 지급되는 기본 소양 도구 (System Tool 포함)
+BASE_INHERENT_TOOLS = TIER_0_TOOLS + [request_tool_access]
+
+# Review Workflow는 공통이므로 프로세스(워커)당 한 번만 생성
+_review_workflow = None
+
+def get_review_workflow():
+    global _review_workflow
+    if _review_workflow is None:
+        _review_workflow = create_review_workflow()
+    return _review_workflow
+
+def build_agent_tools(agent):
+    """에이전트의 권한(allowed_tools, 고용/해고 권한)에 맞는 도구 목록을 구성합니다."""
+    current_agent_tools = BASE_INHERENT_TOOLS.copy()
+
+    authorized_tools = get_authorized_tools(agent.allowed_tools)
+    current_agent_tools.extend(authorized_tools)
+
+    if agent.can_hire:
+        current_agent_tools.append(create_sub_agent_tool)
+    if agent.can_fire:
+        current_agent_tools.append(fire_sub_agent_tool)
+    return current_agent_tools
+
+# ==============================================================================
+# 2. 워커(Worker) 함수
+# ==============================================================================
+# 워커 풀(Thread/Process)에서 실행되므로 모델 인스턴스가 아닌 ID를 받고,
+# 출력은 (스타일, 메시지) 목록으로 반환하여 메인 루프에서 한 번에 기록합니다.
+# (스타일: 'SUCCESS' | 'WARNING' | 'ERROR' | None)
+# 반환값: (logs, failed) - failed이면 러너가 해당 태스크를 ERROR_RETRY_DELAY 동안 쉬게 함
+# 워커는 러너가 점유(lease)한 태스크만 처리하며, 실행 중에는 하트비트로 점유를 연장하고
+# 결과는 점유가 유지된 경우에만 저장합니다 (다른 러너가 회수했다면 버림).
+
+# 에러가 난 태스크를 다시 시도하기까지 대기 시간(초)
+ERROR_RETRY_DELAY = 5
+
+def _error_log(prefix, e):
+    # Ollama 장애는 태스크 자체의 오류가 아니므로 짧은 경고로만 남김 (러너는 회로가 닫힐 때까지 배정을 멈춤)
+    if is_unavailable_error(e):
+        return ('WARNING', f"⏸ LLM unavailable, will retry later: {e}")
+    return (None, f"{prefix}: {e}")
+
+def _call_context(task, agent):
+    # [추가] 이 실행에서 나가는 LLM 호출(도구 안의 요약 / 임베딩 포함)을 태스크 / 에이전트 / 사용자별로 집계 (corp.llm_accounting)
+    return llm_call_context(task_id=task.id, agent_id=agent.id, owner_id=agent.owner_id)
+
+def _release_after_error(task_id, lease_owner):
+    # 에러 시 일단 유지 (잠시 점유를 유지하여 어떤 러너도 곧바로 재시도하지 않게 함)
+    try:
+        task_service.release_lease(task_id, lease_owner, retry_after=ERROR_RETRY_DELAY)
+    except Exception:
+        pass
+
+def _prepare_agent_run(task_id, logs):
+    """
+    태스크를 읽어 (task, 워크플로, 실행 입력, 실행 설정)을 구성합니다.
+    체크포인트가 있으면 이전 대화(LLM 응답/도구 결과)를 이어서 사용하고,
+    같은 상태에서 중단된 실행이면 입력 없이(None) 마지막으로 완료된 노드부터 재개합니다.
+    """
+    task = Task.objects.select_related('assignee').get(id=task_id)
+
+    current_agent_tools = build_agent_tools(task.assignee)
+    # [변경] 같은 모델 + 툴셋이면 컴파일된 그래프를 재사용 (모델은 에이전트별 설정을 따름)
+    agent_workflow = get_agent_workflow(current_agent_tools, agent_model_name(task.assignee), agent_num_ctx(task.assignee))
+
+    prev_result = task.result if task.result else ""
+
+    # 에이전트 정보 조회
+    agent = task.assignee
+    subordinates = list(agent.subordinates.filter(is_active=True).values('id', 'name', 'role'))
+
+    # 히스토리 컨텍스트 생성
+    task_logs = task.logs.all().order_by('created_at')
+    history_context = ""
+    if task_logs.exists():
+        history_context = "\n[⚠️ HISTORY OF PAST FAILURES]\n"
+        history_context += "You have attempted this task before but were REJECTED. Review the feedback carefully:\n"
+
+        for i, log in enumerate(task_logs, 1):
+            short_result = log.result[:200] + "..." if len(log.result) > 200 else log.result
+            history_context += f"\n--- Attempt #{i} ---\n"
+            history_context += f"My Output: {short_result}\n"
+            history_context += f"Manager Feedback: {log.feedback}\n"
+
+        history_context += "\nIMPORTANT: Do NOT repeat the mistakes from above. Improve your plan based on the feedback.\n"
+
+    initial_state = AgentState(
+        messages=[],
+        task_title=task.title,
+        task_description=task.description,
+        agent_id=task.assignee.id,
+        agent_name=task.assignee.name,
+        task_status=task.status,
+        prev_result=prev_result,
+        task_id=task.id,
+        subordinates=subordinates,
+        history_context=history_context
+    )
+
+    config = task_thread_config(task.id)
+    # 도구(search_wiki_tool 등)가 검색 범위를 태스크 소유자로 좁힐 수 있도록 전달
+    config["configurable"].update(owner_id=task.assignee.owner_id, agent_id=task.assignee_id)
+    run_input = initial_state
+    if agent_workflow.checkpointer is not None:
+        snapshot = agent_workflow.get_state(config)
+        if snapshot.next:
+            if snapshot.values.get("task_status") == task.status:
+                logs.append(('WARNING', f"↻ Resuming '{task.title}' from checkpoint (next: {', '.join(snapshot.next)})."))
+                run_input = None
+            else:
+                # 중단 이후 태스크 상태가 바뀌었으면 남은 단계는 의미가 없으므로 새로 시작
+                agent_workflow.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    return task, agent_workflow, run_input, config
+
+def _finish_agent_run(task, agent_workflow, lease_owner, final_response, logs):
+    """워크플로 결과를 반영하여 태스크 상태를 결정하고 저장합니다."""
+    # 워크플로 실행 중 도구(assign_task, ask_manager 등)가 상태를 바꿨을 수 있으므로 최신 상태를 다시 읽음
+    task.refresh_from_db()
+
+    task.result = final_response
+
+    archive = False
+    if task.status == Task.TaskStatus.APPROVED:
+        # [변경] 집행이 끝나면 바로 DONE. 성공한 태스크 지식 자산화(Auto-Archiving)는 아카이브 작업 큐에 맡김
+        # (임베딩/모델 Pull이 실패해도 워크플로(LLM)를 다시 돌리지 않고 아카이브 워커가 백오프하며 재시도)
+        task.status = Task.TaskStatus.DONE
+        archive = True
+        logs.append(('SUCCESS', f"✅ Task '{task.title}' COMPLETED."))
+
+    elif task.status == Task.TaskStatus.WAIT_SUBTASK:
+        # [핵심 수정] 도구(assign_task)가 이미 상태를 바꿨음 -> 건드리지 않고 대기
+        logs.append(('WARNING', f"⏳ Task '{task.title}' delegated. Waiting for sub-tasks..."))
+
+    elif task.status == Task.TaskStatus.THINKING:
+        # [수정] 여기가 핵심입니다!
+        # 매니저가 부하직원 지원(Help Subordinate) 업무를 성공적으로 수행했다면,
+        # '결재 대기'로 보내지 않고 즉시 '완료(DONE)' 처리합니다.
+        if "Help Subordinate" in task.title and "Success:" in str(task.result):
+            task.status = Task.TaskStatus.DONE
+            logs.append(('SUCCESS', f"✅ Manager replied to subordinate automatically. (Task DONE)"))
+        else:
+            # 그 외 일반적인 기획/보고 업무는 기존대로 결재 요청(WAIT_APPROVAL) 상태로 변경
+            task.status = Task.TaskStatus.WAIT_APPROVAL
+            logs.append(('SUCCESS', f"📝 Task '{task.title}' sent for CEO/Manager APPROVAL."))
+
+    # [병렬 실행] 다른 워커/사람이 바꾼 필드를 덮어쓰지 않도록 이 워커가 결정한 필드만 저장 (+ lease 반납)
+    # 위키 저장 작업은 상태 저장과 같은 트랜잭션으로 등록하여, 결과가 버려지면 작업도 남지 않게 함
+    with transaction.atomic():
+        saved = task_service.save_leased_task(task, lease_owner, ['result', 'status'])
+        if saved and archive:
+            archive_service.enqueue_task_result(task)
+            logs.append(('SUCCESS', f"   ↳ 💾 Queued for Corporate Wiki."))
+
+    if saved:
+        if task.status == Task.TaskStatus.DONE and agent_workflow.checkpointer is not None:
+            # 완료된 태스크의 체크포인트는 더 이상 재개할 일이 없으므로 정리
+            agent_workflow.checkpointer.delete_thread(str(task.id))
+        notify_task_changed(task)
+    else:
+        logs.append(('WARNING', f"⚠️ Lease on '{task.title}' expired before saving. Result discarded."))
+
+def run_agent_task(task_id, lease_owner, lease_seconds=task_service.LEASE_SECONDS):
+    """[Case A] 태스크 하나에 대해 에이전트 워크플로를 실행하고 결과를 저장합니다."""
+    logs = []
+    failed = False
+    db.close_old_connections()
+    try:
+        task, agent_workflow, run_input, config = _prepare_agent_run(task_id, logs)
+
+        with _call_context(task, task.assignee), task_service.LeaseHeartbeat(task.id, lease_owner, lease_seconds) as lease:
+            final_state = agent_workflow.invoke(run_input, config)
+
+        if lease.lost:
+            logs.append(('WARNING', f"⚠️ Lease on '{task.title}' was lost during execution. Result discarded."))
+            return logs, failed
+
+        _finish_agent_run(task, agent_workflow, lease_owner, final_state["messages"][-1].content, logs)
+
+    except Exception as e:
+        logs.append(_error_log("Error in execution", e))
+        failed = True
+        _release_after_error(task_id, lease_owner)
+    finally:
+        # 워커 스레드/프로세스가 DB 커넥션을 붙잡고 있지 않도록 정리
+        db.connections.close_all()
+
+    return logs, failed
+
+def _prepare_review_run(task_id):
+    task = Task.objects.select_related('assignee', 'assignee__manager').get(id=task_id)
+    manager = task.assignee.manager
+
+    review_state = ReviewState(
+        task_title=task.title,
+        task_description=task.description,
+        proposed_result=task.result,
+        manager_name=manager.name,
+        subordinate_name=task.assignee.name,
+        decision="",
+        feedback="",
+        model_name=agent_model_name(manager),
+        num_ctx=agent_num_ctx(manager),
+        task_id=str(task.id)
+    )
+    return task, review_state
+
+def _finish_review_run(task, lease_owner, final_review, logs):
+    manager = task.assignee.manager
+    decision = final_review["decision"]
+    feedback = final_review["feedback"]
+
+    if decision == "APPROVE":
+        task.status = Task.TaskStatus.APPROVED
+        task.feedback = f"[Manager Approved]: {feedback}"
+    else:
+        task.status = Task.TaskStatus.THINKING # 다시 생각하게 반려
+        task.feedback = f"[Manager Rejected]: {feedback}"
+
+    # 반려 기록(TaskLog)은 상태 저장과 같은 트랜잭션으로 남겨, 재작업하는 러너가 항상 피드백을 보게 함
+    with transaction.atomic():
+        if not task_service.save_leased_task(task, lease_owner, ['status', 'feedback']):
+            logs.append(('WARNING', f"⚠️ Lease on '{task.title}' expired before saving. Decision discarded."))
+            return
+
+        if decision != "APPROVE":
+            TaskLog.objects.create(
+                task=task,
+                result=task.result,  # 부하가 낸 답안
+                feedback=feedback,   # 상사의 꾸지람
+                status='REJECTED'
+            )
+        notify_task_changed(task)
+
+    if decision == "APPROVE":
+        logs.append(('SUCCESS', f"👌 Approved by {manager.name}."))
+    else:
+        logs.append(('WARNING', f"❌ Rejected by {manager.name}."))
+
+def run_review_task(task_id, lease_owner, lease_seconds=task_service.LEASE_SECONDS):
+    """[Case B] 상사(Manager)가 부하의 결재안을 검토합니다."""
+    logs = []
+    failed = False
+    db.close_old_connections()
+    try:
+        task, review_state = _prepare_review_run(task_id)
+
+        # (결재 호출은 검토하는 매니저의 사용량으로 집계)
+        with _call_context(task, task.assignee.manager), task_service.LeaseHeartbeat(task.id, lease_owner, lease_seconds) as lease:
+            final_review = get_review_workflow().invoke(review_state)
+
+        if lease.lost:
+            logs.append(('WARNING', f"⚠️ Lease on '{task.title}' was lost during review. Decision discarded."))
+            return logs, failed
+
+        _finish_review_run(task, lease_owner, final_review, logs)
+
+    except Exception as e:
+        logs.append(_error_log("Error in review", e))
+        failed = True
+        _release_after_error(task_id, lease_owner)
+    finally:
+        db.connections.close_all()
+
+    return logs, failed
+
+# ------------------------------------------------------------------------------
+# asyncio 워커: 위와 같은 준비/마무리 로직을 쓰되, 워크플로는 ainvoke로 실행합니다.
+# LLM 응답을 기다리는 동안 스레드를 점유하지 않으므로 워커 수를 스레드 수와 무관하게 늘릴 수 있습니다.
+# (Django ORM 호출은 이벤트 루프의 I/O 스레드 풀에서 실행하고, 호출마다 커넥션을 정리)
+# ------------------------------------------------------------------------------
+
+def _in_io_thread(func):
+    def call_and_close(*args):
+        try:
+            return func(*args)
+        finally:
+            db.connections.close_all()
+    return sync_to_async(call_and_close, thread_sensitive=False)
+
+async def arun_agent_task(task_id, lease_owner, lease_seconds=task_service.LEASE_SECONDS):
+    """[Case A] run_agent_task의 asyncio 버전"""
+    logs = []
+    failed = False
+    try:
+        task, agent_workflow, run_input, config = await _in_io_thread(_prepare_agent_run)(task_id, logs)
+
+        with _call_context(task, task.assignee):
+            async with task_service.AsyncLeaseHeartbeat(task.id, lease_owner, lease_seconds) as lease:
+                final_state = await agent_workflow.ainvoke(run_input, config)
+
+        if lease.lost:
+            logs.append(('WARNING', f"⚠️ Lease on '{task.title}' was lost during execution. Result discarded."))
+            return logs, failed
+
+        await _in_io_thread(_finish_agent_run)(task, agent_workflow, lease_owner, final_state["messages"][-1].content, logs)
+
+    except Exception as e:
+        logs.append(_error_log("Error in execution", e))
+        failed = True
+        await _in_io_thread(_release_after_error)(task_id, lease_owner)
+
+    return logs, failed
+
+async def arun_review_task(task_id, lease_owner, lease_seconds=task_service.LEASE_SECONDS):
+    """[Case B] run_review_task의 asyncio 버전"""
+    logs = []
+    failed = False
+    try:
+        task, review_state = await _in_io_thread(_prepare_review_run)(task_id)
+
+        with _call_context(task, task.assignee.manager):
+            async with task_service.AsyncLeaseHeartbeat(task.id, lease_owner, lease_seconds) as lease:
+                final_review = await get_review_workflow().ainvoke(review_state)
+
+        if lease.lost:
+            logs.append(('WARNING', f"⚠️ Lease on '{task.title}' was lost during review. Decision discarded."))
+            return logs, failed
+
+        await _in_io_thread(_finish_review_run)(task, lease_owner, final_review, logs)
+
+    except Exception as e:
+        logs.append(_error_log("Error in review", e))
+        failed = True
+        await _in_io_thread(_release_after_error)(task_id, lease_owner)
+
+    return logs, failed
+
+
+class AsyncioExecutor:
+    """
+    전용 스레드에서 이벤트 루프를 돌리며 워커 코루틴을 실행하는 실행기.
+    submit()이 concurrent.futures.Future를 반환하므로 Thread/ProcessPoolExecutor와 같은 방식으로 메인 루프에서 사용합니다.
+    """
+
+    def __init__(self, io_threads):
+        self.loop = asyncio.new_event_loop()
+        # 동기 도구 / ORM 호출이 실행될 스레드 풀 (LLM 대기와 무관하게 작게 유지)
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix='agent-io'))
+        self._futures = set()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='agent-event-loop', daemon=True)
+        self._thread.start()
+
+    def submit(self, coroutine_fn, *args):
+        future = asyncio.run_coroutine_threadsafe(coroutine_fn(*args), self.loop)
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def shutdown(self, wait=True):
+        if wait:
+            wait_futures(list(self._futures))
+        else:
+            for future in list(self._futures):
+                future.cancel()
+        asyncio.run_coroutine_threadsafe(aclose_async_clients(), self.loop).result()
+        asyncio.run_coroutine_threadsafe(self.loop.shutdown_default_executor(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True)
+        return False
+
+
 class Command(BaseCommand):
     help = 'Runs the AI agents loop.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=int(os.getenv("RUNNER_WORKERS", "1")),
+            help='동시에 실행할 워크플로 수. Ollama 병렬 슬롯(OLLAMA_NUM_PARALLEL) 수에 맞추는 것을 권장합니다.'
+        )
+        parser.add_argument(
+            '--executor', choices=['thread', 'process', 'asyncio'], default=os.getenv("RUNNER_EXECUTOR", "thread"),
+            help='워커 풀 종류 (thread: 기본값, process: GIL을 피해야 할 때, asyncio: 많은 워크플로를 적은 스레드로 동시 실행).'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=float(os.getenv("RUNNER_POLL_INTERVAL", "30")),
+            help='Task 알림(LISTEN/NOTIFY)이 없을 때의 안전용 재조회 주기(초).'
+        )
+        parser.add_argument(
+            '--runner-id', default=os.getenv("RUNNER_ID") or task_service.default_runner_id(),
+            help='태스크 점유(lease)에 기록되는 러너 식별자. 여러 러너를 띄울 때 서로 달라야 합니다.'
+        )
+        parser.add_argument(
+            '--lease-seconds', type=int, default=task_service.LEASE_SECONDS,
+            help='태스크 점유 시간(초). 워크플로 실행 중에는 하트비트로 연장되며, 러너가 죽으면 이 시간 뒤 회수됩니다.'
+        )
+        parser.add_argument(
+            '--preflight', action=argparse.BooleanOptionalAction, default=os.getenv("RUNNER_PREFLIGHT", "1") == "1",
+            help='시작할 때 LLM_MODEL / 에이전트에 지정된 모델 / EMBEDDING_MODEL 이 Ollama에 있는지 확인하고 없으면 미리 내려받습니다.'
+        )
+        parser.add_argument(
+            '--residency', action=argparse.BooleanOptionalAction, default=os.getenv("RUNNER_RESIDENCY", "1") == "1",
+            help='로드된 모델(/api/ps)을 추적하고, 작업이 있을 때 내려가 있는 모델을 미리 예열합니다.'
+        )
+        parser.add_argument(
+            '--archiver', action=argparse.BooleanOptionalAction, default=os.getenv("RUNNER_ARCHIVER", "1") == "1",
+            help='위키 아카이브 작업 큐를 이 러너의 백그라운드 스레드에서 함께 처리합니다. 별도 run_archiver를 띄우면 --no-archiver.'
+        )
+        parser.add_argument(
+            '--exit-when-idle', type=float, default=0,
+            help='실행 중인 작업도 배정할 작업도 없는 상태가 이 시간(초) 이어지면 종료합니다 (0: 계속 실행). 벤치마크 / 일괄 처리용.'
+        )
+        parser.add_argument(
+            '--stats-file', default=os.getenv("RUNNER_STATS_FILE"),
+            help='종료할 때 처리량 / 루프 지연 / DB 쿼리 수를 JSON으로 기록할 파일 경로.'
+        )
+
+    def _write_logs(self, entries):
+        for style, message in entries:
+            if style:
+                self.stdout.write(getattr(self.style, style)(message))
+            else:
+                self.stdout.write(message)
+
+    def _create_executor(self, workers, executor_type):
+        if executor_type == 'asyncio':
+            return AsyncioExecutor(io_threads=min(32, workers + 4))
+        if executor_type == 'process':
+            # fork된 자식이 부모의 DB 소켓을 공유하지 않도록 spawn 사용 (자식에서 django.setup() 수행)
+            db.connections.close_all()
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='agent-worker')
+
+    def _collect_finished(self, in_flight, cooldown):
+        """완료된 워커의 로그를 출력하고 in_flight 목록에서 제거합니다."""
+        for future in [f for f in in_flight if f.done()]:
+            task_id, _ = in_flight.pop(future)
+            try:
+                entries, failed = future.result()
+            except Exception as e:
+                entries, failed = [(None, f"Error in worker: {e}")], True
+            self._write_logs(entries)
+            self.runs['failed' if failed else 'finished'] += 1
+            if failed:
+                cooldown[task_id] = time.monotonic() + ERROR_RETRY_DELAY
+
+    @staticmethod
+    def _has_pending_work(active_statuses):
+        """점유 여부와 관계없이 이 러너가 처리할 수 있는 작업(Case A / B)이 남아 있는지"""
+        return (
+            Task.objects.filter(status__in=active_statuses, assignee__is_active=True).exists() or
+            Task.objects.filter(status=Task.TaskStatus.WAIT_APPROVAL, assignee__manager__isnull=False).exists()
+        )
+
+    def _run_stats(self, started):
+        """처리량 / 스케줄링 루프 지연 / DB 쿼리 수 (--stats-file로 기록)"""
+        elapsed = time.monotonic() - started
+        samples = sorted(self.loop_times)
+
+        def pct(p):
+            return samples[int(p * (len(samples) - 1))] if samples else 0.0
+
+        return {
+            "runner_id": self.runner_id,
+            "elapsed": elapsed,
+            "runs": dict(self.runs),
+            "runs_per_sec": self.runs['finished'] / elapsed if elapsed else 0.0,
+            "loop": {
+                "iterations": self.loop_iterations,
+                "avg": sum(samples) / len(samples) if samples else 0.0,
+                "p50": pct(0.5), "p95": pct(0.95), "max": samples[-1] if samples else 0.0,
+            },
+            "db": self.query_counter.stats(),
+            "llm": {f"{model} / {purpose}": stat['calls'] for (model, purpose), stat in llm_limiter.stats().items()},
+            "transcripts": transcripts.stats(),
+            "accounting": llm_accounting.stats(),
+        }
+
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS("Starting AI Corp Runner (Dynamic Tools Enabled)..."))
-        
-        # [변경] System Tool(요청 도구)은 기본 소양에 포함시킴
-        BASE_INHERENT_TOOLS = TIER_0_TOOLS + [request_tool_access]
+        workers = max(1, options['workers'])
+        executor_type = options['executor']
+        self.stdout.write(self.style.SUCCESS(
+            f"Starting AI Corp Runner (Dynamic Tools Enabled, {workers} {executor_type} worker(s))..."
+        ))
+
+        poll_interval = options['poll_interval']
+        self.runner_id = options['runner_id']
+        self.lease_seconds = options['lease_seconds']
+        self.scheduler = FairScheduler()
+        self.batcher = ModelBatcher()
+        # [추가] 처리량 / 루프 지연 / DB 쿼리 수 (종료 시 출력, --stats-file이면 JSON으로도 기록)
+        self.runs = defaultdict(int)
+        self.loop_times = deque(maxlen=10000)
+        self.loop_iterations = 0
+        self.query_counter = QueryCounter().install()
+        started = time.monotonic()
+        # [추가] LLM_TRANSCRIPT_MODE=record / replay: LLM 응답과 도구 결과를 태스크별로 기록하거나 기록으로 재생
+        if transcripts.enabled:
+            self.stdout.write(f"📼 LLM transcripts: {transcripts.mode} ({transcripts.directory})")
+        if executor_type == 'asyncio':
+            self.agent_worker, self.review_worker = arun_agent_task, arun_review_task
+        else:
+            self.agent_worker, self.review_worker = run_agent_task, run_review_task
+
+        # [추가] Ollama 서버가 여러 대(OLLAMA_HOSTS)면 헬스 체크를 시작하고 모델이 있는 서버로 요청을 나눠 보냄
+        if ollama_pool.multi:
+            ollama_pool.start()
+            healthy = sum(stat['healthy'] for stat in ollama_pool.stats()['hosts'].values())
+            self.stdout.write(f"🌐 Ollama host pool: {healthy}/{len(ollama_pool.hosts)} host(s) healthy")
+
+        # [추가] 모델이 없다는 것을 작업 도중이 아니라 시작할 때 알 수 있도록 사전 점검 (없으면 Pull)
+        models = self._required_models()
+        if options['preflight']:
+            self._preflight(models)
+
+        # 같은 식별자로 재시작한 경우, 이전 프로세스가 남긴 점유를 즉시 반납
+        released = task_service.release_all_leases(self.runner_id)
+        if released:
+            self.stdout.write(self.style.WARNING(f"♻️ Released {released} stale lease(s) held by '{self.runner_id}'."))
+
+        # Task 상태 변경 알림을 받으면 즉시 깨어나고, 알림이 없으면 poll_interval마다 재조회
+        listener = TaskEventListener()
+
+        # [추가] 위키 저장(임베딩)은 태스크 처리와 분리된 아카이브 워커가 처리
+        archiver = None
+        if options['archiver']:
+            archiver = archive_service.ArchiveWorker(f"{self.runner_id}:archive", poll_interval).start()
+
+        # [추가] 모델 상주 관리: 로드 상태 추적 + 작업이 있을 때 콜드 모델 예열
+        self.residency = ResidencyManager(models).start() if options['residency'] else None
+
+        with self._create_executor(workers, executor_type) as executor:
+            try:
+                self._run_loop(executor, listener, workers, poll_interval, options['exit_when_idle'])
+            finally:
+                listener.close()
+                if self.residency is not None:
+                    self.residency.stop(timeout=5)
+                    for model, stat in self.residency.stats().items():
+                        last = stat['last_warm_seconds']
+                        self.stdout.write(
+                            f"Model [{model}]: {'loaded' if stat['loaded'] else 'not loaded'}, "
+                            f"{stat['warmups']} warm-up(s)" + (f", last load {last:.1f}s" if last is not None else "")
+                        )
+                if ollama_pool.multi:
+                    ollama_pool.stop()
+                    stats = ollama_pool.stats()
+                    for host, stat in stats['hosts'].items():
+                        self.stdout.write(
+                            f"Ollama host [{host}]: {'healthy' if stat['healthy'] else 'unhealthy'}, "
+                            f"{stat['requests']} request(s), loaded: {', '.join(stat['loaded']) or '-'}"
+                        )
+                    self.stdout.write(f"Ollama host pool: {stats['failovers']} failover(s)")
+                if archiver is not None:
+                    archiver.stop(timeout=5)
+                    stats = archiver.stats()
+                    self.stdout.write(f"Archive worker: {stats['saved']} saved / {stats['processed']} processed")
+                stats = self.batcher.stats()
+                if stats['dispatched']:
+                    per_model = ", ".join(f"{model} {count}" for model, count in stats['dispatched'].items())
+                    self.stdout.write(f"Model batches: {stats['switches']} model switch(es) ({per_model})")
+                for owner_name, stat in self.scheduler.stats().items():
+                    self.stdout.write(
+                        f"Scheduler [{owner_name}]: {stat['dispatched']} dispatched, "
+                        f"wait p50 {stat['p50']:.1f}s / p95 {stat['p95']:.1f}s"
+                    )
+                if executor_type != 'process':
+                    # (process 모드에서는 워커 프로세스마다 캐시/리미터가 따로 있으므로 생략)
+                    stats = agent_workflow_cache.stats()
+                    self.stdout.write(
+                        f"Workflow cache: {stats['hits']} hits / {stats['misses']} misses "
+                        f"(hit rate {stats['hit_rate']:.0%}, {stats['size']}/{stats['maxsize']} graphs)"
+                    )
+                    stats = embedding_cache.stats()
+                    self.stdout.write(
+                        f"Embedding cache: {stats['memory_hits']} memory hits / {stats['db_hits']} db hits / "
+                        f"{stats['misses']} misses (hit rate {stats['hit_rate']:.0%})"
+                    )
+                    if llm_cache.enabled:
+                        stats = llm_cache.stats()
+                        self.stdout.write(
+                            f"LLM response cache: {stats['memory_hits']} memory hits / {stats['db_hits']} db hits / "
+                            f"{stats['misses']} misses (hit rate {stats['hit_rate']:.0%})"
+                        )
+                    for (model, purpose), stat in llm_limiter.stats().items():
+                        self.stdout.write(
+                            f"LLM queue [{model} / {purpose}]: {stat['calls']} calls, {stat['rejected']} rejected, "
+                            f"wait avg {stat['wait_avg']:.2f}s / p95 {stat['wait_p95']:.2f}s / max {stat['wait_max']:.2f}s "
+                            f"(limit {stat['limit']})"
+                        )
+                    if transcripts.enabled:
+                        stats = transcripts.stats()
+                        self.stdout.write(
+                            f"LLM transcripts ({stats['mode']}): {stats.get('llm_calls', 0)} LLM call(s) "
+                            f"({stats.get('llm_missing', 0)} missing), {stats.get('prompt_tokens', 0)} prompt / "
+                            f"{stats.get('output_tokens', 0)} output token(s), {stats.get('tool_calls', 0)} tool call(s) "
+                            f"({stats.get('tools_replayed', 0)} replayed)"
+                        )
+                # [추가] 남은 LLM 호출 기록을 저장 (process 모드에서는 부모 프로세스의 호출만 해당)
+                if llm_accounting.enabled:
+                    llm_accounting.flush()
+                    stats = llm_accounting.stats()
+                    self.stdout.write(
+                        f"LLM accounting: {stats['recorded']} call(s) recorded, {stats['saved']} saved, "
+                        f"{stats['pending']} pending, {stats['dropped']} dropped"
+                    )
+                stats = self._run_stats(started)
+                self.stdout.write(
+                    f"Runner: {stats['runs'].get('finished', 0)} run(s) finished / {stats['runs'].get('failed', 0)} failed "
+                    f"in {stats['elapsed']:.1f}s ({stats['runs_per_sec']:.2f}/s), "
+                    f"loop p50 {stats['loop']['p50'] * 1000:.1f}ms / p95 {stats['loop']['p95'] * 1000:.1f}ms, "
+                    f"{stats['db']['queries']} DB queries ({stats['db']['seconds']:.2f}s)"
+                )
+                if options['stats_file']:
+                    with open(options['stats_file'], 'w') as f:
+                        json.dump(stats, f, indent=2)
+
+    def _required_models(self):
+        """기본 모델 + 활성 에이전트에 지정된 모델 + 임베딩 모델 ({모델 이름: 용도})"""
+        models = {GLOBAL_MODEL_NAME: CHAT}
+        names = (
+            Agent.objects.filter(is_active=True).exclude(ollama_model_name__isnull=True)
+            .values_list('ollama_model_name', flat=True).distinct()
+        )
+        for name in names:
+            if name.strip():
+                models[name.strip()] = CHAT
+        models[kms_service.EMBEDDING_MODEL] = EMBEDDING
+        return models
+
+    @staticmethod
+    def _candidate_model(kind, task):
+        # 작업은 담당 에이전트의 모델, 결재는 매니저의 모델로 실행
+        return agent_model_name(task.assignee if kind == 'work' else task.assignee.manager)
+
+    def _batched_order(self, candidates):
+        """
+        (모델, kind, task)를 배정 순서대로 내보냅니다 (generator).
+        [추가] 모델별로 묶어 한 모델의 작업을 몰아서 배정하므로, 연속된 태스크가 모델을 번갈아 쓰며
+        Ollama가 모델을 계속 내리고 올리는(thrashing) 일을 막습니다. 모델 내부 순서는 사용자별 공정 큐를 따름.
+        """
+        groups = ModelBatcher.group(candidates, self._candidate_model)
+        is_loaded = self.residency.is_loaded if self.residency is not None else None
+        models = self.batcher.sequence(groups, is_loaded)
+        if models and self.residency is not None:
+            # 이번에 몰아서 배정할 모델이 내려가 있으면 미리 올려 둠 (이미 올라와 있으면 아무 일도 안 함)
+            self.residency.request_warmup([models[0], kms_service.EMBEDDING_MODEL])
+        for model in models:
+            for kind, task in self.scheduler.order(groups[model]):
+                yield model, kind, task
 
-        # Review Workflow는 공통이므로 밖에서 생성
-        review_workflow = create_review_workflow()
+    def _preflight(self, models):
+        try:
+            for model, state in preflight(models, log=self.stdout.write).items():
+                self.stdout.write(self.style.SUCCESS(f"✅ Model '{model}' is {'ready' if state == 'ok' else 'pulled and ready'}."))
+        except PreflightError as e:
+            raise CommandError(str(e))
+        except Exception as e:
+            # 서버가 꺼져 있는 경우는 시작을 막지 않음 (회로 차단기가 복구될 때까지 배정을 멈춤)
+            self.stdout.write(self.style.WARNING(f"⚠️ Preflight skipped: Ollama is not reachable ({e})."))
+
+    def _run_loop(self, executor, listener, workers, poll_interval, exit_when_idle=0):
+        # future -> (task_id, agent_id) : 실행 중인 작업. 같은 태스크/같은 에이전트는 동시에 한 건만 실행
+        in_flight = {}
+        # task_id -> 재시도 가능 시각 : 에러가 난 태스크를 곧바로 다시 돌리지 않도록 대기
+        cooldown = {}
+        breaker = get_circuit_breaker()
+        paused = False
+        idle_since = None
 
         while True:
+            loop_started = time.monotonic()
+            self._collect_finished(in_flight, cooldown)
+            now = time.monotonic()
+            for task_id in [t for t, until in cooldown.items() if until <= now]:
+                del cooldown[task_id]
+
+            busy_tasks = {task_id for task_id, _ in in_flight.values()} | set(cooldown)
+            busy_agents = {agent_id for _, agent_id in in_flight.values()}
+
+            # 죽은 러너가 남긴 만료된 점유 회수
+            reclaimed = task_service.reclaim_expired_leases()
+            if reclaimed:
+                self.stdout.write(self.style.WARNING(f"♻️ Reclaimed {reclaimed} expired task lease(s)."))
+
             # ==================================================================
             # Case A: [Subordinate] Do Work (THINKING or APPROVED)
             # ==================================================================
-            active_tasks = Task.objects.filter(
-                status__in=[Task.TaskStatus.THINKING, Task.TaskStatus.APPROVED],
+            active_statuses = [Task.TaskStatus.THINKING, Task.TaskStatus.APPROVED]
+            active_tasks = task_service.exclude_leased(Task.objects.filter(
+                status__in=active_statuses,
                 assignee__is_active=True
-            ).select_related('assignee')
-
-            for task in active_tasks:
-                self.stdout.write(f"▶ Agent {task.assignee.name} working on '{task.title}' (State: {task.status})...")
-                
-                try:
-                    current_agent_tools = BASE_INHERENT_TOOLS.copy()
-                    
-                    authorized_tools = get_authorized_tools(task.assignee.allowed_tools)
-                    current_agent_tools.extend(authorized_tools)
-                    
-                    if task.assignee.can_hire:
-                        current_agent_tools.append(create_sub_agent_tool)
-                    if task.assignee.can_fire:
-                        current_agent_tools.append(fire_sub_agent_tool)
-                    
-                    agent_workflow = create_agent_workflow(current_agent_tools)
-                    
-                    prev_result = task.result if task.result else ""
-
-                    # 에이전트 정보 조회
-                    agent = task.assignee
-                    subordinates = list(agent.subordinates.filter(is_active=True).values('id', 'name', 'role'))
-
-                    # 히스토리 컨텍스트 생성
-                    logs = task.logs.all().order_by('created_at')
-                    history_context = ""
-                    if logs.exists():
-                        history_context = "\n[⚠️ HISTORY OF PAST FAILURES]\n"
-                        history_context += "You have attempted this task before but were REJECTED. Review the feedback carefully:\n"
-                        
-                        for i, log in enumerate(logs, 1):
-                            short_result = log.result[:200] + "..." if len(log.result) > 200 else log.result
-                            history_context += f"\n--- Attempt #{i} ---\n"
-                            history_context += f"My Output: {short_result}\n"
-                            history_context += f"Manager Feedback: {log.feedback}\n"
-                        
-                        history_context += "\nIMPORTANT: Do NOT repeat the mistakes from above. Improve your plan based on the feedback.\n"
-                    
-                    initial_state = AgentState(
-                        messages=[],
-                        task_title=task.title,
-                        task_description=task.description,
-                        agent_id=task.assignee.id,
-                        agent_name=task.assignee.name,
-                        task_status=task.status,
-                        prev_result=prev_result,
-                        task_id=task.id,
-                        subordinates=subordinates,
-                        history_context=history_context
-                    )
-
-                    final_state = agent_workflow.invoke(initial_state)
-                    final_response = final_state["messages"][-1].content
-                    
-                    task.refresh_from_db()
-                    
-                    task.result = final_response
-                    
-                    if task.status == Task.TaskStatus.APPROVED:
-                        # [변경] 위키 저장 성공 여부에 따라 상태 결정
-                        wiki_saved = False
-                        try:
-                            # 2. 성공한 태스크 지식 자산화 (Auto-Archiving)
-                            saved_memory = kms_service.add_knowledge(
-                                owner=task.assignee.owner,
-                                subject=f"Result of: {task.title}",
-                                content=task.result,
-                                source_task_id=task.id
-                            )
-                            
-                            if saved_memory:
-                                self.stdout.write(self.style.SUCCESS(f"   ↳ 💾 Saved to Corporate Wiki."))
-                                wiki_saved = True
-                            else:
-                                # None이 반환되면 (모델 다운로드 실패 등) 저장이 안 된 것임
-                                self.stdout.write(self.style.ERROR(f"   ↳ ❌ Failed to save to Wiki. Task remains APPROVED to retry."))
-                                
-                        except Exception as e:
-                            self.stdout.write(self.style.ERROR(f"   ↳ ❌ Error saving to Wiki: {e}"))
-                        
-                        # [핵심] 위키 저장이 성공했을 때만 DONE으로 변경
-                        if wiki_saved:
-                            task.status = Task.TaskStatus.DONE
-                            self.stdout.write(self.style.SUCCESS(f"✅ Task '{task.title}' COMPLETED."))
-                        else:
-                            # 실패 시 상태를 APPROVED로 유지 (다음 루프에서 재시도하게 됨)
-                            pass
-                    
-                    elif task.status == Task.TaskStatus.WAIT_SUBTASK:
-                        # [핵심 수정] 도구(assign_task)가 이미 상태를 바꿨음 -> 건드리지 않고 대기
-                        self.stdout.write(self.style.WARNING(f"⏳ Task '{task.title}' delegated. Waiting for sub-tasks..."))
-                        
-                    elif task.status == Task.TaskStatus.THINKING:
-                        # [수정] 여기가 핵심입니다!
-                        # 매니저가 부하직원 지원(Help Subordinate) 업무를 성공적으로 수행했다면,
-                        # '결재 대기'로 보내지 않고 즉시 '완료(DONE)' 처리합니다.
-                        if "Help Subordinate" in task.title and "Success:" in str(task.result):
-                            task.status = Task.TaskStatus.DONE
-                            self.stdout.write(self.style.SUCCESS(f"✅ Manager replied to subordinate automatically. (Task DONE)"))
-                        else:
-                            # 그 외 일반적인 기획/보고 업무는 기존대로 결재 요청(WAIT_APPROVAL) 상태로 변경
-                            task.status = Task.TaskStatus.WAIT_APPROVAL
-                            self.stdout.write(self.style.SUCCESS(f"📝 Task '{task.title}' sent for CEO/Manager APPROVAL."))
-                    
-                    task.save()
-
-                except Exception as e:
-                    print(f"Error in execution: {e}")
-                    # 에러 시 일단 유지
+            )).select_related('assignee')
 
             # ------------------------------------------------------------------
             # Case B: [Manager] Review Work (WAIT_APPROVAL)
             # ------------------------------------------------------------------
             # 상사(Manager)가 있는 경우에만 AI 자동 결재 진행
             # 상사가 없으면(CEO 직속) Dashboard에 남아 사람을 기다림
-            review_tasks = Task.objects.filter(
+            review_tasks = task_service.exclude_leased(Task.objects.filter(
                 status=Task.TaskStatus.WAIT_APPROVAL,
                 assignee__manager__isnull=False  # 상사가 있는 경우만
-            ).select_related('assignee', 'assignee__manager')
-
-            for task in review_tasks:
-                manager = task.assignee.manager
-                self.stdout.write(f"👮‍♂️ Manager {manager.name} reviewing '{task.title}' from {task.assignee.name}...")
-                
-                try:
-                    review_state = ReviewState(
-                        task_title=task.title,
-                        task_description=task.description,
-                        proposed_result=task.result,
-                        manager_name=manager.name,
-                        subordinate_name=task.assignee.name,
-                        decision="",
-                        feedback=""
-                    )
-                    
-                    final_review = review_workflow.invoke(review_state)
-                    decision = final_review["decision"]
-                    feedback = final_review["feedback"]
-                    
-                    if decision == "APPROVE":
-                        task.status = Task.TaskStatus.APPROVED
-                        task.feedback = f"[Manager Approved]: {feedback}"
-                        self.stdout.write(self.style.SUCCESS(f"👌 Approved by {manager.name}."))
+            )).select_related('assignee', 'assignee__manager')
+
+            # [스케줄링] 빈 워커 슬롯이 있을 때만 후보를 조회하고,
+            # 모델별 배치 + 사용자(owner)별 가중 공정 큐잉 + 우선순위/노화 순서로 A/B 작업을 함께 배정
+            # [추가] Ollama 회로가 열려 있으면 새 LLM 작업을 배정하지 않고 쿨다운이 끝날 때까지 대기
+            llm_down = breaker.is_open()
+            if llm_down and not paused:
+                self.stdout.write(self.style.WARNING(
+                    f"⏸ Ollama is unavailable. Pausing agent/review dispatch for {breaker.retry_after():.0f}s..."
+                ))
+            paused = llm_down
+
+            if len(in_flight) < workers and not llm_down:
+                candidates = (
+                    [('work', t) for t in fetch_candidates(active_tasks)] +
+                    [('review', t) for t in fetch_candidates(review_tasks)]
+                )
+                for model, kind, task in self._batched_order(candidates):
+                    if len(in_flight) >= workers:
+                        break
+
+                    if kind == 'work':
+                        # Case A: 담당 에이전트가 직접 작업
+                        if task.id in busy_tasks or task.assignee_id in busy_agents:
+                            continue
+                        # 다른 러너 프로세스와 경쟁: 점유에 성공한 러너만 실행
+                        if not task_service.claim_task(task.id, task.assignee_id, self.runner_id, active_statuses, lease_seconds=self.lease_seconds):
+                            continue
+
+                        self.stdout.write(f"▶ Agent {task.assignee.name} working on '{task.title}' (State: {task.status})...")
+                        future = executor.submit(self.agent_worker, task.id, self.runner_id, self.lease_seconds)
+                        agent_id = task.assignee_id
                     else:
-                        TaskLog.objects.create(
-                            task=task,
-                            result=task.result,  # 부하가 낸 답안
-                            feedback=feedback,   # 상사의 꾸지람
-                            status='REJECTED'
-                        )
-                        
-                        task.status = Task.TaskStatus.THINKING # 다시 생각하게 반려
-                        task.feedback = f"[Manager Rejected]: {feedback}"
-                        self.stdout.write(self.style.WARNING(f"❌ Rejected by {manager.name}."))
-                    
-                    task.save()
-                    
-                except Exception as e:
-                    print(f"Error in review: {e}")
-                    
+                        # Case B: 상사가 결재
+                        manager = task.assignee.manager
+                        if task.id in busy_tasks or manager.id in busy_agents:
+                            continue
+                        if not task_service.claim_task(task.id, manager.id, self.runner_id, [Task.TaskStatus.WAIT_APPROVAL], review=True, lease_seconds=self.lease_seconds):
+                            continue
+
+                        self.stdout.write(f"👮‍♂️ Manager {manager.name} reviewing '{task.title}' from {task.assignee.name}...")
+                        future = executor.submit(self.review_worker, task.id, self.runner_id, self.lease_seconds)
+                        agent_id = manager.id
+
+                    self.scheduler.charge(task)
+                    self.batcher.charge(model)
+                    self.runs[kind] += 1
+                    future.add_done_callback(lambda f: listener.wake())
+                    in_flight[future] = (task.id, agent_id)
+                    busy_tasks.add(task.id)
+                    busy_agents.add(agent_id)
+
             # ------------------------------------------------------------------
             # [NEW] Case C: Check Waiting Managers (Bottom-up Reporting)
             # ------------------------------------------------------------------
             # 하위 업무가 다 끝났는지 확인하고, 끝났으면 상사를 깨운다.
-            waiting_tasks = Task.objects.filter(status=Task.TaskStatus.WAIT_SUBTASK)
-            
-            for parent_task in waiting_tasks:
-                # 이 태스크에 연결된 하위 태스크들 조회
-                sub_tasks = Task.objects.filter(parent_task=parent_task)
-                
-                # 모든 하위 태스크가 완료(DONE)되었는지 확인
-                # (주의: 만약 하위 태스크가 REJECTED라면 다시 THINKING일 것이므로 DONE 아님)
-                if sub_tasks.exists() and not sub_tasks.exclude(status=Task.TaskStatus.DONE).exists():
-                    
-                    self.stdout.write(self.style.SUCCESS(f"🔔 All sub-tasks for '{parent_task.title}' are DONE. Waking up manager..."))
-                    
-                    # 1. 하위 보고서 취합
-                    reports = []
-                    for st in sub_tasks:
-                        reports.append(f"- Sub-agent {st.assignee.name} Report on '{st.title}':\n{st.result}")
-                    
-                    combined_report = "\n\n".join(reports)
-                    
-                    # 2. 상급자 태스크의 '이전 결과' 필드나 로그에 보고서 내용 추가
-                    # (여기서는 result 필드에 임시로 붙이거나, 다음 턴의 Prompt에 주입하기 위해 result에 저장)
-                    parent_task.result = (parent_task.result or "") + f"\n\n[SUBORDINATE REPORTS]\n{combined_report}\n[INSTRUCTION]\nSynthesize these reports and create the final output."
-                    
-                    # 3. 상태를 다시 THINKING으로 변경 -> Agent가 깨어나서 종합 보고서 작성 시작
-                    parent_task.status = Task.TaskStatus.THINKING
-                    parent_task.save()
+            # (여러 러너가 동시에 같은 상급자를 깨우지 않도록 태스크 행을 잠그고 처리)
+            waiting_task_ids = list(task_service.exclude_leased(
+                Task.objects.filter(status=Task.TaskStatus.WAIT_SUBTASK)
+            ).values_list('id', flat=True))
+
+            for parent_task_id in waiting_task_ids:
+                # 워크플로 실행 중(assign_task 직후)인 태스크는 워커가 끝난 뒤에 확인
+                if parent_task_id in busy_tasks:
+                    continue
+
+                with transaction.atomic():
+                    parent_task = Task.objects.select_for_update(skip_locked=True).filter(
+                        id=parent_task_id, status=Task.TaskStatus.WAIT_SUBTASK
+                    ).first()
+                    if parent_task is None:
+                        continue
+
+                    # 이 태스크에 연결된 하위 태스크들 조회
+                    sub_tasks = Task.objects.filter(parent_task=parent_task).select_related('assignee')
+
+                    # 모든 하위 태스크가 완료(DONE)되었는지 확인
+                    # (주의: 만약 하위 태스크가 REJECTED라면 다시 THINKING일 것이므로 DONE 아님)
+                    if sub_tasks.exists() and not sub_tasks.exclude(status=Task.TaskStatus.DONE).exists():
+
+                        self.stdout.write(self.style.SUCCESS(f"🔔 All sub-tasks for '{parent_task.title}' are DONE. Waking up manager..."))
+
+                        # 1. 하위 보고서 취합
+                        reports = []
+                        for st in sub_tasks:
+                            reports.append(f"- Sub-agent {st.assignee.name} Report on '{st.title}':\n{st.result}")
+
+                        combined_report = "\n\n".join(reports)
+
+                        # 2. 상급자 태스크의 '이전 결과' 필드나 로그에 보고서 내용 추가
+                        # (여기서는 result 필드에 임시로 붙이거나, 다음 턴의 Prompt에 주입하기 위해 result에 저장)
+                        parent_task.result = (parent_task.result or "") + f"\n\n[SUBORDINATE REPORTS]\n{combined_report}\n[INSTRUCTION]\nSynthesize these reports and create the final output."
+
+                        # 3. 상태를 다시 THINKING으로 변경 -> Agent가 깨어나서 종합 보고서 작성 시작
+                        parent_task.status = Task.TaskStatus.THINKING
+                        parent_task.save(update_fields=['result', 'status', 'updated_at'])
+                        notify_task_changed(parent_task)
 
             # ==================================================================
             # [NEW] Case D: Escalation (질문 -> 상사의 업무로 변환)
             # ==================================================================
             # 상사가 있는 에이전트가 질문(WAIT_ANSWER)을 했는데,
             # 아직 상사한테 "답변해달라"는 태스크가 안 만들어진 경우를 찾음.
-            
-            pending_questions = Task.objects.filter(
+            # (질문 태스크 행을 잠가, 여러 러너가 같은 질문을 중복 에스컬레이션하지 않게 함)
+
+            pending_question_ids = list(Task.objects.filter(
                 status=Task.TaskStatus.WAIT_ANSWER,
                 assignee__manager__isnull=False
-            )
+            ).values_list('id', flat=True))
 
-            for q_task in pending_questions:
-                manager = q_task.assignee.manager
-                
-                # 이미 이 질문에 대해 상사가 작업 중인 태스크가 있는지 확인 (중복 생성 방지)
-                # (단순하게 제목에 Task ID를 포함시켜서 구분)
-                existing_manager_task = Task.objects.filter(
-                    assignee=manager,
-                    description__contains=f"Target Task ID: {q_task.id}"
-                ).exists()
-
-                if not existing_manager_task:
-                    # 상사에게 새로운 업무 할당
-                    Task.objects.create(
-                        title=f"Help Subordinate: {q_task.assignee.name}",
-                        description=(
-                            f"Your subordinate '{q_task.assignee.name}' has asked a question.\n"
-                            f"[Question]: {q_task.result}\n\n"
-                            f"Action Required:\n"
-                            f"1. Analyze the question (use tools if needed).\n"
-                            f"2. Use 'reply_to_subordinate_tool' to send the answer.\n"
-                            f"3. Target Task ID: {q_task.id}"
-                        ),
+            for q_task_id in pending_question_ids:
+                with transaction.atomic():
+                    q_task = Task.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                        id=q_task_id, status=Task.TaskStatus.WAIT_ANSWER
+                    ).select_related('assignee', 'assignee__manager').first()
+                    if q_task is None or q_task.assignee.manager is None:
+                        continue
+
+                    manager = q_task.assignee.manager
+
+                    # 이미 이 질문에 대해 상사가 작업 중인 태스크가 있는지 확인 (중복 생성 방지)
+                    # (단순하게 제목에 Task ID를 포함시켜서 구분)
+                    existing_manager_task = Task.objects.filter(
                         assignee=manager,
-                        creator=q_task.assignee, # 발의자는 부하직원
-                        status=Task.TaskStatus.THINKING # 상사를 깨움
-                    )
-                    self.stdout.write(self.style.WARNING(f"🔔 Question from {q_task.assignee.name} escalated to Manager {manager.name}."))
-            
-            time.sleep(5)
+                        description__contains=f"Target Task ID: {q_task.id}"
+                    ).exists()
+
+                    if not existing_manager_task:
+                        # 상사에게 새로운 업무 할당
+                        help_task = Task.objects.create(
+                            title=f"Help Subordinate: {q_task.assignee.name}",
+                            description=(
+                                f"Your subordinate '{q_task.assignee.name}' has asked a question.\n"
+                                f"[Question]: {q_task.result}\n\n"
+                                f"Action Required:\n"
+                                f"1. Analyze the question (use tools if needed).\n"
+                                f"2. Use 'reply_to_subordinate_tool' to send the answer.\n"
+                                f"3. Target Task ID: {q_task.id}"
+                            ),
+                            assignee=manager,
+                            creator=q_task.assignee, # 발의자는 부하직원
+                            status=Task.TaskStatus.THINKING, # 상사를 깨움
+                            priority=q_task.priority # 부하가 막혀 있으므로 같은 우선순위로 처리
+                        )
+                        notify_task_changed(help_task)
+                        self.stdout.write(self.style.WARNING(f"🔔 Question from {q_task.assignee.name} escalated to Manager {manager.name}."))
+
+            self.loop_iterations += 1
+            self.loop_times.append(time.monotonic() - loop_started)
+
+            # [추가] --exit-when-idle: 실행 중인 작업도, (다른 러너가 점유 중이거나 재시도 대기 중인 것까지 포함해) 남은 작업도
+            # 없는 상태가 이어지면 종료 (Ollama 복구 대기 중에는 제외)
+            if in_flight or cooldown or llm_down or (exit_when_idle and self._has_pending_work(active_statuses)):
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.monotonic()
+            if exit_when_idle and idle_since is not None and time.monotonic() - idle_since >= exit_when_idle:
+                self.stdout.write(self.style.SUCCESS(f"🏁 No work for {exit_when_idle:.0f}s. Exiting."))
+                return
+
+            # [변경] 고정 5초 sleep 대신 Task 알림 / 워커 완료 / fallback poll 중 먼저 오는 것에 깨어남
+            timeout = poll_interval
+            if cooldown:
+                timeout = max(0, min(timeout, min(cooldown.values()) - time.monotonic()))
+            if llm_down:
+                timeout = min(timeout, breaker.retry_after())
+            if exit_when_idle and idle_since is not None:
+                timeout = max(0, min(timeout, idle_since + exit_when_idle - time.monotonic()))
+            listener.wait(timeout)
@@ -0,0 +1,45 @@
+import os
+from django.core.management.base import BaseCommand
+from corp.services import archive_service, task_service
+
+
+class Command(BaseCommand):
+    help = '위키 아카이브 작업 큐(ArchiveJob)를 처리합니다. 러너를 --no-archiver로 띄웠을 때 별도로 실행합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--worker-id', default=os.getenv("ARCHIVER_ID") or f"{task_service.default_runner_id()}:archive",
+            help='작업 점유에 기록되는 워커 식별자'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=float(os.getenv("RUNNER_POLL_INTERVAL", "30")),
+            help='새 작업 알림(LISTEN/NOTIFY)이 없을 때의 안전용 재조회 주기(초).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=archive_service.ARCHIVE_BATCH_SIZE,
+            help='한 번에 점유해 처리할 작업 수'
+        )
+        parser.add_argument('--once', action='store_true', help='지금 실행할 수 있는 작업만 처리하고 종료합니다.')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        if options['once']:
+            processed = saved = 0
+            while True:
+                p, s = archive_service.run_pending(options['worker_id'], batch_size)
+                processed += p
+                saved += s
+                if p < batch_size:
+                    break
+            style = self.style.SUCCESS if saved == processed else self.style.WARNING
+            self.stdout.write(style(f"✅ Archived {saved} of {processed} job(s)."))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Starting archive worker '{options['worker_id']}'..."))
+        worker = archive_service.ArchiveWorker(options['worker_id'], options['poll_interval'], batch_size)
+        try:
+            worker.run()
+        finally:
+            worker.stop()
+            stats = worker.stats()
+            self.stdout.write(f"Archive worker: {stats['saved']} saved / {stats['processed']} processed")
@@ -1,7 +1,7 @@
 from .models import Agent, AgentMemory
 from django.db.models.functions import Coalesce
 from django.db.models import F
-from pgvector.django import L2Distance
+from .vector_search import nearest
 
 class MemoryManager:
     def __init__(self, agent: Agent):
@@ -20,9 +20,9 @@ class MemoryManager:
         if memory_type:
             memories = memories.filter(type=memory_type)
         
-        # Order by L2Distance (Euclidean distance) to find the most similar embeddings
+        # Order by the configured vector distance (VECTOR_DISTANCE) using the HNSW index.
         # A smaller distance means higher similarity.
-        return memories.annotate(distance=L2Distance('embedding', query_embedding)).order_by('distance')[:top_k]
+        return nearest(memories, 'embedding', query_embedding, top_k)
 
     def get_all_memories(self, memory_type: str = None):
         memories = AgentMemory.objects.filter(agent=self.agent)
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corp', '0003_agent_allowed_tools'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='lease_owner',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
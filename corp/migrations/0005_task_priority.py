@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corp', '0004_task_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='priority',
+            field=models.IntegerField(choices=[(-10, 'Low'), (0, 'Normal'), (10, 'High'), (20, 'Urgent')], default=0),
+        ),
+    ]
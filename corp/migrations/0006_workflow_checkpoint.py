@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-18 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corp', '0005_task_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkflowCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=255)),
+                ('checkpoint_ns', models.CharField(blank=True, default='', max_length=255)),
+                ('checkpoint_id', models.CharField(max_length=255)),
+                ('parent_checkpoint_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('checkpoint_type', models.CharField(max_length=50)),
+                ('checkpoint', models.BinaryField()),
+                ('metadata_type', models.CharField(max_length=50)),
+                ('metadata', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('thread_id', 'checkpoint_ns', 'checkpoint_id'), name='unique_workflow_checkpoint')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkflowCheckpointWrite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=255)),
+                ('checkpoint_ns', models.CharField(blank=True, default='', max_length=255)),
+                ('checkpoint_id', models.CharField(max_length=255)),
+                ('task_id', models.CharField(max_length=255)),
+                ('task_path', models.CharField(blank=True, default='', max_length=255)),
+                ('idx', models.IntegerField()),
+                ('channel', models.CharField(max_length=255)),
+                ('value_type', models.CharField(max_length=50)),
+                ('value', models.BinaryField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'), name='unique_workflow_checkpoint_write')],
+            },
+        ),
+    ]
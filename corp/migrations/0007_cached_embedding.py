@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 06:13
+
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corp', '0006_workflow_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=255)),
+                ('text_hash', models.CharField(max_length=64)),
+                ('embedding', pgvector.django.vector.VectorField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model', 'text_hash'), name='unique_cached_embedding')],
+            },
+        ),
+    ]
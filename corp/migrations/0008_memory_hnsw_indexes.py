@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 06:16
+
+import pgvector.django.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # 기존 위키/메모리 테이블을 잠그지 않도록 인덱스를 CONCURRENTLY로 생성
+    atomic = False
+
+    dependencies = [
+        ('corp', '0007_cached_embedding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='agentmemory',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='agentmemory_emb_cos_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='agentmemory',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='agentmemory_emb_l2_hnsw', opclasses=['vector_l2_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='corporatememory',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='corpmemory_emb_cos_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='corporatememory',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='corpmemory_emb_l2_hnsw', opclasses=['vector_l2_ops']),
+        ),
+    ]
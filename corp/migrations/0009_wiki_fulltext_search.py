@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 06:17
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # GIN 인덱스는 위키 테이블을 잠그지 않도록 CONCURRENTLY로 생성
+    atomic = False
+
+    dependencies = [
+        ('corp', '0008_memory_hnsw_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='corporatememory',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('subject', config='simple', weight='A'), '||', django.contrib.postgres.search.SearchVector('content', config='simple', weight='B'), django.contrib.postgres.search.SearchConfig('simple')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        AddIndexConcurrently(
+            model_name='corporatememory',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='corpmemory_search_gin'),
+        ),
+    ]
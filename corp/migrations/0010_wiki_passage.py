@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 06:20
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corp', '0009_wiki_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WikiPassage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('start_offset', models.PositiveIntegerField()),
+                ('end_offset', models.PositiveIntegerField()),
+                ('content', models.TextField()),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=768)),
+                ('search_vector', models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('content', config='simple'), output_field=django.contrib.postgres.search.SearchVectorField())),
+                ('memory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passages', to='corp.corporatememory')),
+            ],
+            options={
+                'ordering': ['memory', 'position'],
+                'indexes': [pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='wikipassage_emb_cos_hnsw', opclasses=['vector_cosine_ops']), pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='wikipassage_emb_l2_hnsw', opclasses=['vector_l2_ops']), django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='wikipassage_search_gin')],
+                'constraints': [models.UniqueConstraint(fields=('memory', 'position'), name='unique_wiki_passage_position')],
+            },
+        ),
+    ]
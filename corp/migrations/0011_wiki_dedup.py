@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 06:24
+
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+def backfill_content_hash(apps, schema_editor):
+    # kms_service.content_hash()와 같은 정규화 (공백 정리 + 대소문자 무시)
+    CorporateMemory = apps.get_model('corp', 'CorporateMemory')
+    pending = []
+    for memory in CorporateMemory.objects.filter(content_hash='').only('id', 'content').iterator(chunk_size=500):
+        normalized = " ".join(memory.content.split()).casefold()
+        memory.content_hash = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        pending.append(memory)
+        if len(pending) >= 500:
+            CorporateMemory.objects.bulk_update(pending, ['content_hash'])
+            pending.clear()
+    if pending:
+        CorporateMemory.objects.bulk_update(pending, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+    # 기존 위키 테이블을 잠그지 않도록 인덱스를 CONCURRENTLY로 생성
+    atomic = False
+
+    dependencies = [
+        ('corp', '0010_wiki_passage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='corporatememory',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='corporatememory',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='corporatememory',
+            index=models.Index(fields=['owner', 'content_hash'], name='corpmemory_owner_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 07:01
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corp', '0013_llm_response_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('model', models.CharField(max_length=100)),
+                ('purpose', models.CharField(max_length=32)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('prompt_ms', models.PositiveIntegerField(default=0)),
+                ('eval_ms', models.PositiveIntegerField(default=0)),
+                ('load_ms', models.PositiveIntegerField(default=0)),
+                ('total_ms', models.PositiveIntegerField(default=0)),
+                ('wall_ms', models.PositiveIntegerField(default=0)),
+                ('cache_hit', models.BooleanField(default=False)),
+                ('agent', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='corp.agent')),
+                ('owner', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('task', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='corp.task')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'created_at'], name='llmcall_owner_created_idx'), models.Index(fields=['created_at'], name='llmcall_created_idx')],
+            },
+        ),
+    ]
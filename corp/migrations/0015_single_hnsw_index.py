@@ -0,0 +1,31 @@
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+# [변경] 컬럼마다 cosine / L2 인덱스를 둘 다 유지하던 것을 하나(기본 거리인 cosine)로 줄입니다.
+# cosine 인덱스는 이름만 바꾸고(재생성 없음), L2 인덱스는 CONCURRENTLY로 삭제합니다.
+# 마이그레이션은 환경 변수와 무관하게 항상 같은 스키마를 만들고,
+# VECTOR_DISTANCE=l2 배포는 migrate 뒤에 `python manage.py rebuild_vector_indexes`로 인덱스를 바꿉니다.
+KEEP, DROP = 'cos', 'l2'
+
+INDEXES = [
+    ('agentmemory', 'agentmemory'),
+    ('corporatememory', 'corpmemory'),
+    ('wikipassage', 'wikipassage'),
+]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('corp', '0014_llm_call'),
+    ]
+
+    operations = [
+        op
+        for model_name, prefix in INDEXES
+        for op in (
+            RemoveIndexConcurrently(model_name=model_name, name=f'{prefix}_emb_{DROP}_hnsw'),
+            migrations.RenameIndex(model_name=model_name, new_name=f'{prefix}_emb_hnsw', old_name=f'{prefix}_emb_{KEEP}_hnsw'),
+        )
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corp', '0015_single_hnsw_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivejob',
+            name='kind',
+            field=models.CharField(choices=[('ARCHIVE', 'Archive task result'), ('REEMBED', 'Re-embed document')], default='ARCHIVE', max_length=10),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-18 07:15
+
+from django.conf import settings
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def clear_duplicate_hashes(apps, schema_editor):
+    """
+    유일 제약을 걸기 전에 이미 쌓인 중복 문서(같은 사용자, 같은 본문 해시)는 가장 오래된 문서만 해시를 남기고 비웁니다.
+    문서는 지우지 않으므로 `python manage.py compact_wiki`로 합칠 수 있습니다 (유사도 단계에서 같은 본문으로 잡힘).
+    """
+    CorporateMemory = apps.get_model('corp', 'CorporateMemory')
+    groups = (
+        CorporateMemory.objects.exclude(content_hash='')
+        .values('owner_id', 'content_hash').annotate(n=Count('id')).filter(n__gt=1)
+    )
+    for group in groups:
+        ids = list(
+            CorporateMemory.objects.filter(owner_id=group['owner_id'], content_hash=group['content_hash'])
+            .order_by('created_at').values_list('id', flat=True)
+        )
+        CorporateMemory.objects.filter(id__in=ids[1:]).update(content_hash='')
+
+
+class Migration(migrations.Migration):
+    # 위키 테이블을 잠그지 않도록 인덱스를 CONCURRENTLY로 생성 / 삭제
+    atomic = False
+
+    dependencies = [
+        ('corp', '0016_archive_job_kind'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_hashes, migrations.RunPython.noop, atomic=True),
+        # 조건부 UniqueConstraint는 Postgres에서 부분 유일 인덱스이므로 같은 인덱스를 CONCURRENTLY로 만듦
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "unique_corpmemory_owner_hash" '
+                    'ON "corp_corporatememory" ("owner_id", "content_hash") WHERE NOT ("content_hash" = \'\')',
+                    'DROP INDEX CONCURRENTLY IF EXISTS "unique_corpmemory_owner_hash"',
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='corporatememory',
+                    constraint=models.UniqueConstraint(condition=models.Q(('content_hash', ''), _negated=True), fields=('owner', 'content_hash'), name='unique_corpmemory_owner_hash'),
+                ),
+            ],
+        ),
+        # 유일 인덱스가 (owner, content_hash) 조회를 대신함
+        RemoveIndexConcurrently(
+            model_name='corporatememory',
+            name='corpmemory_owner_hash_idx',
+        ),
+    ]
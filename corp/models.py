@@ -3,7 +3,11 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models import JSONField
 from django.db import transaction
-from pgvector.django import VectorField
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from pgvector.django import VectorField, HnswIndex
+from corp.task_events import notify_task_changed
 
 class Agent(models.Model):
     # [변경] ID를 UUIDv4로 변경 (모든 모델 공통 적용)
@@ -84,7 +88,7 @@ class Agent(models.Model):
                 grandparent_name = grandparent.name if grandparent else "Human CEO (User)"
                 
                 for sub in subordinates:
-                    Task.objects.create(
+                    notice_task = Task.objects.create(
                         # Task 생성 시 creator 설정 주의: 
                         # grandparent가 있으면 그가 creator, 없으면 시스템 알림이므로 creator=None
                         creator=grandparent if grandparent else None,
@@ -97,6 +101,8 @@ class Agent(models.Model):
                         ),
                         status=Task.TaskStatus.THINKING,
                     )
+                    # 트랜잭션 안이므로 커밋 시점에 러너에게 전달됨
+                    notify_task_changed(notice_task)
             
             super().delete(*args, **kwargs)
 
@@ -112,6 +118,12 @@ class Task(models.Model):
         DONE = 'DONE', 'Done'
         REJECTED = 'REJECTED', 'Rejected'
 
+    class TaskPriority(models.IntegerChoices):
+        LOW = -10, 'Low'
+        NORMAL = 0, 'Normal'
+        HIGH = 10, 'High'
+        URGENT = 20, 'Urgent'
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=255)
     description = models.TextField()
@@ -120,6 +132,8 @@ class Task(models.Model):
         choices=TaskStatus.choices,
         default=TaskStatus.TODO,
     )
+    # [추가] 스케줄링 우선순위 (클수록 먼저). 대기 시간이 길어지면 러너 스케줄러가 자동으로 가산(Aging)
+    priority = models.IntegerField(choices=TaskPriority.choices, default=TaskPriority.NORMAL)
     
     # [변경] creator가 null이면 '사용자(Human)'가 직접 지시한 태스크입니다.
     creator = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='created_tasks', null=True, blank=True)
@@ -129,6 +143,10 @@ class Task(models.Model):
     result = models.TextField(blank=True, null=True)
     feedback = models.TextField(blank=True, null=True)
     
+    # [추가] 러너 임대(Lease): 여러 run_agents 프로세스가 같은 태스크를 동시에 집지 않도록 점유자와 만료 시각 기록
+    lease_owner = models.CharField(max_length=255, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -136,6 +154,51 @@ class Task(models.Model):
         return self.title
 
 
+class WorkflowCheckpoint(models.Model):
+    """
+    LangGraph 체크포인트 (thread_id = 태스크 ID).
+    러너가 워크플로 도중 죽어도 마지막으로 완료된 노드부터 재개하고, 반려 후 재작업 시 이전 대화/도구 결과를 이어 씁니다.
+    """
+    thread_id = models.CharField(max_length=255)
+    checkpoint_ns = models.CharField(max_length=255, blank=True, default='')
+    checkpoint_id = models.CharField(max_length=255)
+    parent_checkpoint_id = models.CharField(max_length=255, null=True, blank=True)
+    checkpoint_type = models.CharField(max_length=50)
+    checkpoint = models.BinaryField()
+    metadata_type = models.CharField(max_length=50)
+    metadata = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['thread_id', 'checkpoint_ns', 'checkpoint_id'], name='unique_workflow_checkpoint'),
+        ]
+
+    def __str__(self):
+        return f"Checkpoint {self.checkpoint_id} of {self.thread_id}"
+
+
+class WorkflowCheckpointWrite(models.Model):
+    """체크포인트 이후 노드가 남긴 중간 결과 (다음 체크포인트 전에 죽어도 완료된 노드의 결과를 재사용)"""
+    thread_id = models.CharField(max_length=255)
+    checkpoint_ns = models.CharField(max_length=255, blank=True, default='')
+    checkpoint_id = models.CharField(max_length=255)
+    task_id = models.CharField(max_length=255)
+    task_path = models.CharField(max_length=255, blank=True, default='')
+    idx = models.IntegerField()
+    channel = models.CharField(max_length=255)
+    value_type = models.CharField(max_length=50)
+    value = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'], name='unique_workflow_checkpoint_write'),
+        ]
+
+    def __str__(self):
+        return f"Write {self.channel} of {self.thread_id}"
+
+
 class TaskLog(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='logs')
@@ -165,6 +228,12 @@ class AgentMemory(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # [변경] ANN 검색용 HNSW 인덱스 (컬럼당 하나, cosine. VECTOR_DISTANCE=l2는 rebuild_vector_indexes로 전환)
+        indexes = [
+            HnswIndex(name='agentmemory_emb_hnsw', fields=['embedding'], m=16, ef_construction=64, opclasses=['vector_cosine_ops']),
+        ]
+
     def __str__(self):
         return f"Memory for {self.agent.name}"
 
@@ -179,10 +248,179 @@ class CorporateMemory(models.Model):
     source_task = models.ForeignKey('Task', on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # [추가] 중복 저장 방지: 정규화한 본문의 sha256, 거의 같은 내용으로 갱신된 횟수(1부터)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    version = models.PositiveIntegerField(default=1)
+
+    # [추가] 전문 검색(Full-text)용 tsvector. 제목(A)에 본문(B)보다 높은 가중치.
+    # 한/영 혼용 문서와 티켓 ID·제품명 같은 정확한 용어를 위해 형태소 분석 없는 'simple' 설정 사용
+    search_vector = models.GeneratedField(
+        expression=SearchVector('subject', weight='A', config='simple') + SearchVector('content', weight='B', config='simple'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        # [변경] ANN 검색용 HNSW 인덱스 (컬럼당 하나, cosine. VECTOR_DISTANCE=l2는 rebuild_vector_indexes로 전환)
+        indexes = [
+            HnswIndex(name='corpmemory_emb_hnsw', fields=['embedding'], m=16, ef_construction=64, opclasses=['vector_cosine_ops']),
+            GinIndex(name='corpmemory_search_gin', fields=['search_vector']),
+        ]
+        constraints = [
+            # [추가] 같은 사용자의 위키에 같은 본문의 문서는 하나만 (동시 저장 시 중복 방지, 해시 조회 인덱스 겸용)
+            models.UniqueConstraint(
+                fields=['owner', 'content_hash'], condition=~models.Q(content_hash=''), name='unique_corpmemory_owner_hash',
+            ),
+        ]
+
     def __str__(self):
         return f"[Wiki] {self.subject}"
 
 
+class WikiPassage(models.Model):
+    """
+    [추가] 위키 문서를 검색 단위로 나눈 구간(Passage).
+    문서 전체 대신 질문과 가장 관련 있는 구간만 에이전트 컨텍스트에 넣기 위해 구간마다 임베딩을 따로 저장합니다.
+    start_offset / end_offset 은 원문(CorporateMemory.content) 안의 문자 위치입니다.
+    """
+    memory = models.ForeignKey(CorporateMemory, on_delete=models.CASCADE, related_name='passages')
+    position = models.PositiveIntegerField()
+    start_offset = models.PositiveIntegerField()
+    end_offset = models.PositiveIntegerField()
+    content = models.TextField()
+    embedding = VectorField(dimensions=768)
+
+    # 문서와 같은 방식의 전문 검색용 tsvector (하이브리드 검색)
+    search_vector = models.GeneratedField(
+        expression=SearchVector('content', config='simple'),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        ordering = ['memory', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['memory', 'position'], name='unique_wiki_passage_position'),
+        ]
+        indexes = [
+            HnswIndex(name='wikipassage_emb_hnsw', fields=['embedding'], m=16, ef_construction=64, opclasses=['vector_cosine_ops']),
+            GinIndex(name='wikipassage_search_gin', fields=['search_vector']),
+        ]
+
+    def __str__(self):
+        return f"[Wiki] {self.memory_id} #{self.position}"
+
+
+class CachedEmbedding(models.Model):
+    """
+    임베딩 캐시 (영속 계층). (모델, 텍스트 sha256) 이 같으면 임베딩 모델을 다시 호출하지 않습니다.
+    모델마다 차원이 다를 수 있으므로 벡터 차원은 고정하지 않습니다.
+    """
+    model = models.CharField(max_length=255)
+    text_hash = models.CharField(max_length=64)
+    embedding = VectorField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'text_hash'], name='unique_cached_embedding'),
+        ]
+
+    def __str__(self):
+        return f"[Embedding] {self.model} {self.text_hash[:12]}"
+
+
+class CachedLLMResponse(models.Model):
+    """
+    [추가] LLM 응답 캐시 (영속 계층). temperature=0 호출은 (모델, 옵션, 메시지, 도구 명세)가 같으면 응답도 같으므로
+    같은 결재안 재검토 / 같은 URL 재요약 때 모델을 다시 호출하지 않습니다. 만료(expires_at)와 최대 개수로 크기를 제한합니다.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=255)
+    purpose = models.CharField(max_length=32)
+    response = models.TextField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_hit_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"[LLM Cache] {self.model} / {self.purpose} {self.key[:12]}"
+
+
+class LLMCall(models.Model):
+    """
+    [추가] LLM 호출 1건의 토큰 수 / 소요 시간 (Ollama 응답의 prompt_eval_count, eval_count, *_duration).
+    corp.llm_accounting이 모아서 일괄(bulk) 저장하는 추가 전용 로그이므로, 행을 작게 두고 외래 키 제약을 걸지 않습니다
+    (에이전트 / 태스크가 지워져도 사용량 기록은 남고, 저장할 때 잠금 / 검사 비용이 없음).
+    """
+    created_at = models.DateTimeField(default=timezone.now)
+    owner = models.ForeignKey(User, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='+')
+    agent = models.ForeignKey(Agent, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='+')
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='+')
+    model = models.CharField(max_length=100)
+    purpose = models.CharField(max_length=32)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    # 소요 시간(ms): 프롬프트 평가 / 생성 / 모델 로드 / Ollama 전체, wall_ms는 호출한 쪽에서 잰 왕복 시간
+    prompt_ms = models.PositiveIntegerField(default=0)
+    eval_ms = models.PositiveIntegerField(default=0)
+    load_ms = models.PositiveIntegerField(default=0)
+    total_ms = models.PositiveIntegerField(default=0)
+    wall_ms = models.PositiveIntegerField(default=0)
+    cache_hit = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(name='llmcall_owner_created_idx', fields=['owner', 'created_at']),
+            models.Index(name='llmcall_created_idx', fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"[LLM Call] {self.model} / {self.purpose} {self.total_ms}ms"
+
+
+class ArchiveJob(models.Model):
+    """
+    [추가] 승인된 태스크 결과를 위키에 저장하는 작업 큐 (영속).
+    태스크는 작업 완료 즉시 DONE이 되고, 임베딩/위키 저장은 아카이브 워커가 재시도(백오프)하며 처리합니다.
+    """
+    class JobStatus(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    class JobKind(models.TextChoices):
+        ARCHIVE = 'ARCHIVE', 'Archive task result'
+        # [추가] 관리자 화면 등에서 고친 위키 문서(memory)의 문서 임베딩과 구간을 다시 만듦
+        REEMBED = 'REEMBED', 'Re-embed document'
+
+    kind = models.CharField(max_length=10, choices=JobKind.choices, default=JobKind.ARCHIVE)
+    task = models.ForeignKey(Task, on_delete=models.SET_NULL, null=True, blank=True, related_name='archive_jobs')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archive_jobs')
+    subject = models.CharField(max_length=255)
+    content = models.TextField()
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    # 처리 중인 워커와 점유 만료 시각 (워커가 죽으면 만료 후 다른 워커가 이어서 처리)
+    locked_by = models.CharField(max_length=255, null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    memory = models.ForeignKey(CorporateMemory, on_delete=models.SET_NULL, null=True, blank=True, related_name='archive_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(name='archivejob_due_idx', fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"[Archive] {self.subject} ({self.status})"
+
+
 class Channel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=50, unique=True)
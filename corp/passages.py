@@ -0,0 +1,91 @@
+import os
+import re
+from ai_core.tokens import estimate_tokens
+
+# 구간(Passage) 하나의 목표 크기와 앞 구간과 겹칠 크기 (토큰 기준)
+PASSAGE_TOKENS = int(os.getenv("WIKI_PASSAGE_TOKENS", "200"))
+PASSAGE_OVERLAP_TOKENS = int(os.getenv("WIKI_PASSAGE_OVERLAP_TOKENS", "40"))
+
+# 문단 / 문장 단위로 자르기 위한 경계 (경계 뒤의 공백까지 앞 조각에 포함)
+_SEGMENT_RE = re.compile(r".+?(?:\n\s*\n|[.!?。](?=\s)|\n|$)\s*", re.DOTALL)
+
+
+def _segments(text: str, max_tokens: int):
+    """text를 (start, end) 문장/문단 조각으로 나눕니다. max_tokens보다 긴 조각은 공백 기준으로 다시 나눔."""
+    max_tokens = max(1, max_tokens)
+    for match in _SEGMENT_RE.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        while estimate_tokens(text[start:end]) > max_tokens:
+            # 한 문장이 구간 크기를 넘으면 구간 크기에 맞는 위치(가능하면 공백)에서 자름
+            low, high = start + 1, end
+            while low < high:
+                mid = (low + high + 1) // 2
+                if estimate_tokens(text[start:mid]) <= max_tokens:
+                    low = mid
+                else:
+                    high = mid - 1
+            cut = text.rfind(" ", start + 1, low)
+            cut = cut + 1 if cut > start + (low - start) // 2 else low
+            yield start, cut
+            start = cut
+        if start < end:
+            yield start, end
+
+
+def split_passages(text: str, max_tokens: int = PASSAGE_TOKENS, overlap_tokens: int = PASSAGE_OVERLAP_TOKENS):
+    """
+    text를 max_tokens 이내의 구간으로 나누고 (start, end) 문자 위치 목록을 반환합니다.
+    문장 경계를 유지하며, 구간 경계에 걸친 내용도 찾을 수 있도록 앞 구간의 끝 문장 일부(overlap_tokens)를 겹쳐 둡니다.
+    """
+    segments = list(_segments(text, max_tokens))
+    passages = []
+    index = 0
+    while index < len(segments):
+        first = index
+        tokens = 0
+        while index < len(segments):
+            size = estimate_tokens(text[segments[index][0]:segments[index][1]])
+            if index > first and tokens + size > max_tokens:
+                break
+            tokens += size
+            index += 1
+
+        start, end = segments[first][0], segments[index - 1][1]
+        # 끝 공백은 구간에서 제외 (offset으로 원문을 잘라 보여줄 때 깔끔하게)
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            passages.append((start, end))
+        if index >= len(segments):
+            break
+
+        # 다음 구간은 이번 구간의 마지막 문장들(overlap_tokens 이내)부터 다시 시작.
+        # 겹친 부분과 다음 문장이 함께 들어갈 수 있을 때만 겹침 (겹침만으로 된 구간이 생기지 않게)
+        next_size = estimate_tokens(text[segments[index][0]:segments[index][1]])
+        overlap = 0
+        back = index
+        while back - 1 > first:
+            size = estimate_tokens(text[segments[back - 1][0]:segments[back - 1][1]])
+            if overlap + size > overlap_tokens or overlap + size + next_size > max_tokens:
+                break
+            overlap += size
+            back -= 1
+        index = back
+    return passages
+
+
+def select_within_budget(passages, token_budget: int):
+    """
+    순위대로 정렬된 구간 중 토큰 예산 안에 들어가는 것만 고릅니다.
+    예산이 모자라 건너뛴 구간 뒤에 더 짧은 구간이 있으면 그것은 계속 채웁니다.
+    """
+    selected, used = [], 0
+    for passage in passages:
+        size = estimate_tokens(passage.content)
+        if used + size > token_budget:
+            continue
+        selected.append(passage)
+        used += size
+    return selected
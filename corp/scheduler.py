@@ -0,0 +1,182 @@
+import os
+from collections import defaultdict, deque
+from django.db.models import F, FloatField, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from corp.models import Task
+
+# 우선순위 노화(Aging): 대기 시간이 이 값(초)만큼 지날 때마다 유효 우선순위 +1
+AGING_SECONDS = float(os.getenv("SCHEDULER_AGING_SECONDS", "60"))
+
+# 한 번의 스케줄링에서 사용자(owner)별로 가져올 후보 태스크 수
+CANDIDATES_PER_OWNER = int(os.getenv("SCHEDULER_CANDIDATES_PER_OWNER", "20"))
+
+# 다른 모델의 작업이 기다리고 있을 때, 한 모델로 연속 배정할 최대 작업 수 (다른 모델의 기아 방지)
+MODEL_BATCH_SIZE = int(os.getenv("SCHEDULER_MODEL_BATCH_SIZE", "16"))
+
+
+def parse_owner_weights(raw: str) -> dict:
+    """'alice=2,bob=0.5' 형식의 가중치 설정을 {username: weight}로 변환합니다."""
+    weights = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            weights[name.strip()] = max(0.01, float(value))
+        except ValueError:
+            pass
+    return weights
+
+
+def fetch_candidates(queryset, per_owner: int = CANDIDATES_PER_OWNER):
+    """
+    실행 후보 태스크를 사용자(owner)별 상위 per_owner개씩만 가져옵니다.
+    한 사용자가 태스크를 수백 개 쌓아 두어도 다른 사용자의 태스크가 후보에서 밀려나지 않습니다.
+    각 태스크에는 owner_id, owner_name, effective_priority(우선순위 + 노화) 가 붙습니다.
+    """
+    table = Task._meta.db_table
+    effective_priority = RawSQL(
+        f'"{table}"."priority" + EXTRACT(EPOCH FROM (NOW() - "{table}"."updated_at")) / %s',
+        (AGING_SECONDS,),
+        output_field=FloatField(),
+    )
+    return list(
+        queryset.annotate(
+            owner_id=F('assignee__owner_id'),
+            owner_name=F('assignee__owner__username'),
+            effective_priority=effective_priority,
+            owner_rank=Window(
+                RowNumber(),
+                partition_by=[F('assignee__owner_id')],
+                order_by=[effective_priority.desc(), F('created_at').asc()],
+            ),
+        ).filter(owner_rank__lte=per_owner)
+    )
+
+
+class FairScheduler:
+    """
+    사용자(owner) 간 가중 공정 큐잉(Weighted Fair Queuing) 스케줄러.
+    - 사용자마다 가상 시간(virtual time)을 두고, 작업을 하나 배정할 때마다 1/weight 만큼 증가시킵니다.
+    - 매 라운드 가상 시간이 가장 작은 사용자의 태스크를 먼저 배정하므로,
+      태스크 수와 무관하게 각 사용자는 가중치 비율만큼 워커 슬롯을 나눠 갖습니다.
+    - 사용자 내부에서는 유효 우선순위(priority + 대기 시간 노화) 순서를 따릅니다.
+    러너 프로세스 하나에서 루프를 돌며 계속 재사용하는 상태 객체입니다.
+    """
+
+    def __init__(self, weights=None, default_weight: float = 1.0):
+        self.weights = weights if weights is not None else parse_owner_weights(os.getenv("SCHEDULER_OWNER_WEIGHTS", ""))
+        self.default_weight = default_weight
+        self.vtime = {}
+        self.dispatched = defaultdict(int)
+        # owner_name -> 최근 배정된 태스크들의 대기 시간(초) 샘플
+        self.wait_samples = defaultdict(lambda: deque(maxlen=500))
+
+    def _weight(self, owner_name):
+        return self.weights.get(owner_name, self.default_weight)
+
+    def order(self, items):
+        """
+        (kind, task) 목록을 배정 순서대로 내보냅니다 (generator).
+        실제로 배정된 항목에 대해서는 charge()를 호출해야 가상 시간이 반영됩니다.
+        """
+        queues = defaultdict(list)
+        for kind, task in items:
+            queues[task.owner_id].append((kind, task))
+        for queue in queues.values():
+            queue.sort(key=lambda item: (-item[1].effective_priority, item[1].created_at))
+
+        # 쉬고 있던 사용자가 밀린 몫을 한꺼번에 몰아 쓰지 않도록 현재 최소 가상 시간으로 맞춤
+        active_vtimes = [self.vtime[o] for o in queues if o in self.vtime]
+        floor = min(active_vtimes) if active_vtimes else 0.0
+        for owner_id in queues:
+            self.vtime[owner_id] = max(self.vtime.get(owner_id, floor), floor)
+
+        cursors = {owner_id: 0 for owner_id in queues}
+        while cursors:
+            owner_id = min(cursors, key=lambda o: (self.vtime[o], o))
+            kind, task = queues[owner_id][cursors[owner_id]]
+            cursors[owner_id] += 1
+            if cursors[owner_id] >= len(queues[owner_id]):
+                del cursors[owner_id]
+            yield kind, task
+
+    def charge(self, task):
+        """태스크를 실제로 워커에 배정했음을 기록합니다."""
+        self.vtime[task.owner_id] = self.vtime.get(task.owner_id, 0.0) + 1.0 / self._weight(task.owner_name)
+        self.dispatched[task.owner_name] += 1
+        waited = (timezone.now() - task.updated_at).total_seconds()
+        self.wait_samples[task.owner_name].append(max(0.0, waited))
+
+    def stats(self):
+        """사용자별 배정 대기 시간 통계 (p50 / p95, 초)"""
+        result = {}
+        for owner_name, samples in self.wait_samples.items():
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            result[owner_name] = {
+                "dispatched": self.dispatched[owner_name],
+                "p50": ordered[int(0.50 * (len(ordered) - 1))],
+                "p95": ordered[int(0.95 * (len(ordered) - 1))],
+            }
+        return result
+
+
+class ModelBatcher:
+    """
+    모델별 배치(batch) 배정기.
+    에이전트마다 모델이 다를 때 공정 큐 순서대로만 배정하면 연속된 태스크가 모델을 번갈아 사용하여
+    Ollama가 매번 모델을 내리고 다시 올리게(thrashing) 됩니다.
+    - 후보를 모델별로 묶고, 직전에 배정하던 모델의 작업을 먼저 배정합니다 (모델 내부 순서는 FairScheduler).
+    - 그 모델의 후보가 없을 때(또는 다른 모델이 기다리는 동안 batch_size개를 연속 배정했을 때)만
+      다음 모델로 넘어가며, 이미 로드된 모델 -> 가장 오래 기다린 작업이 있는 모델 순으로 고릅니다.
+    러너 프로세스 하나에서 루프를 돌며 계속 재사용하는 상태 객체입니다.
+    """
+
+    def __init__(self, batch_size: int = MODEL_BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+        self.current = None
+        self.streak = 0
+        self.switches = 0
+        self.dispatched = defaultdict(int)
+
+    @staticmethod
+    def group(items, model_of):
+        """(kind, task) 목록을 {모델: [(kind, task), ...]} 로 묶습니다."""
+        groups = defaultdict(list)
+        for kind, task in items:
+            groups[model_of(kind, task)].append((kind, task))
+        return groups
+
+    def sequence(self, groups, is_loaded=None):
+        """배정할 모델 순서. 첫 번째가 이번에 몰아서 배정할 모델입니다."""
+        def waited(model):
+            # 가장 오래 기다린 후보의 대기 기준 시각 (작을수록 오래 기다림)
+            return min(task.updated_at for _, task in groups[model])
+
+        others = sorted(
+            (m for m in groups if m != self.current),
+            key=lambda m: (not (is_loaded and is_loaded(m)), waited(m), m),
+        )
+        if self.current not in groups:
+            return others
+        if self.streak >= self.batch_size and others:
+            # 한도만큼 몰아서 배정했으므로 기다리는 다른 모델에 차례를 넘김
+            return others + [self.current]
+        return [self.current] + others
+
+    def charge(self, model):
+        """모델로 작업 하나를 배정했음을 기록합니다."""
+        if model != self.current:
+            if self.current is not None:
+                self.switches += 1
+            self.current = model
+            self.streak = 0
+        self.streak += 1
+        self.dispatched[model] += 1
+
+    def stats(self):
+        return {"switches": self.switches, "dispatched": dict(self.dispatched)}
@@ -1,5 +1,6 @@
 from corp.models import Agent, Task, TaskLog
 from django.conf import settings
+from corp.task_events import notify_task_changed
 
 MAX_AGENT_DEPTH = 5
 
@@ -124,12 +125,16 @@ def assign_task(manager_name: str, assignee_name: str, title: str, description:
             creator=manager,
             assignee=assignee,
             parent_task=parent_task,  # [핵심] 부모 태스크 연결
-            status=Task.TaskStatus.THINKING
+            status=Task.TaskStatus.THINKING,
+            priority=parent_task.priority  # 하위 업무는 상위 업무의 우선순위를 물려받음
         )
         
         # 2. 부모 태스크 상태 변경 (대기 상태로 전환)
         parent_task.status = Task.TaskStatus.WAIT_SUBTASK
-        parent_task.save()
+        # [변경] 바꾼 필드만 저장 (러너의 lease 필드 / 동시에 저장되는 결과를 덮어쓰지 않도록)
+        parent_task.save(update_fields=['status', 'updated_at'])
+        notify_task_changed(sub_task)
+        notify_task_changed(parent_task)
 
         return f"Success: Task assigned to {assignee_name}. I am now waiting for their report."
     except Exception as e:
@@ -145,7 +150,8 @@ def ask_manager(agent_name: str, current_task_id: str, question: str) -> str:
         
         # 상태를 결재 대기(WAIT_APPROVAL)로 변경하여 대시보드에 노출시킴
         task.status = Task.TaskStatus.WAIT_ANSWER
-        task.save()
+        task.save(update_fields=['result', 'status', 'updated_at'])
+        notify_task_changed(task)
         
         return "Success: Question sent to manager. Waiting for feedback."
     except Task.DoesNotExist:
@@ -178,7 +184,8 @@ def reply_to_subordinate(manager_name: str, subordinate_task_id: str, answer: st
         # 3. 부하 깨우기
         sub_task.feedback = f"[Manager Answered]: {answer}"
         sub_task.status = Task.TaskStatus.THINKING
-        sub_task.save()
+        sub_task.save(update_fields=['feedback', 'status', 'updated_at'])
+        notify_task_changed(sub_task)
         
         return f"Success: Sent answer to {subordinate.name}. They are back to work."
 
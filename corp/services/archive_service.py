@@ -0,0 +1,229 @@
+import os
+import random
+import threading
+from datetime import timedelta
+from django.db import connections, transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+from ai_core.llm_gateway import llm_call_context
+from corp.models import ArchiveJob, CorporateMemory
+from corp.services import kms_service
+from corp.task_events import ARCHIVE_EVENT_CHANNEL, TaskEventListener, notify_archive_job
+
+# 재시도 백오프: ARCHIVE_RETRY_BASE * 2^(시도 횟수-1) 초 (최대 ARCHIVE_RETRY_MAX), 여러 워커가 몰리지 않도록 jitter
+ARCHIVE_RETRY_BASE = float(os.getenv("ARCHIVE_RETRY_BASE", "30"))
+ARCHIVE_RETRY_MAX = float(os.getenv("ARCHIVE_RETRY_MAX", "3600"))
+
+# 이 횟수만큼 실패하면 FAILED로 두고 더 이상 재시도하지 않음 (관리자 화면에서 확인 후 다시 PENDING으로 바꿀 수 있음)
+ARCHIVE_MAX_ATTEMPTS = int(os.getenv("ARCHIVE_MAX_ATTEMPTS", "8"))
+
+# 워커가 작업을 점유하는 시간(초). 모델 Pull처럼 오래 걸리는 경우를 고려해 넉넉하게
+ARCHIVE_LEASE_SECONDS = int(os.getenv("ARCHIVE_LEASE_SECONDS", "900"))
+
+# 한 번에 점유해 처리할 작업 수
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "8"))
+
+
+class ArchiveError(RuntimeError):
+    """위키 저장에 실패했음 (재시도 대상)"""
+
+
+def enqueue_task_result(task):
+    """
+    승인된 태스크의 결과를 위키 저장 작업으로 등록합니다.
+    태스크 상태 저장과 같은 트랜잭션에서 호출하면, 상태 저장이 롤백될 때 작업도 함께 사라집니다.
+    """
+    job = ArchiveJob.objects.create(
+        task=task,
+        owner=task.assignee.owner,
+        subject=f"Result of: {task.title}"[:255],
+        content=task.result or "",
+    )
+    notify_archive_job(job)
+    return job
+
+
+def enqueue_reembed(memory):
+    """
+    [추가] 고친 위키 문서의 문서 임베딩 / 구간을 다시 만드는 작업을 등록합니다 (임베딩은 아카이브 워커가 처리).
+    처리 시점의 최신 내용으로 임베딩하므로, 여러 번 고쳐도 마지막 내용이 반영됩니다.
+    """
+    job = ArchiveJob.objects.create(
+        kind=ArchiveJob.JobKind.REEMBED,
+        owner_id=memory.owner_id,
+        memory=memory,
+        subject=memory.subject[:255],
+        content='',
+    )
+    notify_archive_job(job)
+    return job
+
+
+def retry_delay(attempts: int) -> float:
+    """지수 백오프 + jitter (시도 횟수 기준, 초)"""
+    delay = min(ARCHIVE_RETRY_MAX, ARCHIVE_RETRY_BASE * (2 ** max(0, attempts - 1)))
+    return random.uniform(delay / 2, delay)
+
+
+def claim_jobs(worker_id: str, limit: int = ARCHIVE_BATCH_SIZE, lease_seconds: int = ARCHIVE_LEASE_SECONDS):
+    """
+    실행할 때가 된 작업을 점유합니다 (SELECT ... FOR UPDATE SKIP LOCKED).
+    점유가 만료된 RUNNING 작업(죽은 워커가 남긴 것)도 다시 가져옵니다.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            ArchiveJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ArchiveJob.JobStatus.PENDING, next_attempt_at__lte=now) |
+                Q(status=ArchiveJob.JobStatus.RUNNING, locked_until__lte=now)
+            )
+            .order_by('next_attempt_at')[:limit]
+        )
+        for job in jobs:
+            job.status = ArchiveJob.JobStatus.RUNNING
+            job.attempts += 1
+            job.locked_by = worker_id
+            job.locked_until = now + timedelta(seconds=lease_seconds)
+            job.updated_at = now
+        ArchiveJob.objects.bulk_update(jobs, ['status', 'attempts', 'locked_by', 'locked_until', 'updated_at'])
+    return jobs
+
+
+def renew_lease(job, worker_id: str, lease_seconds: int = ARCHIVE_LEASE_SECONDS) -> bool:
+    """
+    [추가] 처리 직전에 점유를 연장합니다. 한 묶음으로 점유한 작업은 앞 작업을 처리하는 동안 점유가 만료될 수 있으므로,
+    점유자가 여전히 이 워커일 때만 연장하고 아니면(다른 워커가 가져감) False를 반환합니다.
+    """
+    now = timezone.now()
+    locked_until = now + timedelta(seconds=lease_seconds)
+    renewed = ArchiveJob.objects.filter(
+        id=job.id, locked_by=worker_id, status=ArchiveJob.JobStatus.RUNNING,
+    ).update(locked_until=locked_until, updated_at=now) == 1
+    if renewed:
+        job.locked_until = locked_until
+    return renewed
+
+
+def _finish(job, worker_id, **fields):
+    # 점유를 잃었다면(만료 후 다른 워커가 가져감) 결과를 덮어쓰지 않음
+    fields.update(locked_by=None, locked_until=None, updated_at=timezone.now())
+    return ArchiveJob.objects.filter(id=job.id, locked_by=worker_id).update(**fields) == 1
+
+
+def process_job(job, worker_id: str) -> bool:
+    """작업 하나를 처리합니다. Returns: 위키 저장 성공 여부"""
+    try:
+        # [변경] 위키 저장 임베딩의 GPU 사용량도 태스크 소유자에게 집계되도록 호출 정보를 붙임
+        with llm_call_context(owner_id=job.owner_id, task_id=job.task_id):
+            if job.kind == ArchiveJob.JobKind.REEMBED:
+                if job.memory_id is None:
+                    # 처리 전에 문서가 삭제됨 (다시 만들 임베딩이 없음)
+                    _finish(job, worker_id, status=ArchiveJob.JobStatus.DONE, last_error='')
+                    return True
+                memory = kms_service.reembed_knowledge(
+                    CorporateMemory.objects.defer('embedding', 'search_vector').get(pk=job.memory_id)
+                )
+            else:
+                memory = kms_service.add_knowledge(
+                    owner=job.owner,
+                    subject=job.subject,
+                    content=job.content,
+                    source_task_id=job.task_id,
+                )
+        if memory is None:
+            # (모델 다운로드 실패 등으로 임베딩을 만들지 못함)
+            raise ArchiveError("Failed to create embedding.")
+    except Exception as e:
+        if job.attempts >= ARCHIVE_MAX_ATTEMPTS:
+            _finish(job, worker_id, status=ArchiveJob.JobStatus.FAILED, last_error=str(e))
+            print(f"❌ [Archive] '{job.subject}' failed {job.attempts} times. Giving up: {e}")
+        else:
+            delay = retry_delay(job.attempts)
+            _finish(
+                job, worker_id,
+                status=ArchiveJob.JobStatus.PENDING,
+                next_attempt_at=timezone.now() + timedelta(seconds=delay),
+                last_error=str(e),
+            )
+            print(f"⚠️ [Archive] '{job.subject}' failed (attempt {job.attempts}). Retrying in {delay:.0f}s: {e}")
+        return False
+
+    _finish(job, worker_id, status=ArchiveJob.JobStatus.DONE, memory=memory, last_error='')
+    print(f"💾 [Archive] '{job.subject}' saved to Corporate Wiki.")
+    return True
+
+
+def run_pending(worker_id: str, limit: int = ARCHIVE_BATCH_SIZE):
+    """실행할 때가 된 작업을 한 묶음 처리합니다. Returns: (처리한 작업 수, 성공 수)"""
+    jobs = claim_jobs(worker_id, limit)
+    saved = 0
+    for job in jobs:
+        if not renew_lease(job, worker_id):
+            # 점유가 만료되어 다른 워커가 가져간 작업은 건너뜀 (같은 결과를 두 번 저장하지 않도록)
+            print(f"⏭️ [Archive] Lost lease on '{job.subject}'. Skipping.")
+            continue
+        saved += process_job(job, worker_id)
+    return len(jobs), saved
+
+
+def seconds_until_next_job(default: float):
+    """다음 재시도 예정 작업까지 남은 시간(초). 대기 중인 작업이 없으면 default"""
+    next_at = ArchiveJob.objects.filter(status=ArchiveJob.JobStatus.PENDING).aggregate(t=Min('next_attempt_at'))['t']
+    if next_at is None:
+        return default
+    return max(0.0, min(default, (next_at - timezone.now()).total_seconds()))
+
+
+class ArchiveWorker:
+    """
+    아카이브 작업 큐를 처리하는 루프. 새 작업 알림(LISTEN)이나 다음 재시도 시각에 깨어납니다.
+    run_archiver 명령에서 단독으로 돌리거나, 러너(run_agents)가 백그라운드 스레드로 함께 돌립니다.
+    """
+
+    def __init__(self, worker_id: str, poll_interval: float = 30, batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.worker_id = worker_id
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.processed = 0
+        self.saved = 0
+        self._stop = threading.Event()
+        self._listener = TaskEventListener(channel=ARCHIVE_EVENT_CHANNEL)
+        self._thread = None
+
+    def run(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    processed, saved = run_pending(self.worker_id, self.batch_size)
+                    self.processed += processed
+                    self.saved += saved
+                    if processed >= self.batch_size:
+                        # 한 묶음을 다 채웠다면 남은 작업이 있을 수 있으므로 바로 다음 묶음 처리
+                        continue
+                    timeout = seconds_until_next_job(self.poll_interval)
+                except Exception as e:
+                    print(f"⚠️ [Archive] Worker error: {e}")
+                    connections.close_all()
+                    timeout = self.poll_interval
+                if not self._stop.is_set():
+                    self._listener.wait(timeout)
+        finally:
+            connections.close_all()
+
+    def start(self):
+        """백그라운드(daemon) 스레드로 실행합니다."""
+        self._thread = threading.Thread(target=self.run, name='archive-worker', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        """루프를 멈추고 (스레드로 실행 중이면 끝날 때까지 기다린 뒤) LISTEN 커넥션을 닫습니다."""
+        self._stop.set()
+        self._listener.wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._listener.close()
+
+    def stats(self):
+        return {"processed": self.processed, "saved": self.saved}
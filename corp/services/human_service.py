@@ -1,6 +1,7 @@
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from corp.models import Agent, Task, TaskLog
+from corp.task_events import notify_task_changed
 from ai_core.tools.registry import TIER_1_REGISTRY
 
 # ==============================================================================
@@ -40,17 +41,20 @@ def fire_agent(user: User, agent_id: str):
 # [Human CEO Only] 업무 지시 및 결재 (Task & Approval)
 # ==============================================================================
 
-def create_task(user: User, title: str, description: str, assignee_id: str) -> Task:
+def create_task(user: User, title: str, description: str, assignee_id: str, priority: int = Task.TaskPriority.NORMAL) -> Task:
     """사람(CEO)이 업무를 지시합니다."""
     assignee = get_object_or_404(Agent, id=assignee_id, owner=user)
     
-    return Task.objects.create(
+    task = Task.objects.create(
         title=title,
         description=description,
         assignee=assignee,
         creator=None, # creator가 None이면 'Human'이 만든 것
-        status=Task.TaskStatus.THINKING
+        status=Task.TaskStatus.THINKING,
+        priority=priority
     )
+    notify_task_changed(task)
+    return task
 
 def approve_task(user: User, task_id: str) -> Task:
     """사람(CEO)이 업무 결과를 승인합니다."""
@@ -65,7 +69,7 @@ def approve_task(user: User, task_id: str) -> Task:
         if requested_tool not in current_tools:
             current_tools.append(requested_tool)
             agent.allowed_tools = current_tools
-            agent.save()
+            agent.save(update_fields=['allowed_tools', 'updated_at'])
         task.feedback = f"[System] CEO approved purchase of '{requested_tool}' license."
 
     # [시스템 로직] 기능 개발 요청 승인 처리
@@ -77,7 +81,9 @@ def approve_task(user: User, task_id: str) -> Task:
         )
 
     task.status = Task.TaskStatus.APPROVED
-    task.save()
+    # [변경] 바꾼 필드만 저장 (러너가 쥔 lease 필드 / 러너가 저장한 결과를 덮어쓰지 않도록)
+    task.save(update_fields=['status', 'feedback', 'updated_at'])
+    notify_task_changed(task)
     return task
 
 def reject_task(user: User, task_id: str, feedback: str) -> Task:
@@ -94,7 +100,8 @@ def reject_task(user: User, task_id: str, feedback: str) -> Task:
     
     task.status = Task.TaskStatus.THINKING
     task.feedback = feedback
-    task.save()
+    task.save(update_fields=['status', 'feedback', 'updated_at'])
+    notify_task_changed(task)
     return task
 
 def reply_question(user: User, task_id: str, answer: str) -> Task:
@@ -110,7 +117,8 @@ def reply_question(user: User, task_id: str, answer: str) -> Task:
     
     task.status = Task.TaskStatus.THINKING
     task.feedback = answer
-    task.save()
+    task.save(update_fields=['status', 'feedback', 'updated_at'])
+    notify_task_changed(task)
     return task
 
 def mark_feature_deployed(user: User, task_id: str) -> Task:
@@ -118,7 +126,8 @@ def mark_feature_deployed(user: User, task_id: str) -> Task:
     task = get_object_or_404(Task, id=task_id, assignee__owner=user)
     task.status = Task.TaskStatus.DONE
     task.result += "\n\n[System] ✅ Feature Deployed & Server Updated."
-    task.save()
+    task.save(update_fields=['status', 'result', 'updated_at'])
+    notify_task_changed(task)
     return task
 
 # ==============================================================================
@@ -135,7 +144,8 @@ def force_update_status(user: User, task_id: str, action: str) -> Task:
         task.status = Task.TaskStatus.THINKING
         task.feedback = "[Admin]: Forced Reset/Reject to retry."
         
-    task.save()
+    task.save(update_fields=['status', 'result', 'feedback', 'updated_at'])
+    notify_task_changed(task)
     return task
 
 def force_delete_task(user: User, task_id: str):
@@ -1,6 +1,11 @@
-from corp.models import CorporateMemory, Task
-from ai_core.llm_gateway import OllamaClient
-from pgvector.django import L2Distance
+from corp.models import CorporateMemory, Task, WikiPassage
+from ai_core.llm_gateway import OllamaClient, llm_limiter
+from corp.embedding_cache import embedding_cache, text_hash
+from corp.vector_search import nearest
+from corp.text_search import keyword_search, reciprocal_rank_fusion
+from corp.passages import split_passages, select_within_budget
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
 import os
 import requests
 import time
@@ -8,7 +13,33 @@ import time
 # 전역 임베딩 모델 설정
 EMBEDDING_MODEL = "nomic-embed-text" 
 
+# 배치 임베딩 요청 한 번에 보낼 텍스트 수
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+# 위키 검색 방식: 'hybrid' (벡터 + 전문 검색 순위 결합) | 'vector' | 'keyword'
+WIKI_SEARCH_MODE = os.getenv("WIKI_SEARCH_MODE", "hybrid")
+
+# 하이브리드 검색에서 각 검색 방식이 순위 결합 전에 가져올 최소 후보 수
+WIKI_HYBRID_CANDIDATES = int(os.getenv("WIKI_HYBRID_CANDIDATES", "20"))
+
+# 구간(Passage) 검색 결과로 에이전트 컨텍스트에 넣을 최대 토큰 수
+WIKI_PASSAGE_TOKEN_BUDGET = int(os.getenv("WIKI_PASSAGE_TOKEN_BUDGET", "800"))
+
+# 같은 사용자의 기존 문서와 코사인 유사도가 이 값 이상이면 새로 저장하지 않고 기존 문서를 갱신 (0이면 끔)
+WIKI_DEDUP_THRESHOLD = float(os.getenv("WIKI_DEDUP_THRESHOLD", "0.95"))
+
 def get_embedding(text: str):
+    """
+    텍스트를 벡터로 변환합니다.
+    [추가] 같은 (모델, 텍스트)는 임베딩 캐시(프로세스 LRU -> DB)에서 바로 반환합니다.
+    """
+    cached = embedding_cache.get(EMBEDDING_MODEL, text)
+    if cached is not None:
+        return cached
+
+    return embedding_cache.put(EMBEDDING_MODEL, text, _request_embedding(text))
+
+def _request_embedding(text: str):
     """
     Ollama를 통해 텍스트를 벡터로 변환합니다.
     모델이 없으면 자동으로 Pull을 시도합니다.
@@ -16,12 +47,17 @@ def get_embedding(text: str):
     client = OllamaClient()
     
     def _attempt_embedding():
-        response = client.embeddings(model=EMBEDDING_MODEL, prompt=text)
+        with llm_limiter.slot(EMBEDDING_MODEL, "embedding"):
+            response = client.embeddings(model=EMBEDDING_MODEL, prompt=text)
         return response.get('embedding')
 
+    return _attempt_with_model_pull(client, _attempt_embedding, [])
+
+def _attempt_with_model_pull(client, attempt, default):
+    """임베딩 호출을 시도하고, 모델이 없어서 실패했다면 Pull 후 한 번 더 시도합니다."""
     try:
         # 1차 시도
-        return _attempt_embedding()
+        return attempt()
         
     except Exception as e:
         print(f"⚠️ [KMS] Embedding failed initially: {e}")
@@ -46,19 +82,132 @@ def get_embedding(text: str):
                 time.sleep(2)
                 
                 # 2차 시도 (재귀 호출 아님)
-                return _attempt_embedding()
+                return attempt()
                 
             except Exception as pull_error:
                 print(f"❌ [KMS] Critical: Failed to pull model '{EMBEDDING_MODEL}': {pull_error}")
-                return []
+                return default
         else:
             # 모델 미싱 외의 다른 에러인 경우
             print(f"❌ [KMS] Embedding Error: {e}")
-            return []
+            return default
+
+def get_embeddings(texts, batch_size: int = EMBEDDING_BATCH_SIZE):
+    """
+    여러 텍스트를 한 번에 벡터로 변환합니다 (/api/embed 배치 호출).
+    캐시에 있는 텍스트는 건너뛰고, 나머지는 batch_size개씩 묶어 요청합니다.
+    Returns: 입력 순서와 같은 벡터 목록 (실패한 항목은 [])
+    """
+    texts = list(texts)
+    vectors = embedding_cache.get_many(EMBEDDING_MODEL, texts)
+    # 같은 텍스트가 여러 번 있어도 한 번만 요청
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    if not missing:
+        return vectors
+
+    client = OllamaClient()
+    computed = {}
+    for start in range(0, len(missing), max(1, batch_size)):
+        chunk = missing[start:start + batch_size]
+
+        def _attempt_batch():
+            with llm_limiter.slot(EMBEDDING_MODEL, "embedding"):
+                return client.embed(model=EMBEDDING_MODEL, inputs=chunk).get('embeddings') or []
+
+        chunk_vectors = _attempt_with_model_pull(client, _attempt_batch, [])
+        if len(chunk_vectors) != len(chunk):
+            print(f"❌ [KMS] Batch embedding returned {len(chunk_vectors)} vectors for {len(chunk)} inputs. Skipping chunk.")
+            continue
+        stored = embedding_cache.put_many(EMBEDDING_MODEL, chunk, chunk_vectors)
+        computed.update(zip(chunk, stored))
+
+    return [v if v is not None else computed.get(t, []) for t, v in zip(texts, vectors)]
+
+async def aget_embedding(text: str):
+    """
+    get_embedding()의 asyncio 버전. 정상 경로는 이벤트 루프를 막지 않고 호출하며,
+    실패 시(모델 Pull 등)에는 기존 동기 로직을 별도 스레드에서 실행합니다.
+    """
+    cached = await sync_to_async(embedding_cache.get, thread_sensitive=False)(EMBEDDING_MODEL, text)
+    if cached is not None:
+        return cached
+
+    client = OllamaClient()
+    try:
+        async with llm_limiter.aslot(EMBEDDING_MODEL, "embedding"):
+            response = await client.aembeddings(model=EMBEDDING_MODEL, prompt=text)
+        vector = response.get('embedding')
+    except Exception as e:
+        print(f"⚠️ [KMS] Async embedding failed, falling back to sync path: {e}")
+        vector = await sync_to_async(_request_embedding, thread_sensitive=False)(text)
+
+    return await sync_to_async(embedding_cache.put, thread_sensitive=False)(EMBEDDING_MODEL, text, vector)
+
+def content_hash(content: str) -> str:
+    """중복 판정용 본문 해시 (공백 차이와 대소문자는 무시)"""
+    return text_hash(" ".join(content.split()).casefold())
+
+def find_near_duplicate(owner_id, vector, threshold: float = None, exclude=()):
+    """
+    [추가] 같은 사용자의 위키에서 vector와 코사인 유사도가 threshold 이상인 가장 가까운 문서를 찾습니다. 없으면 None.
+    """
+    threshold = WIKI_DEDUP_THRESHOLD if threshold is None else threshold
+    if threshold <= 0 or vector is None or len(vector) == 0:
+        return None
+    memories = _wiki_queryset(owner_id).exclude(pk__in=list(exclude)).defer('embedding', 'search_vector')
+    hits = nearest(memories, 'embedding', vector, 1, distance='cosine')
+    if hits and 1.0 - hits[0].distance >= threshold:
+        return hits[0]
+    return None
+
+def merge_knowledge(memory, content: str, vector=None, source_task=None, versions: int = 1):
+    """
+    [추가] 거의 같은 문서를 새 행으로 추가하는 대신 기존 문서를 최신 내용으로 갱신하고 버전을 올립니다.
+    문서 ID(위키 링크)와 제목(subject)은 유지하고, 구간(Passage)도 새 내용으로 다시 만듭니다.
+    vector: f"{memory.subject}\n{content}"의 임베딩 (제목이 다른 문서의 임베딩이면 생략 -> 새로 만듦)
+    Returns: 갱신된 문서. 임베딩에 실패하면 None
+    [변경] 같은 본문의 문서가 이미 있으면(동시 저장) 갱신하지 않고 그 문서를 반환합니다.
+    """
+    if vector is None:
+        vector = get_embedding(f"{memory.subject}\n{content}")
+    if vector is None or len(vector) == 0:
+        print(f"❌ [KMS] Failed to create embedding for '{memory.subject}'. Skipping merge.")
+        return None
+
+    memory.content = content
+    memory.embedding = vector
+    memory.content_hash = content_hash(content)
+    memory.version += versions
+    if source_task is not None:
+        memory.source_task = source_task
+    try:
+        with transaction.atomic():
+            memory.save(update_fields=['content', 'embedding', 'content_hash', 'version', 'source_task'])
+    except IntegrityError:
+        existing = _same_content(memory.owner_id, memory.content_hash)
+        if existing is None:
+            # 같은 본문 충돌이 아닌 무결성 오류 (또는 충돌한 문서가 그 사이 삭제됨)
+            raise
+        return existing
+    save_passages([memory])
+    return memory
+
+def _same_content(owner_id, hash_):
+    return CorporateMemory.objects.filter(owner_id=owner_id, content_hash=hash_).defer('embedding', 'search_vector').first()
 
 def add_knowledge(owner, subject: str, content: str, source_task_id: int = None):
-    """지식을 벡터화하여 위키에 저장합니다."""
-    
+    """
+    지식을 벡터화하여 위키에 저장합니다.
+    [변경] 재시도 / 반복 태스크로 같은 내용이 쌓이지 않도록 저장 전에 중복을 확인합니다.
+    - 본문 해시가 같은 문서가 있으면 저장하지 않고 그 문서를 반환 (사용자별 (owner, content_hash) 유일 제약으로 동시 저장도 보장)
+    - 코사인 유사도가 WIKI_DEDUP_THRESHOLD 이상인 문서가 있으면 그 문서를 새 내용으로 갱신(버전 +1, 제목은 유지)
+    """
+    hash_ = content_hash(content)
+    existing = _same_content(owner.id, hash_)
+    if existing:
+        print(f"📚 [KMS] Duplicate of '{existing.subject}' (same content). Skipping Wiki save.")
+        return existing
+
     # 임베딩 시도 (위에서 수정한 get_embedding 함수가 호출됨)
     vector = get_embedding(f"{subject}\n{content}")
     
@@ -71,25 +220,202 @@ def add_knowledge(owner, subject: str, content: str, source_task_id: int = None)
     if source_task_id:
         source_task = Task.objects.filter(id=source_task_id).first()
 
-    memory = CorporateMemory.objects.create(
-        owner=owner,
-        subject=subject,
-        content=content,
-        embedding=vector,
-        source_task=source_task
-    )
+    similar = find_near_duplicate(owner.id, vector)
+    if similar:
+        merged = merge_knowledge(similar, content, vector if similar.subject == subject else None, source_task)
+        if merged is not None:
+            print(f"📚 [KMS] Near-duplicate of '{merged.subject}'. Updated to v{merged.version}.")
+        return merged
+
+    try:
+        with transaction.atomic():
+            memory = CorporateMemory.objects.create(
+                owner=owner,
+                subject=subject,
+                content=content,
+                content_hash=hash_,
+                embedding=vector,
+                source_task=source_task
+            )
+    except IntegrityError:
+        # 다른 워커가 같은 본문을 먼저 저장함. 그런 문서가 없으면 다른 무결성 오류(삭제된 source_task 등)이므로 그대로 전달
+        existing = _same_content(owner.id, hash_)
+        if existing is None:
+            raise
+        print(f"📚 [KMS] Duplicate of '{existing.subject}' (saved concurrently). Skipping Wiki save.")
+        return existing
+    save_passages([memory])
     print(f"📚 [KMS] New knowledge added: {subject}")
     return memory
 
-# search_wiki는 기존 로직 유지 (get_embedding이 강화되었으므로 자동 적용됨)
-def search_wiki(query: str, top_k: int = 3):
-    """질문과 유사한 위키 문서를 검색합니다."""
-    query_vector = get_embedding(query)
-    if not query_vector:
+def add_knowledge_bulk(owner, documents, batch_size: int = EMBEDDING_BATCH_SIZE):
+    """
+    여러 문서를 배치로 임베딩하여 위키에 한꺼번에 저장합니다 (bulk_create).
+    documents: {'subject': ..., 'content': ...} 딕셔너리 목록
+    Returns: 새로 저장된 문서 수 (임베딩에 실패한 문서와 중복 문서는 건너뜀)
+    [변경] 본문 해시가 같은 문서(배치 안 / 기존 위키)는 건너뜁니다.
+    대량 적재 중 문서마다 유사도 검색을 하지 않도록 유사 문서 정리는 compact_wiki 명령에 맡깁니다.
+    """
+    documents = list(documents)
+    hashes = [content_hash(doc['content']) for doc in documents]
+    seen = set(
+        CorporateMemory.objects.filter(owner=owner, content_hash__in=set(hashes)).values_list('content_hash', flat=True)
+    )
+    unique = []
+    for doc, hash_ in zip(documents, hashes):
+        if hash_ not in seen:
+            seen.add(hash_)
+            unique.append((doc, hash_))
+    if len(unique) < len(documents):
+        print(f"📚 [KMS] Skipped {len(documents) - len(unique)} duplicate document(s).")
+    documents = [doc for doc, _ in unique]
+    vectors = get_embeddings([f"{doc['subject']}\n{doc['content']}" for doc in documents], batch_size=batch_size)
+
+    memories = [
+        CorporateMemory(owner=owner, subject=doc['subject'][:255], content=doc['content'], content_hash=hash_, embedding=vector)
+        for (doc, hash_), vector in zip(unique, vectors) if vector
+    ]
+    skipped = len(documents) - len(memories)
+    if skipped:
+        print(f"❌ [KMS] Failed to create embeddings for {skipped} document(s). Skipping Wiki save.")
+
+    # 확인 후 다른 작업이 같은 본문을 먼저 저장했으면 그 문서는 건너뜀 (pk는 미리 정해지므로 실제로 저장된 것만 다시 확인)
+    CorporateMemory.objects.bulk_create(memories, batch_size=batch_size, ignore_conflicts=True)
+    saved = set(CorporateMemory.objects.filter(pk__in=[m.pk for m in memories]).values_list('pk', flat=True))
+    memories = [m for m in memories if m.pk in saved]
+    save_passages(memories, batch_size=batch_size)
+    return len(memories)
+
+def _embed_passages(memories, batch_size: int = EMBEDDING_BATCH_SIZE):
+    """문서들을 구간(Passage)으로 나누고 구간별 임베딩을 만듭니다 (저장하지 않음). 임베딩에 실패한 구간은 빠집니다."""
+    passages = []
+    for memory in memories:
+        for position, (start, end) in enumerate(split_passages(memory.content)):
+            passages.append(WikiPassage(
+                memory=memory, position=position, start_offset=start, end_offset=end,
+                content=memory.content[start:end],
+            ))
+    if not passages:
         return []
 
-    results = CorporateMemory.objects.annotate(
-        distance=L2Distance('embedding', query_vector)
-    ).order_by('distance')[:top_k]
-    
-    return results
\ No newline at end of file
+    vectors = get_embeddings([f"{p.memory.subject}\n{p.content}" for p in passages], batch_size=batch_size)
+    for passage, vector in zip(passages, vectors):
+        passage.embedding = vector
+    embedded = [p for p in passages if p.embedding]
+    if len(embedded) < len(passages):
+        print(f"❌ [KMS] Failed to embed {len(passages) - len(embedded)} passage(s). They will be missing from passage search.")
+    return embedded
+
+def _replace_passages(memories, passages, batch_size: int = EMBEDDING_BATCH_SIZE):
+    WikiPassage.objects.filter(memory__in=[m.pk for m in memories]).delete()
+    WikiPassage.objects.bulk_create(passages, batch_size=batch_size)
+
+def save_passages(memories, batch_size: int = EMBEDDING_BATCH_SIZE):
+    """
+    [추가] 위키 문서를 구간(Passage)으로 나눠 구간별 임베딩과 함께 저장합니다 (기존 구간은 교체).
+    임베딩에는 문서 제목을 함께 넣어 구간만 떼어 놓아도 어떤 문서의 내용인지 드러나게 합니다.
+    짧은 문서는 구간이 하나뿐이라 문서 임베딩과 같은 텍스트가 되어 캐시에서 바로 재사용됩니다.
+    Returns: 저장된 구간 수
+    """
+    passages = _embed_passages(memories, batch_size)
+    if not passages:
+        return 0
+    with transaction.atomic():
+        _replace_passages(memories, passages, batch_size)
+    return len(passages)
+
+def reembed_knowledge(memory):
+    """
+    [추가] 내용이 바뀐 위키 문서의 문서 임베딩과 구간(Passage)을 현재 내용으로 다시 만듭니다.
+    임베딩을 모두 만든 뒤 한 트랜잭션에서 함께 저장하므로 문서와 구간 검색 결과가 어긋나지 않습니다.
+    Returns: 문서 (임베딩에 실패하면 None)
+    """
+    vector = get_embedding(f"{memory.subject}\n{memory.content}")
+    if not vector:
+        print(f"❌ [KMS] Failed to re-embed '{memory.subject}'.")
+        return None
+    passages = _embed_passages([memory])
+
+    memory.embedding = vector
+    with transaction.atomic():
+        memory.save(update_fields=['embedding'])
+        _replace_passages([memory], passages)
+    print(f"📚 [KMS] Re-embedded '{memory.subject}' ({len(passages)} passages).")
+    return memory
+
+def _wiki_queryset(owner_id):
+    # [변경] 위키는 사용자별 데이터이므로 항상 소유자로 한정 (owner_id가 없으면 빈 결과)
+    return CorporateMemory.objects.filter(owner_id=owner_id) if owner_id is not None else CorporateMemory.objects.none()
+
+def _passage_queryset(owner_id):
+    if owner_id is None:
+        return WikiPassage.objects.none()
+    # 원문 전체(content)와 문서 임베딩은 불러오지 않고 제목만 함께 가져옴
+    return WikiPassage.objects.filter(memory__owner_id=owner_id).select_related('memory').defer(
+        'memory__content', 'memory__embedding', 'memory__search_vector'
+    )
+
+def _search_ranked(queryset, query: str, query_vector, top_k: int, mode: str):
+    """
+    모드에 따라 벡터 / 키워드 / 하이브리드(RRF) 결과를 반환합니다.
+    queryset의 모델은 embedding(벡터)과 search_vector(tsvector) 필드를 가져야 합니다.
+    """
+    if mode == 'keyword':
+        return keyword_search(queryset, 'search_vector', query, top_k)
+    if mode == 'vector':
+        return nearest(queryset, 'embedding', query_vector, top_k) if query_vector else []
+
+    # 하이브리드: 두 검색에서 후보를 넉넉히 가져와 순위를 합친 뒤 top_k만 반환.
+    # [변경] 소유자 범위로 좁힌 뒤 HNSW(벡터) / GIN(전문 검색) 인덱스를 사용. 임베딩에 실패해도 키워드 결과만으로 응답
+    candidates = max(top_k * 4, WIKI_HYBRID_CANDIDATES)
+    vector_hits = nearest(queryset, 'embedding', query_vector, candidates) if query_vector else []
+    keyword_hits = keyword_search(queryset, 'search_vector', query, candidates)
+    return reciprocal_rank_fusion(vector_hits, keyword_hits)[:top_k]
+
+def _search_wiki_ranked(query: str, query_vector, top_k: int, owner_id, mode: str):
+    return _search_ranked(_wiki_queryset(owner_id), query, query_vector, top_k, mode)
+
+def _search_passages_ranked(query: str, query_vector, token_budget: int, owner_id, mode: str):
+    # 예산을 넘는 구간은 건너뛰므로 후보는 예산이 허용하는 것보다 넉넉하게 가져옴
+    candidates = max(WIKI_HYBRID_CANDIDATES, token_budget // 50)
+    ranked = _search_ranked(_passage_queryset(owner_id), query, query_vector, candidates, mode)
+    return select_within_budget(ranked, token_budget)
+
+def search_wiki(query: str, top_k: int = 3, *, owner_id, mode: str = None):
+    """
+    질문과 관련된 위키 문서를 owner_id 사용자의 위키에서만 검색합니다. owner_id가 None이면 빈 목록을 반환합니다.
+    mode: 'hybrid' (기본, 벡터 + 전문 검색 RRF) | 'vector' | 'keyword'. 생략하면 WIKI_SEARCH_MODE
+    """
+    if owner_id is None:
+        return []
+    mode = (mode or WIKI_SEARCH_MODE).lower()
+    query_vector = get_embedding(query) if mode != 'keyword' else None
+    return _search_wiki_ranked(query, query_vector, top_k, owner_id, mode)
+
+async def asearch_wiki(query: str, top_k: int = 3, *, owner_id, mode: str = None):
+    """search_wiki()의 asyncio 버전 (asyncio 워커에서 사용)"""
+    if owner_id is None:
+        return []
+    mode = (mode or WIKI_SEARCH_MODE).lower()
+    query_vector = await aget_embedding(query) if mode != 'keyword' else None
+    return await sync_to_async(_search_wiki_ranked, thread_sensitive=False)(query, query_vector, top_k, owner_id, mode)
+
+def search_passages(query: str, token_budget: int = WIKI_PASSAGE_TOKEN_BUDGET, *, owner_id, mode: str = None):
+    """
+    [추가] 문서 전체 대신 질문과 가장 관련 있는 구간(Passage)만 관련도 순으로 반환합니다.
+    구간 내용의 합이 token_budget(어림 토큰 수)을 넘지 않으며, 각 구간의 memory에는 제목만 로드됩니다.
+    owner_id 사용자의 위키에서만 찾으며, owner_id가 None이면 빈 목록을 반환합니다.
+    """
+    if owner_id is None:
+        return []
+    mode = (mode or WIKI_SEARCH_MODE).lower()
+    query_vector = get_embedding(query) if mode != 'keyword' else None
+    return _search_passages_ranked(query, query_vector, token_budget, owner_id, mode)
+
+async def asearch_passages(query: str, token_budget: int = WIKI_PASSAGE_TOKEN_BUDGET, *, owner_id, mode: str = None):
+    """search_passages()의 asyncio 버전 (asyncio 워커에서 사용)"""
+    if owner_id is None:
+        return []
+    mode = (mode or WIKI_SEARCH_MODE).lower()
+    query_vector = await aget_embedding(query) if mode != 'keyword' else None
+    return await sync_to_async(_search_passages_ranked, thread_sensitive=False)(query, query_vector, token_budget, owner_id, mode)
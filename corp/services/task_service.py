@@ -0,0 +1,194 @@
+import os
+import socket
+import asyncio
+import threading
+import uuid
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from corp.models import Agent, Task
+
+# 러너가 태스크를 점유하는 기본 시간(초). 워크플로가 도는 동안 하트비트로 계속 연장됩니다.
+LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", "120"))
+
+
+def default_runner_id() -> str:
+    """러너 프로세스 식별자 (호스트명:PID:랜덤)"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def _live_lease_q(now):
+    return Q(lease_owner__isnull=False, lease_expires_at__gt=now)
+
+
+def exclude_leased(queryset):
+    """다른 러너가 점유 중(만료 전)인 태스크를 제외합니다."""
+    return queryset.exclude(lease_expires_at__gt=timezone.now())
+
+
+def claim_task(task_id, agent_id, owner: str, statuses, review: bool = False, lease_seconds: int = LEASE_SECONDS) -> bool:
+    """
+    태스크를 점유(Lease)합니다. SELECT ... FOR UPDATE SKIP LOCKED를 사용하므로
+    여러 러너가 동시에 시도해도 한 러너만 성공하고, 나머지는 기다리지 않고 건너뜁니다.
+    Args:
+        task_id: 점유할 태스크
+        agent_id: 이 작업을 수행할 에이전트 (작업이면 담당자, 결재면 상사)
+        owner: 러너 식별자
+        statuses: 점유 시점에 태스크가 가져야 할 상태 목록
+        review: 결재(Case B) 작업 여부
+    Returns: 점유 성공 여부
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # 1. 에이전트 행을 잠가, 같은 에이전트의 작업을 두 러너가 동시에 점유하지 못하게 함
+        if not list(Agent.objects.select_for_update(skip_locked=True).filter(id=agent_id).values_list('id', flat=True)):
+            return False
+
+        # 2. 이 에이전트가 다른 러너에서 이미 일하는 중인지 확인 (자기 업무 수행 or 부하 결재)
+        agent_busy = Task.objects.filter(_live_lease_q(now)).filter(
+            (Q(assignee_id=agent_id) & ~Q(status=Task.TaskStatus.WAIT_APPROVAL)) |
+            Q(assignee__manager_id=agent_id, status=Task.TaskStatus.WAIT_APPROVAL)
+        ).exclude(id=task_id).exists()
+        if agent_busy:
+            return False
+
+        # 3. 태스크 행 점유 (만료된 lease는 회수 가능)
+        task_ids = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(id=task_id, status__in=statuses)
+            .filter(Q(lease_owner__isnull=True) | Q(lease_expires_at__lte=now) | Q(lease_owner=owner))
+            .values_list('id', flat=True)
+        )
+        if not task_ids:
+            return False
+
+        Task.objects.filter(id=task_id).update(
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds)
+        )
+    return True
+
+
+def heartbeat(task_id, owner: str, lease_seconds: int = LEASE_SECONDS) -> bool:
+    """lease를 연장합니다. 이미 다른 러너가 회수했다면 False."""
+    return Task.objects.filter(id=task_id, lease_owner=owner).update(
+        lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds)
+    ) == 1
+
+
+def release_lease(task_id, owner: str, retry_after: float = 0) -> None:
+    """
+    lease를 반납합니다.
+    retry_after(초)를 주면 그 시간 동안은 점유를 유지하여 어떤 러너도 바로 재시도하지 않게 합니다.
+    """
+    if retry_after:
+        Task.objects.filter(id=task_id, lease_owner=owner).update(
+            lease_expires_at=timezone.now() + timedelta(seconds=retry_after)
+        )
+    else:
+        Task.objects.filter(id=task_id, lease_owner=owner).update(lease_owner=None, lease_expires_at=None)
+
+
+def save_leased_task(task, owner: str, fields) -> bool:
+    """
+    lease를 쥔 러너만 결과를 저장하고, 저장과 동시에 lease를 반납합니다 (compare-and-set).
+    Returns: 저장 여부 (lease를 잃었다면 False)
+    """
+    values = {field: getattr(task, field) for field in fields}
+    values.update(lease_owner=None, lease_expires_at=None, updated_at=timezone.now())
+    return Task.objects.filter(id=task.id, lease_owner=owner).update(**values) == 1
+
+
+def reclaim_expired_leases() -> int:
+    """만료된 lease(죽은 러너가 남긴 점유)를 정리합니다. Returns: 회수한 태스크 수"""
+    return Task.objects.filter(lease_expires_at__lte=timezone.now()).update(lease_owner=None, lease_expires_at=None)
+
+
+def release_all_leases(owner: str) -> int:
+    """러너 재시작 시, 같은 식별자로 남아 있던 이전 점유를 모두 반납합니다."""
+    return Task.objects.filter(lease_owner=owner).update(lease_owner=None, lease_expires_at=None)
+
+
+class LeaseHeartbeat:
+    """
+    워크플로가 실행되는 동안 백그라운드 스레드에서 lease를 주기적으로 연장합니다.
+    with LeaseHeartbeat(task_id, owner) as hb: ... 형태로 사용하며, hb.lost가 True면 점유를 잃은 것입니다.
+    """
+
+    def __init__(self, task_id, owner: str, lease_seconds: int = LEASE_SECONDS):
+        self.task_id = task_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.interval = max(1.0, lease_seconds / 3)
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-heartbeat-{task_id}", daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    if not heartbeat(self.task_id, self.owner, self.lease_seconds):
+                        self.lost = True
+                        return
+                except Exception as e:
+                    # 일시적인 DB 오류는 다음 주기에 재시도 (lease가 만료되기 전까지 여유가 있음)
+                    print(f"⚠️ [Lease] Heartbeat failed for task {self.task_id}: {e}")
+        finally:
+            connections.close_all()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def _heartbeat_and_close(task_id, owner, lease_seconds):
+    try:
+        return heartbeat(task_id, owner, lease_seconds)
+    finally:
+        connections.close_all()
+
+
+class AsyncLeaseHeartbeat:
+    """
+    LeaseHeartbeat의 asyncio 버전. 태스크마다 스레드를 띄우지 않고 이벤트 루프의 태스크로 lease를 연장합니다.
+    async with AsyncLeaseHeartbeat(task_id, owner) as hb: ... 형태로 사용합니다.
+    """
+
+    def __init__(self, task_id, owner: str, lease_seconds: int = LEASE_SECONDS):
+        self.task_id = task_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.interval = max(1.0, lease_seconds / 3)
+        self.lost = False
+        self._task = None
+
+    async def _run(self):
+        beat = sync_to_async(_heartbeat_and_close, thread_sensitive=False)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if not await beat(self.task_id, self.owner, self.lease_seconds):
+                    self.lost = True
+                    return
+            except Exception as e:
+                print(f"⚠️ [Lease] Heartbeat failed for task {self.task_id}: {e}")
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return False
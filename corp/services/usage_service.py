@@ -0,0 +1,86 @@
+from datetime import timedelta
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from corp.models import LLMCall
+
+# ==============================================================================
+# LLM 사용량 집계 (LLMCall)
+# ==============================================================================
+# GPU 시간은 Ollama가 알려준 total_duration의 합입니다 (캐시 적중은 0).
+
+
+def _totals():
+    return {
+        "calls": Count('id'),
+        "cache_hits": Count('id', filter=Q(cache_hit=True)),
+        "prompt_tokens": Sum('prompt_tokens'),
+        "output_tokens": Sum('output_tokens'),
+        "prompt_ms": Sum('prompt_ms'),
+        "eval_ms": Sum('eval_ms'),
+        "load_ms": Sum('load_ms'),
+        "gpu_ms": Sum('total_ms'),
+        "wall_ms": Sum('wall_ms'),
+    }
+
+
+def _derive(row):
+    """합계에서 GPU 시간(초) / 생성 속도 / 캐시 적중률 / 호출당 프롬프트 토큰 수를 계산해 덧붙입니다."""
+    row = {**row, **{key: row.get(key) or 0 for key in _totals()}}
+    calls = row["calls"]
+    row["gpu_seconds"] = row["gpu_ms"] / 1000
+    row["tokens_per_sec"] = row["output_tokens"] / (row["eval_ms"] / 1000) if row.get("eval_ms") else 0.0
+    row["cache_hit_rate"] = row["cache_hits"] / calls if calls else 0.0
+    row["avg_prompt_tokens"] = row["prompt_tokens"] / (calls - row["cache_hits"]) if calls > row["cache_hits"] else 0.0
+    return row
+
+
+def calls_since(days: int, owner=None):
+    """최근 days일의 호출 (owner를 주면 그 사용자의 호출만)"""
+    queryset = LLMCall.objects.filter(created_at__gte=timezone.now() - timedelta(days=days))
+    if owner is not None:
+        queryset = queryset.filter(owner=owner)
+    return queryset
+
+
+def summarize(queryset) -> dict:
+    """전체 합계"""
+    return _derive(queryset.aggregate(**_totals()))
+
+
+def breakdown(queryset, *fields, label=None, limit: int = None):
+    """
+    fields별 합계 (GPU 시간이 큰 순서).
+    label: 행 -> 화면에 보일 이름 (생략하면 첫 번째 필드 값)
+    """
+    rows = queryset.values(*fields).annotate(**_totals()).order_by('-gpu_ms', '-calls')
+    if limit:
+        rows = rows[:limit]
+    label = label or (lambda row: row[fields[0]])
+    return [{**_derive(row), "label": label(row)} for row in rows]
+
+
+def usage_report(days: int = 7, owner=None, limit: int = 20) -> dict:
+    """
+    사용량 화면용 집계: 전체 / 모델별 / 용도별 / 에이전트별 / 태스크별 (owner가 None이면 모든 사용자 + 사용자별 합계).
+    에이전트 / 태스크 이름은 기록 시점이 아니라 지금 이름이며, 지워진 에이전트 / 태스크는 이름 없이 표시됩니다.
+    """
+    queryset = calls_since(days, owner)
+    report = {
+        "days": days,
+        "totals": summarize(queryset),
+        "by_model": breakdown(queryset, 'model'),
+        "by_purpose": breakdown(queryset, 'purpose'),
+        "by_agent": breakdown(
+            queryset.filter(agent__isnull=False), 'agent_id', 'agent__name', 'agent__role',
+            label=lambda row: f"{row['agent__name']} ({row['agent__role']})" if row['agent__name'] else "(fired agent)",
+            limit=limit,
+        ),
+        "by_task": breakdown(
+            queryset.filter(task__isnull=False), 'task_id', 'task__title',
+            label=lambda row: row['task__title'] or "(deleted task)", limit=limit,
+        ),
+    }
+    if owner is None:
+        # 사용자와 무관한 호출(모델 예열 등)은 사용자 없이 기록됨
+        report["by_owner"] = breakdown(queryset, 'owner_id', 'owner__username', label=lambda row: row['owner__username'] or "(system)")
+    return report
@@ -0,0 +1,118 @@
+import os
+import select
+import psycopg2
+from django.db import connection
+
+# Task 상태 전이를 알리는 Postgres NOTIFY 채널
+TASK_EVENT_CHANNEL = "corp_task_events"
+
+# [추가] 위키 아카이브 작업(ArchiveJob)이 생겼음을 알리는 채널
+ARCHIVE_EVENT_CHANNEL = "corp_archive_jobs"
+
+
+def _notify(channel, payload):
+    """
+    pg_notify로 알림을 보냅니다.
+    트랜잭션 안에서 호출되면 커밋 시점에 전달되고, 롤백되면 전달되지 않습니다.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [channel, payload])
+    except Exception as e:
+        # 알림 실패는 치명적이지 않음 (러너의 fallback poll이 결국 처리)
+        print(f"⚠️ [TaskEvents] Failed to notify '{channel}': {e}")
+
+
+def notify_task_changed(task):
+    """Task 상태가 바뀌었음을 러너에게 알립니다."""
+    _notify(TASK_EVENT_CHANNEL, f"{task.id}:{task.status}")
+
+
+def notify_archive_job(job):
+    """새 아카이브 작업이 있음을 아카이브 워커에게 알립니다."""
+    _notify(ARCHIVE_EVENT_CHANNEL, str(job.id))
+
+
+class TaskEventListener:
+    """
+    러너 전용 LISTEN 커넥션.
+    Django의 기본 커넥션과 분리된 별도 커넥션을 사용하므로 재접속 시에도 LISTEN 상태가 꼬이지 않습니다.
+    wake()를 호출하면 다른 스레드(워커 완료 콜백 등)에서도 대기 중인 러너를 즉시 깨울 수 있습니다.
+    """
+
+    def __init__(self, channel=TASK_EVENT_CHANNEL):
+        self.channel = channel
+        self.conn = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+
+    def _connect(self):
+        if self.conn is not None and not self.conn.closed:
+            return self.conn
+        self.conn = None
+        if connection.vendor != 'postgresql':
+            return None
+        params = connection.get_connection_params()
+        conn = psycopg2.connect(**params)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        self.conn = conn
+        return conn
+
+    def wake(self):
+        """대기 중인 wait()를 즉시 반환시킵니다 (thread-safe)."""
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass
+
+    def wait(self, timeout):
+        """
+        알림이 오거나 timeout(초)이 지날 때까지 블록합니다.
+        Returns: 받은 이벤트 payload 목록 (timeout이면 빈 리스트)
+        """
+        try:
+            conn = self._connect()
+        except psycopg2.Error as e:
+            print(f"⚠️ [TaskEvents] LISTEN connection failed, falling back to polling: {e}")
+            conn = None
+
+        watched = [self._wake_r] + ([conn] if conn is not None else [])
+        events = []
+        try:
+            readable, _, _ = select.select(watched, [], [], timeout)
+            if self._wake_r in readable:
+                while True:
+                    try:
+                        if not os.read(self._wake_r, 1024):
+                            break
+                    except BlockingIOError:
+                        break
+                events.append("wake")
+            if conn is not None and conn in readable:
+                conn.poll()
+                while conn.notifies:
+                    events.append(conn.notifies.pop(0).payload)
+        except (psycopg2.Error, OSError) as e:
+            print(f"⚠️ [TaskEvents] LISTEN connection lost, reconnecting: {e}")
+            self.close_connection()
+        return events
+
+    def close_connection(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except psycopg2.Error:
+                pass
+        self.conn = None
+
+    def close(self):
+        self.close_connection()
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
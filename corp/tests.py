@@ -1,3 +1,635 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from io import StringIO
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+import httpx
+import requests
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from ai_core.context_window import fit_messages, message_tokens
+from ai_core.llm_gateway import (
+    CircuitBreaker, LLMQueueFullError, LLMQueueTimeoutError, ModelLimiter, OllamaClient, OllamaUnavailableError,
+    get_circuit_breaker,
+)
+from ai_core.tokens import estimate_tokens
+from corp.checkpointer import DjangoCheckpointSaver
+from corp.llm_cache import make_key, normalize_prompt
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import IntegrityError, connections, transaction
+from corp.models import Agent, ArchiveJob, CorporateMemory, Task, WorkflowCheckpoint, WorkflowCheckpointWrite
+from corp.services import archive_service, kms_service, task_service
+from corp.passages import select_within_budget, split_passages
+from corp.scheduler import FairScheduler, ModelBatcher
+from corp.text_search import reciprocal_rank_fusion
 
-# Create your tests here.
+
+def _task(owner_id, owner_name, priority=0, waited=0, name=''):
+    """스케줄러가 읽는 속성만 가진 태스크 (fetch_candidates()가 붙이는 어노테이션 포함)"""
+    now = timezone.now()
+    return SimpleNamespace(
+        name=name, owner_id=owner_id, owner_name=owner_name, effective_priority=priority,
+        created_at=now - timedelta(seconds=waited), updated_at=now - timedelta(seconds=waited),
+    )
+
+
+def _dispatch(scheduler, items, count=None):
+    """러너처럼 order()가 내놓는 순서대로 배정(charge)하고 배정된 태스크 이름을 반환"""
+    names = []
+    for _, task in scheduler.order(items):
+        scheduler.charge(task)
+        names.append(task.name)
+        if count is not None and len(names) >= count:
+            break
+    return names
+
+
+class FairSchedulerTests(SimpleTestCase):
+    def test_owners_alternate_regardless_of_backlog(self):
+        items = [('run', _task(1, 'alice', name=f'a{i}')) for i in range(3)] + [('run', _task(2, 'bob', name='b0'))]
+        self.assertEqual(_dispatch(FairScheduler(weights={}), items), ['a0', 'b0', 'a1', 'a2'])
+
+    def test_weights_split_slots_proportionally(self):
+        items = [('run', _task(1, 'alice', name='a')) for _ in range(8)] + [('run', _task(2, 'bob', name='b')) for _ in range(8)]
+        names = _dispatch(FairScheduler(weights={'alice': 2}), items, count=6)
+        self.assertEqual(names.count('a'), 4)
+        self.assertEqual(names.count('b'), 2)
+
+    def test_higher_effective_priority_first_within_owner(self):
+        items = [
+            ('run', _task(1, 'alice', priority=0, name='low')),
+            ('run', _task(1, 'alice', priority=5, name='high')),
+            ('run', _task(1, 'alice', priority=0, waited=30, name='older')),
+        ]
+        self.assertEqual(_dispatch(FairScheduler(weights={}), items), ['high', 'older', 'low'])
+
+    def test_idle_owner_does_not_catch_up(self):
+        scheduler = FairScheduler(weights={})
+        _dispatch(scheduler, [('run', _task(1, 'alice', name='a')) for _ in range(5)])
+        # 쉬고 있던 bob은 밀린 몫(5개)을 몰아 받지 않고 alice와 번갈아 배정됨
+        items = [('run', _task(1, 'alice', name='a')) for _ in range(3)] + [('run', _task(2, 'bob', name='b')) for _ in range(3)]
+        self.assertEqual(_dispatch(scheduler, items, count=4), ['a', 'b', 'a', 'b'])
+
+
+class ModelBatcherTests(SimpleTestCase):
+    def _groups(self, **models):
+        return {model: [('run', _task(1, 'alice', waited=waited))] for model, waited in models.items()}
+
+    def test_keeps_current_model_until_batch_size(self):
+        batcher = ModelBatcher(batch_size=2)
+        groups = self._groups(qwen=0, llama=100)
+        batcher.charge('qwen')
+        self.assertEqual(batcher.sequence(groups)[0], 'qwen')
+        batcher.charge('qwen')
+        self.assertEqual(batcher.sequence(groups), ['llama', 'qwen'])
+        batcher.charge('llama')
+        self.assertEqual(batcher.stats(), {"switches": 1, "dispatched": {'qwen': 2, 'llama': 1}})
+
+    def test_prefers_loaded_model_then_longest_wait(self):
+        batcher = ModelBatcher()
+        groups = self._groups(a=10, b=100, c=50)
+        self.assertEqual(batcher.sequence(groups), ['b', 'c', 'a'])
+        self.assertEqual(batcher.sequence(groups, is_loaded=lambda m: m == 'a'), ['a', 'b', 'c'])
+
+    def test_current_model_without_candidates_is_skipped(self):
+        batcher = ModelBatcher()
+        batcher.charge('qwen')
+        self.assertEqual(batcher.sequence(self._groups(llama=0)), ['llama'])
+
+
+class FitMessagesTests(SimpleTestCase):
+    def setUp(self):
+        self.system = SystemMessage(content="You are an agent.")
+        self.messages = [HumanMessage(content="Write the quarterly report.")]
+        for i in range(6):
+            self.messages.append(AIMessage(content="", tool_calls=[{"name": "search_web", "args": {"query": f"q{i}"}, "id": f"call{i}"}]))
+            self.messages.append(ToolMessage(content=f"result {i} " + "lorem ipsum " * 200, tool_call_id=f"call{i}", name="search_web"))
+
+    def test_within_budget_is_unchanged(self):
+        fitted = fit_messages(self.system, self.messages, budget=100_000)
+        self.assertEqual(fitted, [self.system] + self.messages)
+
+    def test_drops_old_turns_behind_a_summary(self):
+        budget = 1200
+        fitted = fit_messages(self.system, self.messages, budget=budget)
+        self.assertIs(fitted[0], self.system)
+        self.assertTrue(fitted[1].content.startswith("[Context Note]"))
+        self.assertLessEqual(sum(message_tokens(m) for m in fitted), budget)
+        # 최근 턴(도구 호출 + 결과)은 짝을 유지한 채 남음
+        self.assertEqual(fitted[-2].tool_calls[0]["id"], "call5")
+        self.assertEqual(fitted[-1].tool_call_id, "call5")
+        self.assertNotIsInstance(fitted[2], ToolMessage)
+
+    def test_truncates_latest_tool_result_when_it_alone_overflows(self):
+        fitted = fit_messages(self.system, self.messages[-2:], budget=300)
+        self.assertIn("truncated", fitted[-1].content)
+        self.assertLessEqual(sum(message_tokens(m) for m in fitted), 300)
+
+
+class PassageTests(SimpleTestCase):
+    TEXT = " ".join(f"Sentence number {i} describes one step of the deployment procedure." for i in range(60))
+
+    def test_passages_fit_size_and_cover_text(self):
+        passages = split_passages(self.TEXT, max_tokens=60, overlap_tokens=0)
+        self.assertGreater(len(passages), 1)
+        for start, end in passages:
+            self.assertLessEqual(estimate_tokens(self.TEXT[start:end]), 60)
+        covered = "".join(self.TEXT[s:e] for s, e in passages).replace(" ", "")
+        self.assertEqual(covered, self.TEXT.replace(" ", ""))
+
+    def test_consecutive_passages_overlap(self):
+        passages = split_passages(self.TEXT, max_tokens=60, overlap_tokens=20)
+        for (_, prev_end), (next_start, _) in zip(passages, passages[1:]):
+            self.assertLess(next_start, prev_end)
+
+    def test_long_sentence_is_split(self):
+        text = "word " * 500
+        passages = split_passages(text, max_tokens=50, overlap_tokens=0)
+        self.assertTrue(all(estimate_tokens(text[s:e]) <= 50 for s, e in passages))
+
+    def test_empty_text(self):
+        self.assertEqual(split_passages(""), [])
+
+    def test_select_within_budget_skips_oversized_and_keeps_filling(self):
+        passages = [SimpleNamespace(content="x" * n) for n in (200, 2000, 100)]
+        selected = select_within_budget(passages, token_budget=100)
+        self.assertEqual([len(p.content) for p in selected], [200, 100])
+
+
+class ReciprocalRankFusionTests(SimpleTestCase):
+    def test_documents_in_both_rankings_rank_first(self):
+        a, b, c = (SimpleNamespace(pk=pk) for pk in 'abc')
+        fused = reciprocal_rank_fusion([a, b], [c, b], k=60)
+        self.assertEqual([o.pk for o in fused][0], 'b')
+        self.assertAlmostEqual(fused[0].fused_score, 1 / 62 + 1 / 62)
+        self.assertEqual({o.pk for o in fused}, {'a', 'b', 'c'})
+
+    def test_empty_rankings(self):
+        self.assertEqual(reciprocal_rank_fusion([], []), [])
+
+
+class ModelLimiterTests(SimpleTestCase):
+    def test_limit_is_per_model_and_scaled_by_hosts(self):
+        limiter = ModelLimiter(default_limit=2, limits={'qwen3:8b': 4}, hosts=2)
+        self.assertEqual(limiter.limit_for('qwen3:8b'), 8)
+        self.assertEqual(limiter.limit_for('llama3'), 4)
+
+    def test_rejects_when_queue_is_full(self):
+        limiter = ModelLimiter(default_limit=1, max_queue=0)
+        with limiter.slot('qwen3'):
+            with self.assertRaises(LLMQueueFullError):
+                with limiter.slot('qwen3'):
+                    pass
+        # 다른 모델은 슬롯을 따로 씀
+        with limiter.slot('qwen3'), limiter.slot('llama3'):
+            pass
+
+    def test_times_out_waiting_for_slot(self):
+        limiter = ModelLimiter(default_limit=1, max_queue=1)
+        with limiter.slot('qwen3'):
+            with self.assertRaises(LLMQueueTimeoutError):
+                with limiter.slot('qwen3', timeout=0.05):
+                    pass
+        with limiter.slot('qwen3', timeout=0.05):
+            pass
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_recovers_through_probe(self):
+        breaker = CircuitBreaker('http://ollama:11434', threshold=2, cooldown=0.05)
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertFalse(breaker.is_open())
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+        with self.assertRaises(OllamaUnavailableError):
+            breaker.before_call()
+
+        time.sleep(0.06)
+        breaker.before_call()  # half-open: 시험 호출 하나만 통과
+        with self.assertRaises(OllamaUnavailableError):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertFalse(breaker.is_open())
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker('http://ollama:11434', threshold=1, cooldown=0.05)
+        breaker.record_failure()
+        time.sleep(0.06)
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+
+    def test_guard_ignores_non_availability_errors(self):
+        breaker = CircuitBreaker('http://ollama:11434', threshold=1, cooldown=60)
+        with self.assertRaises(ValueError):
+            with breaker.guard():
+                raise ValueError("bad arguments")
+        self.assertFalse(breaker.is_open())
+        with self.assertRaises(ConnectionError):
+            with breaker.guard():
+                raise ConnectionError("refused")
+        self.assertTrue(breaker.is_open())
+
+
+class HalfOpenProbeTests(SimpleTestCase):
+    """OllamaClient 호출이 half-open 시험 호출 중 예상 밖의 오류로 끝나도 회로가 시험 중 상태로 남지 않아야 함"""
+
+    def _half_open(self, host):
+        breaker = get_circuit_breaker(host)
+        breaker.threshold, breaker.cooldown = 1, 0.05
+        breaker.record_failure()
+        time.sleep(0.06)
+        return breaker
+
+    def test_unexpected_error_during_probe_releases_it(self):
+        host = 'http://probe-sync:11434'
+        breaker = self._half_open(host)
+        ok = mock.Mock(status_code=200)
+        session = mock.Mock()
+        session.request.side_effect = [requests.exceptions.ChunkedEncodingError("truncated"), ok]
+        with mock.patch('ai_core.llm_gateway.get_session', return_value=session):
+            client = OllamaClient(host)
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                client._send_to(host, 'GET', '/api/tags', retries=0)
+            self.assertIs(client._send_to(host, 'GET', '/api/tags', retries=0), ok)
+        self.assertFalse(breaker.is_open())
+
+    def test_pull_reports_to_breaker(self):
+        host = 'http://probe-pull:11434'
+        breaker = self._half_open(host)
+        session = mock.Mock()
+        session.post.side_effect = requests.ConnectionError("refused")
+        with mock.patch('ai_core.llm_gateway.get_session', return_value=session):
+            with self.assertRaises(requests.ConnectionError):
+                list(OllamaClient(host).pull_model('qwen3'))
+        self.assertTrue(breaker.is_open())
+
+        time.sleep(0.06)
+        response = mock.MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [b'{"status": "success"}']
+        session.post.side_effect = None
+        session.post.return_value = response
+        with mock.patch('ai_core.llm_gateway.get_session', return_value=session):
+            self.assertEqual(list(OllamaClient(host).pull_model('qwen3')), [{"status": "success"}])
+        self.assertFalse(breaker.is_open())
+        breaker.before_call()
+
+    def test_async_decoding_error_and_cancel_release_probe(self):
+        host = 'http://probe-async:11434'
+        breaker = self._half_open(host)
+        responses = iter([
+            httpx.DecodingError("bad gzip"),
+            asyncio.CancelledError(),
+            httpx.Response(200, json={"models": []}),
+        ])
+
+        def handler(request):
+            item = next(responses)
+            if isinstance(item, BaseException):
+                raise item
+            return item
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                with mock.patch('ai_core.llm_gateway.get_async_client', return_value=client):
+                    ollama = OllamaClient(host)
+                    with self.assertRaises(httpx.DecodingError):
+                        await ollama._asend_to(host, 'GET', '/api/tags', retries=0)
+                    with self.assertRaises(asyncio.CancelledError):
+                        await ollama._asend_to(host, 'GET', '/api/tags', retries=0)
+                    return await ollama._asend_to(host, 'GET', '/api/tags', retries=0)
+
+        self.assertEqual(asyncio.run(run()).status_code, 200)
+        self.assertFalse(breaker.is_open())
+
+
+class PromptKeyTests(SimpleTestCase):
+    def test_normalize_ignores_volatile_ids_and_trailing_whitespace(self):
+        first = [{"role": "user", "content": "Plan the launch.  \n", "id": "run-1"}]
+        second = [{"role": "user", "content": "Plan the launch.", "id": "run-2"}]
+        self.assertEqual(normalize_prompt(first), normalize_prompt(second))
+
+    def test_json_string_and_messages_normalize_alike(self):
+        messages = [{"role": "user", "content": "hi"}]
+        self.assertEqual(normalize_prompt('[{"role": "user", "content": "hi"}]'), normalize_prompt(messages))
+
+    def test_key_depends_on_model_options_and_tools(self):
+        prompt = [{"role": "user", "content": "hi"}]
+        key = make_key('qwen3', {"temperature": 0}, prompt)
+        self.assertEqual(key, make_key('qwen3', {"temperature": 0}, prompt))
+        self.assertNotEqual(key, make_key('llama3', {"temperature": 0}, prompt))
+        self.assertNotEqual(key, make_key('qwen3', {"temperature": 0.7}, prompt))
+        self.assertNotEqual(key, make_key('qwen3', {"temperature": 0}, prompt, tools=[{"name": "calculator"}]))
+
+
+class CheckpointSaverTests(TestCase):
+    def _put(self, saver, thread_id, step, parent_id=None):
+        checkpoint = empty_checkpoint()
+        checkpoint["id"] = f"1ef00000-0000-6000-8000-{step:012d}"
+        checkpoint["channel_values"] = {"messages": [f"step {step}"]}
+        config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": parent_id}}
+        return saver.put(config, checkpoint, {"source": "loop", "step": step}, {})
+
+    def test_round_trip_with_pending_writes(self):
+        saver = DjangoCheckpointSaver()
+        first = self._put(saver, 'task-1', 1)
+        second = self._put(saver, 'task-1', 2, parent_id=first["configurable"]["checkpoint_id"])
+        saver.put_writes(second, [("messages", "pending")], task_id="node-1")
+
+        latest = saver.get_tuple({"configurable": {"thread_id": 'task-1'}})
+        self.assertEqual(latest.checkpoint["channel_values"], {"messages": ["step 2"]})
+        self.assertEqual(latest.metadata["step"], 2)
+        self.assertEqual(latest.parent_config["configurable"]["checkpoint_id"], first["configurable"]["checkpoint_id"])
+        self.assertEqual(latest.pending_writes, [("node-1", "messages", "pending")])
+
+        older = saver.get_tuple(first)
+        self.assertEqual(older.checkpoint["channel_values"], {"messages": ["step 1"]})
+        self.assertEqual([t.metadata["step"] for t in saver.list({"configurable": {"thread_id": 'task-1'}})], [2, 1])
+        self.assertIsNone(saver.get_tuple({"configurable": {"thread_id": 'other'}}))
+
+    def test_keeps_only_recent_checkpoints_per_thread(self):
+        saver = DjangoCheckpointSaver(keep=2)
+        parent = None
+        for step in range(1, 5):
+            config = self._put(saver, 'task-1', step, parent_id=parent)
+            saver.put_writes(config, [("messages", step)], task_id="node")
+            parent = config["configurable"]["checkpoint_id"]
+        self._put(saver, 'task-2', 1)
+
+        kept = WorkflowCheckpoint.objects.filter(thread_id='task-1').order_by('checkpoint_id')
+        self.assertEqual([c.checkpoint_id[-1] for c in kept], ['3', '4'])
+        self.assertEqual(WorkflowCheckpointWrite.objects.filter(thread_id='task-1').count(), 2)
+        self.assertEqual(WorkflowCheckpoint.objects.filter(thread_id='task-2').count(), 1)
+
+        saver.delete_thread('task-1')
+        self.assertFalse(WorkflowCheckpoint.objects.filter(thread_id='task-1').exists())
+
+
+def _fake_embedding(text):
+    """본문 첫 단어로 축을 정하는 단위 벡터: 첫 단어가 같으면 코사인 유사도 1, 다르면 (대개) 0"""
+    word = text.split("\n", 1)[-1].split()[0].casefold()
+    vector = [0.0] * 768
+    vector[sum(map(ord, word)) % 768] = 1.0
+    return vector
+
+
+class KnowledgeDedupTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username='alice')
+        patches = [
+            mock.patch.object(kms_service, 'get_embedding', side_effect=_fake_embedding),
+            mock.patch.object(kms_service, 'get_embeddings', side_effect=lambda texts, batch_size=None: [_fake_embedding(t) for t in texts]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_same_content_returns_existing_document(self):
+        memory = kms_service.add_knowledge(self.owner, 'Deploy SOP', 'Deploy with the blue/green script.')
+        again = kms_service.add_knowledge(self.owner, 'Deploy SOP (retry)', '  deploy with the BLUE/GREEN   script.')
+        self.assertEqual(again.pk, memory.pk)
+        self.assertEqual(CorporateMemory.objects.count(), 1)
+        self.assertTrue(memory.passages.exists())
+
+    def test_same_content_is_kept_per_owner(self):
+        other = User.objects.create(username='bob')
+        kms_service.add_knowledge(self.owner, 'Deploy SOP', 'Deploy with the script.')
+        kms_service.add_knowledge(other, 'Deploy SOP', 'Deploy with the script.')
+        self.assertEqual(CorporateMemory.objects.count(), 2)
+
+    def test_near_duplicate_is_merged_under_the_original_subject(self):
+        memory = kms_service.add_knowledge(self.owner, 'Deploy SOP', 'Deploy with the script.')
+        merged = kms_service.add_knowledge(self.owner, 'How to deploy', 'Deploy with the new script and verify.')
+        self.assertEqual(merged.pk, memory.pk)
+        memory.refresh_from_db()
+        self.assertEqual((memory.subject, memory.version), ('Deploy SOP', 2))
+        self.assertEqual(memory.content, 'Deploy with the new script and verify.')
+        self.assertEqual(memory.content_hash, kms_service.content_hash(memory.content))
+        # 제목이 다르므로 원래 제목으로 다시 임베딩
+        kms_service.get_embedding.assert_called_with('Deploy SOP\nDeploy with the new script and verify.')
+        self.assertEqual(CorporateMemory.objects.count(), 1)
+
+    def test_different_documents_stay_separate(self):
+        kms_service.add_knowledge(self.owner, 'Deploy SOP', 'Deploy with the script.')
+        kms_service.add_knowledge(self.owner, 'Billing', 'Invoices go out monthly.')
+        self.assertEqual(CorporateMemory.objects.count(), 2)
+
+    def test_concurrent_insert_returns_the_winner(self):
+        winner = kms_service.add_knowledge(self.owner, 'Deploy SOP', 'Deploy with the script.')
+        # 중복 확인 뒤 다른 워커가 먼저 저장한 상황: 사전 확인과 유사 문서 검색을 모두 통과시킴
+        with mock.patch.object(kms_service, 'find_near_duplicate', return_value=None), \
+                mock.patch.object(kms_service, '_same_content', side_effect=[None, winner]):
+            result = kms_service.add_knowledge(self.owner, 'Deploy SOP', 'Deploy with the script.')
+        self.assertEqual(result.pk, winner.pk)
+        self.assertEqual(CorporateMemory.objects.count(), 1)
+
+    def test_other_integrity_errors_are_raised(self):
+        with mock.patch.object(kms_service, 'find_near_duplicate', return_value=None), \
+                mock.patch.object(CorporateMemory.objects, 'create', side_effect=IntegrityError("fk violation")):
+            with self.assertRaises(IntegrityError):
+                kms_service.add_knowledge(self.owner, 'Deploy SOP', 'Deploy with the script.')
+
+    def test_merge_into_existing_content_returns_that_document(self):
+        first = kms_service.add_knowledge(self.owner, 'Deploy SOP', 'Deploy with the script.')
+        second = kms_service.add_knowledge(self.owner, 'Billing', 'Invoices go out monthly.')
+        result = kms_service.merge_knowledge(second, first.content)
+        self.assertEqual(result.pk, first.pk)
+        second.refresh_from_db()
+        self.assertEqual(second.content, 'Invoices go out monthly.')
+
+    def test_compact_retries_documents_whose_merge_failed(self):
+        def create(subject, content):
+            return CorporateMemory.objects.create(
+                owner=self.owner, subject=subject, content=content,
+                content_hash=kms_service.content_hash(content), embedding=_fake_embedding(content),
+            )
+        first = create('Deploy SOP', 'Deploy with the script.')
+        create('How to deploy', 'Deploy using the script.')
+        create('Deploy notes', 'Deploy by running the script.')
+
+        # 첫 묶음은 제목을 바꿔 다시 임베딩하는 데 실패 -> 다음 묶음에서 다시 합쳐져야 함
+        with mock.patch.object(kms_service, 'get_embedding', side_effect=[None, _fake_embedding('Deploy')]):
+            call_command('compact_wiki', threshold=0.95, stdout=StringIO())
+
+        remaining = CorporateMemory.objects.get()
+        self.assertEqual((remaining.pk, remaining.subject, remaining.version), (first.pk, 'Deploy SOP', 3))
+        self.assertEqual(remaining.content, 'Deploy by running the script.')
+
+
+def _org(test):
+    """상사 1명과 부하 1명, 부하에게 배정된 태스크 2개"""
+    test.owner = User.objects.create(username='lease-owner')
+    test.manager = Agent.objects.create(owner=test.owner, name='Manager', role='manager')
+    test.agent = Agent.objects.create(owner=test.owner, name='Worker', role='worker', manager=test.manager)
+    test.task = Task.objects.create(title='Report', description='Write it', assignee=test.agent)
+    test.other = Task.objects.create(title='Slides', description='Make them', assignee=test.agent)
+
+
+class TaskLeaseTests(TestCase):
+    ACTIVE = [Task.TaskStatus.TODO, Task.TaskStatus.THINKING]
+
+    def setUp(self):
+        _org(self)
+
+    def test_only_one_runner_holds_a_live_lease(self):
+        self.assertTrue(task_service.claim_task(self.task.id, self.agent.id, 'runner-a', self.ACTIVE))
+        self.assertFalse(task_service.claim_task(self.task.id, self.agent.id, 'runner-b', self.ACTIVE))
+        # 같은 러너는 다시 점유 가능 (재시도)
+        self.assertTrue(task_service.claim_task(self.task.id, self.agent.id, 'runner-a', self.ACTIVE))
+        self.assertEqual(Task.objects.get(id=self.task.id).lease_owner, 'runner-a')
+
+    def test_expired_lease_can_be_reclaimed(self):
+        task_service.claim_task(self.task.id, self.agent.id, 'runner-a', self.ACTIVE)
+        Task.objects.filter(id=self.task.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(task_service.claim_task(self.task.id, self.agent.id, 'runner-b', self.ACTIVE))
+        self.assertFalse(task_service.heartbeat(self.task.id, 'runner-a'))
+        self.assertTrue(task_service.heartbeat(self.task.id, 'runner-b'))
+
+    def test_status_must_match(self):
+        self.assertFalse(task_service.claim_task(self.task.id, self.agent.id, 'runner-a', [Task.TaskStatus.WAIT_APPROVAL]))
+
+    def test_busy_agent_cannot_start_another_task(self):
+        task_service.claim_task(self.task.id, self.agent.id, 'runner-a', self.ACTIVE)
+        self.assertFalse(task_service.claim_task(self.other.id, self.agent.id, 'runner-b', self.ACTIVE))
+
+    def test_manager_reviewing_is_busy(self):
+        Task.objects.filter(id=self.task.id).update(status=Task.TaskStatus.WAIT_APPROVAL)
+        self.assertTrue(task_service.claim_task(self.task.id, self.manager.id, 'runner-a', [Task.TaskStatus.WAIT_APPROVAL], review=True))
+        mine = Task.objects.create(title='Budget', description='Plan it', assignee=self.manager)
+        self.assertFalse(task_service.claim_task(mine.id, self.manager.id, 'runner-b', self.ACTIVE))
+
+    def test_save_requires_the_lease(self):
+        task_service.claim_task(self.task.id, self.agent.id, 'runner-a', self.ACTIVE)
+        self.task.status, self.task.result = Task.TaskStatus.WAIT_APPROVAL, 'done'
+        self.assertFalse(task_service.save_leased_task(self.task, 'runner-b', ['status', 'result']))
+        self.assertEqual(Task.objects.get(id=self.task.id).status, Task.TaskStatus.TODO)
+
+        self.assertTrue(task_service.save_leased_task(self.task, 'runner-a', ['status', 'result']))
+        saved = Task.objects.get(id=self.task.id)
+        self.assertEqual((saved.status, saved.result, saved.lease_owner, saved.lease_expires_at),
+                         (Task.TaskStatus.WAIT_APPROVAL, 'done', None, None))
+        # 저장과 함께 lease를 반납했으므로 두 번째 저장은 실패
+        self.assertFalse(task_service.save_leased_task(self.task, 'runner-a', ['status']))
+
+    def test_save_only_touches_given_fields(self):
+        task_service.claim_task(self.task.id, self.agent.id, 'runner-a', self.ACTIVE)
+        # 러너가 일하는 동안 사용자가 피드백을 남김
+        Task.objects.filter(id=self.task.id).update(feedback='Add charts')
+        self.task.result = 'draft'
+        task_service.save_leased_task(self.task, 'runner-a', ['result'])
+        self.assertEqual(Task.objects.get(id=self.task.id).feedback, 'Add charts')
+
+
+class ConcurrentTaskClaimTests(TransactionTestCase):
+    """다른 커넥션이 에이전트 행을 잠그고 있으면 기다리지 않고 건너뜀 (SKIP LOCKED)"""
+
+    def setUp(self):
+        _org(self)
+
+    def test_claim_skips_agent_locked_by_another_runner(self):
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_agent_lock():
+            try:
+                with transaction.atomic():
+                    list(Agent.objects.select_for_update().filter(id=self.agent.id))
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connections.close_all()
+
+        holder = threading.Thread(target=hold_agent_lock)
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(5))
+            started = time.monotonic()
+            self.assertFalse(task_service.claim_task(self.task.id, self.agent.id, 'runner-b', TaskLeaseTests.ACTIVE))
+            self.assertLess(time.monotonic() - started, 1.0)
+        finally:
+            release.set()
+            holder.join()
+        self.assertTrue(task_service.claim_task(self.task.id, self.agent.id, 'runner-b', TaskLeaseTests.ACTIVE))
+
+
+class ArchiveQueueTests(TestCase):
+    def setUp(self):
+        _org(self)
+        self.task.result = 'Quarterly report'
+        self.job = archive_service.enqueue_task_result(self.task)
+
+    def test_claimed_job_is_invisible_to_other_workers(self):
+        [job] = archive_service.claim_jobs('worker-a')
+        self.assertEqual((job.status, job.attempts, job.locked_by), (ArchiveJob.JobStatus.RUNNING, 1, 'worker-a'))
+        self.assertEqual(archive_service.claim_jobs('worker-b'), [])
+
+    def test_job_waits_until_next_attempt(self):
+        ArchiveJob.objects.filter(id=self.job.id).update(next_attempt_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(archive_service.claim_jobs('worker-a'), [])
+
+    def test_expired_lease_moves_job_to_another_worker(self):
+        [stale] = archive_service.claim_jobs('worker-a')
+        ArchiveJob.objects.filter(id=self.job.id).update(locked_until=timezone.now() - timedelta(seconds=1))
+        [job] = archive_service.claim_jobs('worker-b')
+        self.assertEqual((job.locked_by, job.attempts), ('worker-b', 2))
+        # 점유를 잃은 워커는 연장도, 결과 기록도 하지 못함
+        self.assertFalse(archive_service.renew_lease(stale, 'worker-a'))
+        self.assertFalse(archive_service._finish(stale, 'worker-a', status=ArchiveJob.JobStatus.DONE))
+        self.assertEqual(ArchiveJob.objects.get(id=self.job.id).status, ArchiveJob.JobStatus.RUNNING)
+        self.assertTrue(archive_service.renew_lease(job, 'worker-b'))
+
+    def test_run_pending_skips_jobs_whose_lease_was_lost(self):
+        second = archive_service.enqueue_task_result(self.other)
+        processed = []
+
+        def process(job, worker_id):
+            # 첫 작업을 처리하는 동안 두 번째 작업의 점유가 만료되어 다른 워커가 가져감
+            ArchiveJob.objects.filter(id=second.id).update(locked_by='worker-b')
+            processed.append(job.id)
+            return True
+
+        with mock.patch.object(archive_service, 'process_job', side_effect=process):
+            archive_service.run_pending('worker-a')
+        self.assertEqual(processed, [self.job.id])
+        self.assertEqual(ArchiveJob.objects.get(id=second.id).locked_by, 'worker-b')
+
+    def test_success_records_memory_and_releases_lock(self):
+        memory = CorporateMemory.objects.create(owner=self.owner, subject='s', content='c', embedding=[1.0] + [0.0] * 767)
+        [job] = archive_service.claim_jobs('worker-a')
+        with mock.patch.object(kms_service, 'add_knowledge', return_value=memory):
+            self.assertTrue(archive_service.process_job(job, 'worker-a'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.memory_id, job.locked_by, job.locked_until), (ArchiveJob.JobStatus.DONE, memory.pk, None, None))
+
+    def test_failure_backs_off_then_gives_up(self):
+        with mock.patch.object(kms_service, 'add_knowledge', return_value=None):
+            [job] = archive_service.claim_jobs('worker-a')
+            self.assertFalse(archive_service.process_job(job, 'worker-a'))
+            job.refresh_from_db()
+            self.assertEqual(job.status, ArchiveJob.JobStatus.PENDING)
+            self.assertGreater(job.next_attempt_at, timezone.now())
+            self.assertIn("embedding", job.last_error)
+
+            ArchiveJob.objects.filter(id=job.id).update(
+                next_attempt_at=timezone.now(), attempts=archive_service.ARCHIVE_MAX_ATTEMPTS - 1
+            )
+            [job] = archive_service.claim_jobs('worker-a')
+            archive_service.process_job(job, 'worker-a')
+        self.assertEqual(ArchiveJob.objects.get(id=job.id).status, ArchiveJob.JobStatus.FAILED)
+
+    def test_reembed_of_deleted_document_completes(self):
+        ArchiveJob.objects.all().delete()
+        memory = CorporateMemory.objects.create(owner=self.owner, subject='s', content='c', embedding=[1.0] + [0.0] * 767)
+        reembed = archive_service.enqueue_reembed(memory)
+        memory.delete()
+        [job] = archive_service.claim_jobs('worker-a')
+        self.assertEqual(job.id, reembed.id)
+        self.assertTrue(archive_service.process_job(job, 'worker-a'))
+        self.assertEqual(ArchiveJob.objects.get(id=job.id).status, ArchiveJob.JobStatus.DONE)
@@ -0,0 +1,89 @@
+import os
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+
+# tsvector / tsquery 설정. 모델의 GeneratedField(search_vector)와 같아야 GIN 인덱스가 사용됨
+TEXT_SEARCH_CONFIG = 'simple'
+
+# 키워드 질의에 사용할 최대 단어 수 (긴 질문이 통째로 들어와도 tsquery가 과도하게 커지지 않도록)
+TEXT_SEARCH_MAX_TERMS = int(os.getenv("TEXT_SEARCH_MAX_TERMS", "16"))
+
+# Reciprocal Rank Fusion 상수. 클수록 상위 몇 개 순위의 영향이 줄어듦 (논문 기본값 60)
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def _terms(text: str):
+    """
+    질의를 문서와 똑같은 Postgres 파서로 나눈 단어(lexeme) 목록 (질의에 나온 순서).
+    'TCK-1042' 같은 티켓 ID는 파서가 'tck', '-1042'로 나누므로 파이썬 정규식으로는 일치시키기 어렵습니다.
+    """
+    if not text or not text.strip():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT lexeme FROM unnest(to_tsvector(%s::regconfig, %s)) ORDER BY positions[1] LIMIT %s",
+            [TEXT_SEARCH_CONFIG, text, TEXT_SEARCH_MAX_TERMS],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _quote(lexeme: str) -> str:
+    # 인용한 lexeme만 사용하므로 tsquery 연산자가 섞여 들어갈 수 없음
+    return "'" + lexeme.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def _raw_query(lexemes):
+    return SearchQuery(" | ".join(_quote(t) for t in lexemes), search_type='raw', config=TEXT_SEARCH_CONFIG)
+
+
+def keyword_query(text: str):
+    """
+    자유 형식 질의를 OR 조건의 tsquery로 변환합니다. 없으면 None.
+    모든 단어가 있어야 하는 AND 대신 OR로 묶고, 순위는 keyword_search()에서 일치한 단어 수로 매깁니다.
+    """
+    terms = _terms(text)
+    if not terms:
+        return None
+    return _raw_query(terms)
+
+
+def keyword_search(queryset, field: str, text: str, top_k: int):
+    """
+    queryset에서 tsvector 필드(field)가 text의 단어와 일치하는 문서를 GIN 인덱스로 찾습니다.
+    Returns: matched_terms(일치한 서로 다른 단어 수), rank(ts_rank_cd)가 붙은 모델 인스턴스 목록 (관련도 순)
+    """
+    terms = _terms(text)
+    if not terms:
+        return []
+    query = _raw_query(terms)
+    # 흔한 단어 하나가 여러 번 나오는 문서보다 질의의 서로 다른 단어를 많이 포함한 문서를 먼저 (BM25의 단어 포괄도에 해당)
+    matched_terms = sum(
+        (Case(When(**{field: _raw_query([term])}, then=Value(1)), default=Value(0), output_field=IntegerField()) for term in terms),
+        Value(0),
+    )
+    return list(
+        queryset.filter(**{field: query})
+        .annotate(matched_terms=matched_terms, rank=SearchRank(F(field), query, cover_density=True))
+        .order_by('-matched_terms', '-rank', '-pk')[:top_k]
+    )
+
+
+def reciprocal_rank_fusion(*rankings, k: int = RRF_K):
+    """
+    여러 검색 결과 순위를 RRF(score = Σ 1 / (k + rank))로 합칩니다.
+    점수 척도가 다른 검색(벡터 거리 / ts_rank)도 순위만으로 공정하게 섞을 수 있습니다.
+    Returns: 점수가 높은 순서의 모델 인스턴스 목록 (각 인스턴스에 fused_score가 붙음)
+    """
+    scores, objects = {}, {}
+    for ranking in rankings:
+        for rank, obj in enumerate(ranking, 1):
+            scores[obj.pk] = scores.get(obj.pk, 0.0) + 1.0 / (k + rank)
+            objects.setdefault(obj.pk, obj)
+
+    fused = []
+    for pk in sorted(scores, key=lambda pk: scores[pk], reverse=True):
+        obj = objects[pk]
+        obj.fused_score = scores[pk]
+        fused.append(obj)
+    return fused
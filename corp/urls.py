@@ -31,4 +31,6 @@ urlpatterns = [
     path('agent/<uuid:pk>/detail/', views.AgentDetailView.as_view(), name='agent_detail'),
     path('wiki/', views.WikiListView.as_view(), name='wiki_list'),
     path('wiki/<uuid:pk>/', views.WikiDetailView.as_view(), name='wiki_detail'),
+    # [추가] LLM 사용량 (GPU 시간 / 토큰 수)
+    path('usage/', views.UsageView.as_view(), name='usage'),
 ]
\ No newline at end of file
@@ -0,0 +1,63 @@
+import os
+from django.db import connection, transaction
+from pgvector.django import CosineDistance, L2Distance
+
+# 벡터 검색 거리 함수 ('cosine' | 'l2'). HNSW 인덱스는 컬럼당 하나이며 마이그레이션은 항상 cosine으로 만듭니다.
+# [변경] 'l2'로 배포하거나 운영 중에 바꾸면 migrate 뒤에 `python manage.py rebuild_vector_indexes`로
+# 인덱스를 이 거리의 연산자 클래스(HNSW_OPCLASS)로 다시 만들어야 인덱스를 사용합니다.
+VECTOR_DISTANCE = os.getenv("VECTOR_DISTANCE", "cosine").lower()
+
+HNSW_OPCLASSES = {
+    'cosine': 'vector_cosine_ops',
+    'l2': 'vector_l2_ops',
+}
+HNSW_OPCLASS = HNSW_OPCLASSES.get(VECTOR_DISTANCE, 'vector_cosine_ops')
+
+# HNSW 검색 후보 수 (클수록 정확하지만 느림). 소유자/에이전트 필터가 인덱스 탐색 뒤에 적용되므로
+# 필터가 좁을수록 여유 있게 잡아야 top_k를 채울 수 있습니다.
+VECTOR_EF_SEARCH = int(os.getenv("VECTOR_EF_SEARCH", "100"))
+
+# pgvector 0.8+ 에서 필터로 결과가 모자랄 때 인덱스를 이어서 탐색 ('off' | 'relaxed_order' | 'strict_order')
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "relaxed_order")
+
+DISTANCES = {
+    'cosine': CosineDistance,
+    'l2': L2Distance,
+}
+
+_pgvector_version = None
+
+
+def distance_expression(field: str, vector, distance: str = None):
+    """설정된(또는 지정한) 거리 함수로 field와 vector 사이의 거리 표현식을 만듭니다 (HNSW 인덱스 연산자와 일치)."""
+    return DISTANCES.get(distance or VECTOR_DISTANCE, CosineDistance)(field, vector)
+
+
+def _supports_iterative_scan() -> bool:
+    global _pgvector_version
+    if _pgvector_version is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+        _pgvector_version = tuple(int(p) for p in row[0].split('.')[:2]) if row else (0, 0)
+    return _pgvector_version >= (0, 8)
+
+
+def nearest(queryset, field: str, vector, top_k: int, ef_search: int = None, distance: str = None):
+    """
+    queryset(소유자/에이전트로 이미 필터된)에서 vector와 가장 가까운 top_k개를 HNSW 인덱스로 찾습니다.
+    hnsw.ef_search 등은 SET LOCAL로 이 트랜잭션에만 적용합니다.
+    distance: 'cosine' | 'l2' (생략하면 VECTOR_DISTANCE). 유사도 임계값처럼 척도가 정해진 비교에는 명시합니다.
+    VECTOR_DISTANCE와 다른 거리를 지정하면 인덱스가 없으므로 필터된 행을 순차 탐색합니다.
+    Returns: distance가 붙은 모델 인스턴스 목록
+    """
+    results = queryset.annotate(distance=distance_expression(field, vector, distance)).order_by('distance')[:top_k]
+    if connection.vendor != 'postgresql':
+        return list(results)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)", [str(ef_search or VECTOR_EF_SEARCH)])
+            if VECTOR_ITERATIVE_SCAN != 'off' and _supports_iterative_scan():
+                cursor.execute("SELECT set_config('hnsw.iterative_scan', %s, true)", [VECTOR_ITERATIVE_SCAN])
+        return list(results)
@@ -7,9 +7,9 @@ from django.views.decorators.http import require_POST
 from django.http import HttpRequest
 
 # [중요] 사람용 서비스 임포트
-from corp.services import human_service 
+from corp.services import human_service, kms_service, usage_service
 from .models import Agent, Task, AgentMemory, CorporateMemory
-from ai_core.llm_gateway import OllamaClient
+from ai_core.llm_gateway import OllamaClient, OllamaUnavailableError
 import requests
 
 # ==============================================================================
@@ -49,7 +49,8 @@ class DashboardView(LoginRequiredMixin, View):
             ollama_client.list_models()
             ollama_status = "Online"
             ollama_models = ollama_client.list_models().get('models', [])
-        except requests.exceptions.RequestException:
+        except (requests.exceptions.RequestException, OllamaUnavailableError):
+            # (회로 차단기가 열려 있으면 OllamaUnavailableError) -> Offline으로 표시
             pass
 
         all_my_agents = Agent.objects.filter(owner=request.user)
@@ -64,6 +65,7 @@ class DashboardView(LoginRequiredMixin, View):
             'ollama_models': ollama_models,
             'ollama_status': ollama_status,
             'agent_queue_status': 'Idle',
+            'task_priorities': Task.TaskPriority.choices,
         }
         return render(request, 'corp/dashboard.html', context)
 
@@ -107,8 +109,35 @@ class AgentDetailView(LoginRequiredMixin, View):
 
 class WikiListView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        memories = CorporateMemory.objects.filter(owner=request.user).order_by('-created_at')
-        return render(request, 'corp/wiki_list.html', {'memories': memories})
+        query = request.GET.get('q', '').strip()
+        if query:
+            # [추가] 검색어가 있으면 에이전트와 같은 하이브리드 검색(벡터 + 전문 검색)으로 관련도 순 정렬
+            memories = kms_service.search_wiki(query, top_k=50, owner_id=request.user.id)
+        else:
+            memories = CorporateMemory.objects.filter(owner=request.user).order_by('-created_at')
+        return render(request, 'corp/wiki_list.html', {'memories': memories, 'query': query})
+
+
+class UsageView(LoginRequiredMixin, View):
+    """[추가] LLM 사용량 (GPU 시간 / 토큰 수): 모델 / 용도 / 에이전트 / 태스크별. 관리자(staff)는 모든 사용자 합계도 봄"""
+    PERIODS = (1, 7, 30)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            days = int(request.GET.get('days', 7))
+        except ValueError:
+            days = 7
+        if days not in self.PERIODS:
+            days = 7
+        everyone = request.user.is_staff and request.GET.get('scope') == 'all'
+        report = usage_service.usage_report(days=days, owner=None if everyone else request.user)
+        context = {
+            'report': report,
+            'days': days,
+            'periods': self.PERIODS,
+            'everyone': everyone,
+        }
+        return render(request, 'corp/usage.html', context)
 
 
 class WikiDetailView(LoginRequiredMixin, View):
@@ -150,11 +179,19 @@ def htmx_fire_agent(request):
 @require_POST
 def htmx_create_task(request):
     """태스크 생성 -> 승인 대기 목록(Task List) 갱신"""
+    try:
+        priority = int(request.POST.get('priority', Task.TaskPriority.NORMAL))
+    except ValueError:
+        priority = Task.TaskPriority.NORMAL
+    if priority not in Task.TaskPriority.values:
+        priority = Task.TaskPriority.NORMAL
+
     human_service.create_task(
         user=request.user,
         title=request.POST.get('title'),
         description=request.POST.get('description'),
-        assignee_id=request.POST.get('assignee')
+        assignee_id=request.POST.get('assignee'),
+        priority=priority
     )
     # 태스크 생성 직후 '승인 대기' 목록을 보여줌 (UX상 바로 확인 가능하도록)
     tasks = Task.objects.filter(assignee__owner=request.user, status=Task.TaskStatus.WAIT_APPROVAL)